@@ -0,0 +1,125 @@
+# admission.py
+# Admission control in front of /api/chat: at most `max_inflight` replies run at
+# once, up to `max_queue` more wait (each for at most `max_wait` s), and each
+# client gets a token bucket of `rate` req/s with `burst` capacity.
+#
+# The queue depth a request finds on arrival picks how much work it is allowed:
+#   0  full reply
+#   1  no LLM rewrite               (queue non-empty)
+#   2  + keyword-only domain check, exact-match reply cache only  (queue over 1/3 full)
+#   3  + BM25-only retrieval, no encoder at all (over 2/3 full)
+# and a full queue, an expired wait or an empty bucket is rejected (HTTP 429)
+# instead of sitting behind gunicorn until the worker timeout.
+import os, threading, time
+from collections import OrderedDict
+
+LEVELS = ("full", "no_llm", "keyword_domain", "keyword_only")
+MAX_LEVEL = len(LEVELS) - 1
+
+class Overloaded(Exception):
+    def __init__(self, reason: str, retry_after: float = 1.0):
+        super().__init__(reason)
+        self.reason = reason  # rate_limit | queue_full | timeout
+        self.retry_after = retry_after
+
+class TokenBuckets:
+    """Per-client token buckets, LRU-bounded so a scan of client ids can't grow it forever."""
+
+    def __init__(self, rate: float, burst: float, max_clients: int = 10_000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()  # client -> [tokens, last refill]
+
+    def take(self, client: str) -> float:
+        """0 if a token was taken, else seconds until one is available."""
+        now = time.monotonic()
+        with self._lock:
+            b = self._buckets.get(client)
+            if b is None:
+                b = self._buckets[client] = [self.burst, now]
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client)
+                b[0] = min(self.burst, b[0] + (now - b[1]) * self.rate)
+                b[1] = now
+            if b[0] >= 1:
+                b[0] -= 1
+                return 0.0
+            return (1 - b[0]) / self.rate
+
+class Admission:
+    def __init__(self, max_inflight: int = 2, max_queue: int = 16, max_wait: float = 2.0,
+                 rate: float = 0.0, burst: float = 20.0):
+        self.max_inflight = max(1, max_inflight)
+        self.max_queue = max(0, max_queue)
+        self.max_wait = max_wait
+        self.buckets = TokenBuckets(rate, burst) if rate > 0 else None
+        self.inflight = self.queued = 0
+        self.admitted = [0] * (MAX_LEVEL + 1)
+        self.rejected = {"rate_limit": 0, "queue_full": 0, "timeout": 0}
+        self._cond = threading.Condition()
+
+    @classmethod
+    def from_env(cls) -> "Admission":
+        return cls(max_inflight=int(os.getenv("ADMIT_MAX_INFLIGHT", os.getenv("GUNICORN_THREADS", "2"))),
+                   max_queue=int(os.getenv("ADMIT_QUEUE", "16")),
+                   max_wait=float(os.getenv("ADMIT_MAX_WAIT_S", "2")),
+                   rate=float(os.getenv("RATE_LIMIT_RPS", "0")),
+                   burst=float(os.getenv("RATE_LIMIT_BURST", "20")))
+
+    def _level(self, depth: int) -> int:
+        if depth <= 0:
+            return 0
+        return min(MAX_LEVEL, 1 + 3 * (depth - 1) // max(self.max_queue, 1))
+
+    @property
+    def level(self) -> int:
+        """The level a request arriving now would get."""
+        return self._level(self.queued + (self.inflight >= self.max_inflight))
+
+    def _reject(self, reason: str, retry_after: float):
+        self.rejected[reason] += 1
+        raise Overloaded(reason, retry_after)
+
+    def acquire(self, client: str = None) -> int:
+        """Wait for a slot; -> degradation level. Raises Overloaded. Pair with release()."""
+        if self.buckets is not None and client is not None:
+            wait = self.buckets.take(client)
+            if wait:
+                with self._cond:
+                    self._reject("rate_limit", wait)
+        with self._cond:
+            if self.inflight < self.max_inflight and not self.queued:
+                self.inflight += 1
+                self.admitted[0] += 1
+                return 0
+            if self.queued >= self.max_queue:
+                self._reject("queue_full", self.max_wait)
+            self.queued += 1
+            level = self._level(self.queued)
+            deadline = time.monotonic() + self.max_wait
+            try:
+                while self.inflight >= self.max_inflight:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._reject("timeout", self.max_wait)
+                    self._cond.wait(remaining)
+            finally:
+                self.queued -= 1
+            self.inflight += 1
+            self.admitted[level] += 1
+            return level
+
+    def release(self):
+        with self._cond:
+            self.inflight -= 1
+            self._cond.notify()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {"level": self.level, "level_name": LEVELS[self.level], "inflight": self.inflight,
+                    "queued": self.queued, "max_inflight": self.max_inflight, "max_queue": self.max_queue,
+                    "admitted": dict(zip(LEVELS, self.admitted)), "rejected": dict(self.rejected)}
@@ -1,60 +1,72 @@
 # app.py
-import os
+import os, json, threading
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
-from flask import Flask, request, jsonify, render_template_string
-from embeddings_store import EmbStore
+from flask import Flask, Response, abort, request, jsonify, render_template_string, stream_with_context
+from embeddings_store import EmbStore, QueryContext
 from logger import log_event
-from llm import generate_answer  # OK if you haven't wired LLM; it will safely no-op
-
-app = Flask(__name__)
+from llm import generate_answer, stream_answer  # OK if you haven't wired LLM; it will safely no-op
+from term_matcher import TermMatcher, load_term_tables
+from reply_cache import ReplyCache
+from metrics import METRICS
+from knowledge_base import KBWatcher, load_kb
+from sessions import make_session_store, valid_session_id
+from admission import LEVELS, Admission, Overloaded
+from feedback_index import FeedbackIndex, FeedbackTailer, kb_key
+from static_assets import REVALIDATE, Asset, cache_control_for, load_static, url_for_asset
+
+app = Flask(__name__, static_folder=None)  # static/ is served from memory by static_file below
 
 # -------------------- Knowledge Base --------------------
-KB = [
-    {"q": "pre workout meal ideas running weightlifting gym breakfast",
-     "a": ("Pre-workout (60–90 min): carbs + a little protein, low fat/fiber.\n"
-           "Examples:\n• Oatmeal + banana + yogurt\n• Toast + peanut butter + fruit\n"
-           "• Rice cake + turkey slices\nIf only 20–30 min: a small fruit (banana/applesauce).")},
-    {"q": "post workout meal recovery what to eat after training",
-     "a": ("Post-workout (within 1–2h): ~20–35g protein + carbs.\n"
-           "Examples:\n• Greek yogurt + granola + berries\n• Chicken + rice + veggies\n"
-           "• Protein shake + banana\n• Tofu stir-fry + noodles\nHydrate with water; add electrolytes if sweat is heavy.")},
-    {"q": "how much protein do i need per day women female intake grams protein daily",
-     "a": ("Most active adults: 1.2–1.6 g/kg body weight/day (up to 2.0 g/kg if heavy training).\n"
-           "Example: 49 kg → ~60–80 g protein/day, spread across meals.")},
-    {"q": "hydration plan water drink how much electrolytes weightlifting day",
-     "a": ("Simple hydration plan:\n• Morning: 300–500 ml with breakfast\n• Pre-lift (1–2h): 300–500 ml\n"
-           "• During: sip ~150–250 ml every 15–20 min\n• After: 300–500 ml; add electrolytes if session >60 min or sweat is heavy.\n"
-           "Aim for pale-straw urine color.")},
-    {"q": "20 minute home workout quick routine no equipment full body circuit",
-     "a": ("20-minute circuit (no equipment):\n"
-           "1) Squats 40s, Rest 20s\n2) Push-ups (knees OK) 40s, Rest 20s\n"
-           "3) Glute bridges 40s, Rest 20s\n4) Plank 40s, Rest 20s\nRepeat 3 rounds.\n"
-           "Lower impact: slow tempo. Harder: add a backpack for weight.")},
-    {"q": "fat loss basics reduce body fat weight loss tips how to lose fat",
-     "a": ("Fat-loss basics:\n1) Slight calorie deficit (~200–400 kcal/day)\n"
-           "2) Protein 1.2–1.6 g/kg + fiber 25–35 g/day\n"
-           "3) Train 2–3×/wk resistance + daily steps (7–10k)\nSleep 7–9h, manage stress, hydrate.")},
-    {"q": "supplement timing protein creatine collagen when to take",
-     "a": ("Protein: anytime; helpful post-workout or to hit daily target.\n"
-           "Creatine: 3–5 g/day; timing doesn’t matter — take daily with water/food.\n"
-           "Collagen: 10–15 g; pair with vitamin C for joints/skin.\nCheck personal tolerance and medical advice.")}
-]
+# Entries live in data/kb.jsonl (or KB_PATH: a file or a directory of .jsonl/.json/.yaml);
+# edits are picked up while running by KB_WATCHER (see knowledge_base.py)
+KB = load_kb()
 
 FALLBACK = ("I’m not sure yet. Try asking about: pre-workout, post-workout, protein needs, "
             "hydration, a 20-minute workout, fat-loss basics, or supplement timing.\n\n"
             "Note: Educational info only — not medical advice.")
 
 # -------------------- Embeddings Store --------------------
+# cheap to build: the model, KB embeddings and vector index load on first semantic use (see warm_up)
 store = EmbStore(KB)
-
-def draft_answer(user_text: str):
-    hits = store.search(user_text, k=3)
+# started per process on the first request, so gunicorn workers each get one after fork
+KB_WATCHER = KBWatcher.from_env(store)
+# 👍/👎 per KB entry, followed from the chat log; a small re-rank prior in draft_answer
+FEEDBACK = FeedbackIndex.from_env()
+FEEDBACK_TAILER = FeedbackTailer.from_env(FEEDBACK)
+
+def reference_line(hit) -> str:
+    # ingested article chunks carry their document title (and url); hand-written entries don't
+    if hit.get("source"):
+        return f"• {hit['source']}" + (f" — {hit['url']}" if hit.get("url") else "")
+    return f"• Source {hit['i']+1}: “{hit['q'][:60]}…”"
+
+def draft_answer(user_text: str, q_emb=None, ctx: QueryContext = None):
+    # ctx: the request's query context (hybrid BM25 + dense, may skip the encoder)
+    # q_emb: the request's query embedding if it has already been computed
+    with METRICS.span("search"):
+        if ctx is not None and ctx.degrade >= 3:
+            hits = store.search_lexical(user_text, k=3)  # shedding load: no encoder
+        elif ctx is not None:
+            hits = store.search_hybrid(ctx, k=3)
+        elif q_emb is not None:
+            hits = store.search_vector(q_emb, k=3)
+        else:
+            hits = store.search(user_text, k=3)
+    hits = FEEDBACK.rerank(user_text, hits, floor=ANSWER_THRESHOLD)
+    if ctx is not None:
+        ctx.hits = hits
+    return compose_answer(hits)
+
+# confidence threshold (cosine similarity ~ 0..1)
+ANSWER_THRESHOLD = 0.25
+
+def compose_answer(hits):
+    """(answer text or None when retrieval isn't confident, hits)"""
     if not hits:
         return None, []
 
-    # confidence threshold (cosine similarity ~ 0..1)
-    if hits[0]["score"] < 0.25:
+    if hits[0]["score"] < ANSWER_THRESHOLD:
         return None, hits
 
     # Compose grounded answer; include 1–2 sources as "References"
@@ -66,29 +78,32 @@ def draft_answer(user_text: str):
     refs = []
     for h in hits:
         if h["score"] > 0.2:
-            refs.append(f"• Source {h['i']+1}: “{h['q'][:60]}…”")
+            refs.append(reference_line(h))
 
     answer_txt = f"{top}{extra}\n\nReferences:\n" + ("\n".join(refs) if refs else "—")
     return answer_txt, hits
 
 # -------------------- Guardrails --------------------
-def should_refuse_medical(user_text: str) -> bool:
-    t = user_text.lower()
-    medical_terms = [
-        "diagnose","diagnosis","medication","dose","mg","contraindication",
-        "side effect","treat","treatment","prescription","prescribe"
-    ]
-    return any(w in t for w in medical_terms)
+# Term tables live in data/guardrails.json (override with GUARDRAILS_FILE) and are
+# compiled into one automaton, so each message is scanned once for all of them.
+_TERMS = load_term_tables()
+MEDICAL_TERMS = _TERMS["medical"]
+FITNESS_KEYWORDS = set(_TERMS["fitness"])
+CHITCHAT = _TERMS["chitchat"]
+INTENTS = _TERMS["intents"]
+GUARDRAILS = TermMatcher({
+    "medical": MEDICAL_TERMS,
+    "fitness": FITNESS_KEYWORDS,
+    "chitchat": CHITCHAT,
+    "intents": INTENTS,
+})
+
+def should_refuse_medical(user_text: str, matches: dict = None) -> bool:
+    # matches: GUARDRAILS.scan(user_text), if the caller already has it
+    matches = GUARDRAILS.scan(user_text) if matches is None else matches
+    return bool(matches.get("medical"))
 
 # Fitness domain check (keywords + semantic anchors)
-FITNESS_KEYWORDS = {
-    "workout","training","run","running","jog","jogging","cycle","cycling","bike",
-    "strength","weights","weightlifting","lift","hiit","yoga","cardio","steps",
-    "calorie","calories","nutrition","diet","protein","carb","carbs","fat","fiber",
-    "hydration","water","electrolyte","electrolytes","creatine","collagen",
-    "pre-workout","post-workout","warmup","cooldown","recovery","rest day","sleep",
-    "meal","breakfast","lunch","dinner","snack","macros","deficit","surplus"
-}
 FITNESS_ANCHORS = [
     "fitness and nutrition advice",
     "workout programming and exercise tips",
@@ -97,49 +112,71 @@ FITNESS_ANCHORS = [
     "fat loss basics and macros",
     "home workouts and strength training"
 ]
+# encoded once per model/anchor-list version and persisted under data/cache; loaded lazily
+ANCHOR_INDEX = store.anchor_index(FITNESS_ANCHORS)
+
+# MODEL_WARMUP: background (default) loads the semantic path in a thread after import,
+# eager loads it before the app serves anything, lazy waits for the first request that needs it
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "background")
+WARMUP_ERROR = None
+
+def warm_up():
+    global WARMUP_ERROR
+    try:
+        ANCHOR_INDEX.load()
+        store.warm()
+    except Exception as e:
+        WARMUP_ERROR = repr(e)
+        raise
+
+def semantic_ready() -> bool:
+    return store.ready
+
+def start_warm_up_thread():
+    threading.Thread(target=warm_up, name="model-warmup", daemon=True).start()
+
+if MODEL_WARMUP == "eager":
+    warm_up()
+elif MODEL_WARMUP == "background" and os.getenv("MODEL_WARMUP_THREAD") != "post_fork":
+    start_warm_up_thread()  # under gunicorn with preload, each worker starts its own (gunicorn.conf.py)
 
-def is_in_fitness_domain(user_text: str, model=None, sim_threshold: float = 0.22) -> bool:
+def is_in_fitness_domain(user_text: str, model=None, sim_threshold: float = 0.22, ctx: QueryContext = None,
+                         matches: dict = None, semantic: bool = True) -> bool:
     if not user_text.strip():
         return False
-    t = user_text.lower()
     # fast keyword pass
-    for kw in FITNESS_KEYWORDS:
-        if kw in t:
-            return True
-    # semantic pass (reuse embeddings model)
+    matches = GUARDRAILS.scan(user_text) if matches is None else matches
+    if matches.get("fitness"):
+        return True
+    if not semantic:
+        return False
+    # semantic pass (reuse the request's query embedding when we have one)
     try:
-        mdl = model or store.model
-        q = mdl.encode([user_text], normalize_embeddings=True)
-        anchors = mdl.encode(FITNESS_ANCHORS, normalize_embeddings=True)
-        sims = (q @ anchors.T).ravel()
-        return float(sims.max()) >= sim_threshold
+        if ctx is not None:
+            q = ctx.raw_vec  # never the topic-folded vector: an off-topic follow-up must still fail here
+        elif model is not None:
+            q = model.encode([user_text], normalize_embeddings=True)
+        else:
+            q = store.encode_query(user_text)
+        return ANCHOR_INDEX.max_sim(q) >= sim_threshold
     except Exception:
         return False
 
 # -------------------- Chit-chat intent --------------------
 STEER_BACK = "What would you like help with today — workouts or nutrition?"
 
-CHITCHAT = {
-    "how are you": "I’m doing great, thanks for asking!",
-    "how's coach eva": "Coach FitEva here — always ready to help.",
-    "who are you": "I’m Coach FitEva, your virtual fitness & nutrition coach (educational only).",
-    "hello": "Hi there!",
-    "hi": "Hey!"
-}
-
-
-def check_chitchat(user_text: str):
-    t = user_text.lower()
-    for k, v in CHITCHAT.items():
-        if k in t:
-            return v
-    return None
+def check_chitchat(user_text: str, matches: dict = None):
+    matches = GUARDRAILS.scan(user_text) if matches is None else matches
+    hits = matches.get("chitchat")
+    # first match in table order, like the old dict walk
+    return CHITCHAT[hits[0]] if hits else None
 
 # -------------------- LLM prompt (optional) --------------------
 def build_grounded_prompt(user_text: str, hits) -> str:
     sources = []
     for i, h in enumerate(hits[:2]):
-        sources.append(f"Source {i+1} (score={h['score']:.2f}):\n{h['a']}")
+        title = f", from {h['source']!r}" if h.get("source") else ""
+        sources.append(f"Source {i+1} (score={h['score']:.2f}{title}):\n{h['a']}")
     sources_text = "\n\n".join(sources) if sources else "No sources."
     prompt = f"""
 You are Coach FitEva. Answer the user's fitness/nutrition question using ONLY the sources below.
@@ -161,57 +198,283 @@ If you must refuse (not covered by sources), say:
     return prompt
 
 # -------------------- Brain: smart_reply --------------------
-def smart_reply(user_text: str) -> str:
+REFUSAL = ("Coach FitEva:\nThanks for asking. I can’t help with medical diagnosis or specific medication guidance. "
+           "For fitness/nutrition basics, ask me about pre-workout, protein needs, hydration, a 20-minute workout, or fat-loss fundamentals.\n\nReferences: —")
+OUT_OF_SCOPE = ("Coach FitEva:\nI’m focused on fitness & nutrition. "
+                "Try asking about workouts, protein needs, hydration, recovery, or fat-loss basics.\n\nReferences: —")
 
-    cc = check_chitchat(user_text)
+# event type -> chat_replies_total outcome label
+OUTCOMES = {"fallback_intent": "fallback", "fallback_generic": "fallback"}
+
+def _log(ctx: QueryContext, ev: dict):
+    if ctx.topic is not None:
+        ev["follow_up"] = True
+    if ctx.degrade:
+        ev["degraded"] = LEVELS[ctx.degrade]
+    if ev["type"] in ANSWER_TYPES and ctx.hits:
+        ev["kb"] = kb_key(ctx.hits[0])  # lets feedback on this question find the entry (feedback_index.py)
+        # top_score is a cosine unless via == "lexical" (BM25 coverage); log_analytics keeps those apart
+        ev["via"] = ctx.hits[0].get("via")
+    ctx.event = ev
+    METRICS.count(OUTCOMES.get(ev["type"], ev["type"]))
+    log_event(ev)
+
+def plan_reply(user_text: str, ctx: QueryContext, matches: dict):
+    """Everything smart_reply does before the optional LLM rewrite.
+    Returns (reply, None) when the reply is final, or (None, (out, hits)) when
+    the retrieval answer `out` should go to the LLM."""
+    with METRICS.span("chitchat"):
+        cc = check_chitchat(user_text, matches)
     if cc:
-        log_event({"type": "chitchat", "q": user_text})
-        return "Coach FitEva:\n" + cc + "\n\n" + STEER_BACK
+        _log(ctx, {"type": "chitchat", "q": user_text})
+        return "Coach FitEva:\n" + cc + "\n\n" + STEER_BACK, None
 
 
     # 2) Medical guardrail
-    if should_refuse_medical(user_text):
-        return ("Coach FitEva:\nThanks for asking. I can’t help with medical diagnosis or specific medication guidance. "
-                "For fitness/nutrition basics, ask me about pre-workout, protein needs, hydration, a 20-minute workout, or fat-loss fundamentals.\n\nReferences: —")
+    with METRICS.span("medical"):
+        refuse = should_refuse_medical(user_text, matches)
+    if refuse:
+        METRICS.count("refusal")
+        return REFUSAL, None
 
     # 3) Domain filter
-    if not is_in_fitness_domain(user_text, model=store.model):
-        log_event({"type": "out_of_scope", "q": user_text})
-        return ("Coach FitEva:\nI’m focused on fitness & nutrition. "
-                "Try asking about workouts, protein needs, hydration, recovery, or fat-loss basics.\n\nReferences: —")
+    with METRICS.span("domain"):
+        in_domain = is_in_fitness_domain(user_text, ctx=ctx, matches=matches, semantic=ctx.degrade < 2)
+    if not in_domain:
+        _log(ctx, {"type": "out_of_scope", "q": user_text})
+        return OUT_OF_SCOPE, None
 
     # 4) Retrieval (V2)
-    out, hits = draft_answer(user_text)
-    use_llm = os.getenv("USE_LLM") == "1"
+    with METRICS.span("draft"):
+        out, hits = draft_answer(user_text, ctx=ctx)
+    use_llm = os.getenv("USE_LLM") == "1" and ctx.degrade < 1
 
-    # 5) Optional LLM rewrite (V3)
+    # 5) Optional LLM rewrite (V3) happens in the caller
     if out and use_llm:
-        prompt = build_grounded_prompt(user_text, hits)
-        llm_text = generate_answer(prompt)
-        if llm_text:
-            log_event({"type": "llm_answer", "q": user_text, "top_score": hits[0]["score"] if hits else None})
-            return "Coach FitEva:\n" + llm_text
+        return None, (out, hits)
 
     if out:
-        log_event({"type": "answer", "q": user_text, "top_score": hits[0]["score"] if hits else None})
-        return "Coach FitEva:\n" + out
+        _log(ctx, {"type": "answer", "q": user_text, "top_score": hits[0]["score"] if hits else None})
+        return "Coach FitEva:\n" + out, None
 
     # 6) Intent fallback (low-confidence retrieval)
-    intents = {
-        "protein":  "Try: ‘how much protein per day’ or ‘protein after workout’",
-        "hydrate":  "Try: ‘daily hydration plan’ or ‘electrolytes when?’",
-        "workout":  "Try: ‘20 minute home workout’ or ‘beginner strength plan’",
-        "fat":      "Try: ‘fat loss basics’ or ‘steps + resistance split’",
-    }
-    low = user_text.lower()
-    for k, v in intents.items():
-        if k in low:
-            msg = "Coach FitEva:\n" + v + "\n\n" + FALLBACK
-            log_event({"type": "fallback_intent", "q": user_text, "intent": k})
-            return msg
-
-    log_event({"type": "fallback_generic", "q": user_text})
-    return "Coach FitEva:\n" + FALLBACK
+    msg, ev = fallback_reply(user_text, matches)
+    _log(ctx, ev)
+    return msg, None
+
+def fallback_reply(user_text: str, matches: dict):
+    """-> (reply, chat event) when retrieval has no confident answer"""
+    intent_hits = matches.get("intents")
+    if intent_hits:
+        k = intent_hits[0]
+        return ("Coach FitEva:\n" + INTENTS[k] + "\n\n" + FALLBACK,
+                {"type": "fallback_intent", "q": user_text, "intent": k})
+    return "Coach FitEva:\n" + FALLBACK, {"type": "fallback_generic", "q": user_text}
+
+def finish_llm_reply(user_text: str, ctx: QueryContext, out: str, hits, llm_text) -> str:
+    # llm_text is None when no backend answered: keep the retrieval answer
+    top_score = hits[0]["score"] if hits else None
+    if llm_text:
+        _log(ctx, {"type": "llm_answer", "q": user_text, "top_score": top_score})
+        return "Coach FitEva:\n" + llm_text
+    # llm_failed: the rewrite was expected (USE_LLM=1) but didn't come; not cached (_cache_store)
+    _log(ctx, {"type": "answer", "q": user_text, "top_score": top_score, "llm_failed": True})
+    return "Coach FitEva:\n" + out
+
+def smart_reply(user_text: str, ctx: QueryContext = None, matches: dict = None) -> str:
+    # one query context per request: the message is encoded at most once (or not at
+    # all on the keyword + lexical fast path) and shared by the domain filter and retrieval
+    ctx = ctx or QueryContext(store, user_text)
+    # single pass over the text for every guardrail term table
+    if matches is None:
+        with METRICS.span("scan"):
+            matches = GUARDRAILS.scan(user_text)
+
+    reply, draft = plan_reply(user_text, ctx, matches)
+    if reply is not None:
+        return reply
+    out, hits = draft
+    with METRICS.span("llm"):
+        llm_text = generate_answer(build_grounded_prompt(user_text, hits))
+    return finish_llm_reply(user_text, ctx, out, hits, llm_text)
+
+def smart_reply_stream(user_text: str, ctx: QueryContext = None, matches: dict = None):
+    """Same replies as smart_reply, but an LLM rewrite is yielded token by token.
+    Every other path yields the finished reply as one chunk."""
+    ctx = ctx or QueryContext(store, user_text)
+    if matches is None:
+        with METRICS.span("scan"):
+            matches = GUARDRAILS.scan(user_text)
+    reply, draft = plan_reply(user_text, ctx, matches)
+    if reply is not None:
+        yield reply
+        return
+
+    out, hits = draft
+    yield "Coach FitEva:\n"
+    with METRICS.span("llm"):  # includes time the client takes to read each token
+        streamed, complete = yield from stream_answer(build_grounded_prompt(user_text, hits))
+    top_score = hits[0]["score"] if hits else None
+    if streamed and complete:
+        _log(ctx, {"type": "llm_answer", "q": user_text, "top_score": top_score})
+    elif streamed:
+        # the rewrite was cut off (deadline, dropped upstream): finish with the retrieval
+        # answer; logged as that, and never cached (_cache_store)
+        yield "\n\n" + out
+        _log(ctx, {"type": "answer", "q": user_text, "top_score": top_score, "llm_cut": True})
+    else:
+        # no backend answered: same retrieval answer smart_reply would give
+        yield finish_llm_reply(user_text, ctx, out, hits, None)[len("Coach FitEva:\n"):]
+
+# -------------------- Sessions --------------------
+# Clients that send a session_id get follow-ups read in context: a short message
+# with no fitness keyword of its own ("what about after?") is searched with the
+# last answer's topic folded into its vector (see QueryContext). None when SESSION_STORE=off.
+SESSIONS = make_session_store()
+FOLLOWUP_WORDS = int(os.getenv("SESSION_FOLLOWUP_WORDS", "6"))
+SESSION_FOLD = float(os.getenv("SESSION_FOLD", "0.5"))
+ANSWER_TYPES = ("answer", "llm_answer")
+
+def session_context(user_text: str, session_id, matches: dict) -> QueryContext:
+    if (SESSIONS is None or not valid_session_id(session_id) or matches.get("fitness")
+            or len(user_text.split()) > FOLLOWUP_WORDS):
+        return QueryContext(store, user_text)
+    last, topic = SESSIONS.last(session_id)
+    if last is None or last.kind not in ANSWER_TYPES:
+        return QueryContext(store, user_text)  # only an answered turn gives a follow-up something to lean on
+    return QueryContext(store, user_text, topic=topic, fold=SESSION_FOLD)
+
+def remember_turn(session_id, ctx: QueryContext):
+    # an answer moves the topic to the KB entry it came from; anything else keeps it
+    if SESSIONS is None or not valid_session_id(session_id):
+        return
+    kind = ctx.event["type"] if ctx.event else "other"
+    topic = None
+    if kind in ANSWER_TYPES and ctx.hits:
+        topic = store.entry_embedding(ctx.hits[0])  # None if a KB reload moved the entry since
+    SESSIONS.add(session_id, ctx.text, kind, topic)
+
+# -------------------- Reply cache --------------------
+REPLY_CACHE = ReplyCache.from_env()
+
+def reply_version() -> str:
+    # anything that changes what smart_reply would say for the same text
+    llm = [os.getenv(k, "") for k in ("USE_LLM", "OPENAI_MODEL", "USE_OLLAMA", "OLLAMA_MODEL")]
+    return store.version + "|" + "|".join(llm)
+
+def _cache_lookup(user_text: str, session_id=None, degrade: int = 0):
+    """-> (cached reply or None, ctx, matches, version); version is None when the
+    reply should not be cached."""
+    with METRICS.span("scan"):
+        matches = GUARDRAILS.scan(user_text)
+    ctx = session_context(user_text, session_id, matches)
+    ctx.degrade = degrade
+    # chit-chat and refusals are already cheap; don't let them take cache slots.
+    # Follow-ups depend on the conversation, not just the text.
+    if (os.getenv("REPLY_CACHE", "1") != "1" or ctx.topic is not None or check_chitchat(user_text, matches)
+            or should_refuse_medical(user_text, matches)):
+        return None, ctx, matches, None
+
+    version = reply_version()
+    # shedding load (level 2+): exact hits only, the semantic tier would encode on every miss
+    vec_fn = (lambda: ctx.vec) if ctx.degrade < 2 else None
+    with METRICS.span("cache"):
+        hit, tier = REPLY_CACHE.get(user_text, version, vec_fn=vec_fn)
+    if hit is None:
+        return None, ctx, matches, version
+    reply, ev, top = hit
+    ctx.event, ctx.hits = ev, top
+    if ev:
+        METRICS.count(OUTCOMES.get(ev["type"], ev["type"]))
+        log_event({**ev, "q": user_text, "cached": tier})
+    return reply, ctx, matches, version
+
+def _cache_store(user_text: str, ctx: QueryContext, version: str, reply: str):
+    # a degraded reply is served from the cache while it lasts, but never stored in it;
+    # neither is a retrieval reply standing in for an LLM rewrite that failed or was cut
+    # off, so a short provider outage doesn't pin non-LLM replies for REPLY_CACHE_TTL
+    ev = ctx.event or {}
+    if version is not None and not ctx.degrade and not ev.get("llm_cut") and not ev.get("llm_failed"):
+        # the top hit rides along so a cache hit can still set the session topic
+        REPLY_CACHE.put(user_text, version, (reply, ctx.event, (ctx.hits or [])[:1]),
+                        vec=ctx.vec if ctx.encoded else None)
+
+def cached_reply(user_text: str, session_id=None, degrade: int = 0) -> str:
+    with METRICS.profile(), METRICS.span("request"):
+        reply, ctx, matches, version = _cache_lookup(user_text, session_id, degrade)
+        if reply is None:
+            reply = smart_reply(user_text, ctx=ctx, matches=matches)
+            _cache_store(user_text, ctx, version, reply)
+        remember_turn(session_id, ctx)
+    return reply
+
+def cached_reply_stream(user_text: str, session_id=None, degrade: int = 0):
+    with METRICS.span("request"):
+        reply, ctx, matches, version = _cache_lookup(user_text, session_id, degrade)
+        if reply is not None:
+            remember_turn(session_id, ctx)
+            yield reply
+            return
+        parts = []
+        for chunk in smart_reply_stream(user_text, ctx=ctx, matches=matches):
+            parts.append(chunk)
+            yield chunk
+        _cache_store(user_text, ctx, version, "".join(parts))
+        remember_turn(session_id, ctx)
+
+# -------------------- Batch scoring --------------------
+# BATCH_MAX: most messages one /api/chat/batch call may carry
+BATCH_MAX = int(os.getenv("BATCH_MAX", "10000"))
+
+def batch_reply(messages, k: int = 3) -> list:
+    """smart_reply's retrieval replies for many messages at once, for offline
+    evaluation: each distinct message is scanned once, everything that reaches
+    the domain filter is encoded in one model.encode call, and the KB top-k is
+    one index.search over all of those rows. No LLM rewrite, no chat log events.
+    -> [{"reply", "type", "score", "hits"}] in message order; "hits" are
+    draft_answer's hits (empty when the message never reached retrieval)."""
+    uniq = list(dict.fromkeys(messages))
+    results = {}
+    with METRICS.span("batch"):
+        pending = []
+        for text in uniq:
+            matches = GUARDRAILS.scan(text)
+            cc = check_chitchat(text, matches)
+            if cc:
+                results[text] = ("Coach FitEva:\n" + cc + "\n\n" + STEER_BACK, "chitchat", [])
+            elif should_refuse_medical(text, matches):
+                results[text] = (REFUSAL, "refusal", [])
+            elif not text.strip():
+                results[text] = (OUT_OF_SCOPE, "out_of_scope", [])
+            else:
+                pending.append((text, matches))
+
+        texts = [t for t, _ in pending]
+        q_embs = store.encode_batch(texts)
+        in_domain = [bool(m.get("fitness")) for _, m in pending]
+        if texts:
+            sims = ANCHOR_INDEX.max_sims(q_embs)
+            in_domain = [kw or bool(sim >= 0.22) for kw, sim in zip(in_domain, sims)]
+        rows = [r for r, ok in enumerate(in_domain) if ok]
+        hits_per_row = store.search_batch([texts[r] for r in rows], q_embs[rows], k=k)
+        found = dict(zip(rows, hits_per_row))
+
+        for r, (text, matches) in enumerate(pending):
+            if r not in found:
+                results[text] = (OUT_OF_SCOPE, "out_of_scope", [])
+                continue
+            out, hits = compose_answer(FEEDBACK.rerank(text, found[r], floor=ANSWER_THRESHOLD))
+            if out:
+                results[text] = ("Coach FitEva:\n" + out, "answer", hits)
+            else:
+                msg, ev = fallback_reply(text, matches)
+                results[text] = (msg, ev["type"], hits)
+
+    out = []
+    for text in messages:
+        reply, kind, hits = results[text]
+        out.append({"reply": reply, "type": kind, "score": hits[0]["score"] if hits else None, "hits": hits})
+    return out
 
 # -------------------- Web UI --------------------
 HTML = """
@@ -221,181 +484,7 @@ HTML = """
   <meta charset="utf-8">
   <title>Fitness & Nutrition Chatbot</title>
   <meta name="viewport" content="width=device-width, initial-scale=1" />
-  <style>
-   :root{
-  --bg: #0f141a;          /* page background */
-  --panel: #141a22;       /* cards/panels */
-  --panel-2: #0f151d;     /* chat bubble (bot) */
-  --panel-3: #1b2330;     /* chat bubble (me) */
-  --border: #222a35;
-  --text: #e6edf3;
-  --muted: #9aa0a6;
-  --input: #0f151d;
-  --accent: #3b82f6;      /* buttons/links */
-}
-:root[data-theme='light']{
-  --bg:#f7f9fc; --panel:#fff; --border:#d1d5db; --text:#111; --muted:#6b7280;
-  /* chat bubbles */
-  --bubble-me:#e0f2fe;         /* user bubble */
-  --bubble-me-text:#111;
-  --bubble-bot:#f3f4f6;        /* bot bubble */
-  --bubble-bot-text:#111;
-  /* buttons */
-  --btn-bg:#2563eb; --btn-border:#2563eb; --btn-text:#fff; --btn-hover:#1d4ed8;
-  --chip-bg:#f3f4f6; --chip-text:#374151; /* small feedback/quick-reply buttons */
-}
-
-:root[data-theme='dark']{
-  --bg:#0f141a; --panel:#141a22; --border:#222a35; --text:#e6edf3; --muted:#9aa0a6;
-  /* chat bubbles */
-  --bubble-me:#1b2330;
-  --bubble-me-text:#e6edf3;
-  --bubble-bot:#0f151d;
-  --bubble-bot-text:#e6edf3;
-  /* buttons */
-  --btn-bg:#3b82f6; --btn-border:#3b82f6; --btn-text:#fff; --btn-hover:#336fd1;
-  --chip-bg:#0f151d; --chip-text:#cfd4d9;
-}
-
-
-*{box-sizing:border-box}
-body{
-  margin:0; background:var(--bg); color:var(--text);
-  font-family:system-ui,-apple-system,Segoe UI,Roboto,Inter,Arial
-}
-header{
-  padding:16px 20px; background:var(--panel);
-  border-bottom:1px solid var(--border)
-}
-.wrap{max-width:820px;margin:0 auto;padding:20px}
-
-.card{
-  background:var(--panel);
-  border:1px solid var(--border);
-  border-radius:16px; overflow:hidden;
-  box-shadow:0 4px 12px rgba(0,0,0,.12);
-}
-/* Keep your base row flex */
-.row{ display:flex; gap:12px; margin:8px 0; }
-
-/* For bot rows: push bubble left, keep actions inline right */
-.row.bot{ align-items:flex-start; }
-
-.row.bot .actions{ margin-top:0; } /* keep aligned horizontally */
-
-/* For user rows: bubble stays on the right */
-.row.me{ justify-content:flex-end; }
-
-/* Quick replies: force below bubble */
-.row.bot .actions.quickreplies{
-  flex-basis:100%; /* take whole row under bubble */
-  margin-top:6px;
-}
-
-
-.bubble{
-  max-width:72%; 
-  padding:12px 14px; 
-  border-radius:14px; 
-  line-height:1.45;
-}
-.bubble.me{
-  background:var(--bubble-me);
-  color:var(--bubble-me-text);
-}
-.bubble.bot{
-  background:var(--bubble-bot);
-  color:var(--bubble-bot-text);
-  border:1px solid var(--border);
-  white-space:pre-wrap;
-}
-
-.footer{
-  display:flex; gap:10px; padding:12px;
-  background:var(--panel); border-top:1px solid var(--border);
-}
-input[type=text]{
-  flex:1; padding:12px 14px; border-radius:10px;
-  border:1px solid var(--border);
-  background:var(--panel); color:var(--text); outline:none;
-}
-
-button{
-  padding:12px 16px; border-radius:10px;
-  border:1px solid var(--btn-border);
-  background:var(--btn-bg); color:var(--btn-text); cursor:pointer;
-  transition: background .2s ease;
-}
-button:hover{ background:var(--btn-hover); }
-
-
-.actions{ display:flex; gap:8px; margin-top:6px; }
-.smallbtn{
-  font-size:12px; padding:6px 8px; border-radius:8px;
-  background:var(--chip-bg); border:1px solid var(--border);
-  color:var(--chip-text); cursor:pointer;
-}
-.smallbtn{
-  font-size:12px; padding:6px 10px; border-radius:8px;
-  background:var(--chip-bg); border:1px solid var(--border);
-  color:var(--chip-text); cursor:pointer;
-  transition: background .2s ease, color .2s ease;
-}
-.smallbtn:hover{
-  background:var(--btn-bg); 
-  color:var(--btn-text); 
-  border-color:var(--btn-border);
-}
-.smallbtn:disabled{ opacity:.6; cursor:default; }
-
-/* Mode toggle base */
-#themeToggle {
-  font-size: 14px;
-  padding: 6px 14px;
-  border-radius: 8px;
-  border: 1px solid #ccc;
-  cursor: pointer;
-  background: transparent;
-  color: inherit;
-  transition: background .2s ease, color .2s ease;
-}
-
-/* Hover in light mode */
-:root[data-theme='light'] #themeToggle:hover {
-  background: #000000;    /* white hover */
-  color: #eaeaea;        /* text stays dark, visible */
-  border-color: #ccc;
-}
-
-/* Hover in dark mode */
-:root[data-theme='dark'] #themeToggle:hover {
-  background: #ffffff;  /* black hover */
-  color: #111111;        /* text stays light, visible */
-  border-color: #444;
-}
-
-
-
-
-
-.chat{height:60vh;overflow:auto;padding:18px}
-.row{display:flex;gap:12px;margin:8px 0}
-.me{justify-content:flex-end}
-
-
-.toast{
-  position:fixed; bottom:20px; left:50%;
-  transform:translateX(-50%) translateY(20px);
-  background:var(--chip-bg); color:var(--text);
-  padding:10px 14px; border:1px solid var(--border);
-  border-radius:10px; box-shadow:0 6px 24px rgba(0,0,0,.15);
-  opacity:0; transition:opacity .2s ease, transform .2s ease;
-  pointer-events:none; font-size:14px; z-index:9999;
-}
-.toast.show{ opacity:1; transform:translateX(-50%) translateY(0); }
-
-
-  </style>
+  <link rel="stylesheet" href="{{ css_url }}">
 </head>
 <body data-theme="light">
   <header><div class="wrap"><strong>Fitness & Nutrition Chatbot</strong> <span class="hint">— demo (educational; not medical advice)</span>    <button id="themeToggle" class="smallbtn" style="float:right;">🌙 Dark Mode</button>
@@ -412,146 +501,141 @@ button:hover{ background:var(--btn-hover); }
   </main>
   <div id="toast" class="toast" aria-live="polite" aria-atomic="true"></div>
 
-
-
-<script>
-const root = document.documentElement;
-const toggleBtn = document.getElementById('themeToggle');
-
-// Check if user had a preference saved
-if(localStorage.getItem('theme')){
-  root.setAttribute('data-theme', localStorage.getItem('theme'));
-  toggleBtn.textContent = localStorage.getItem('theme') === 'light' ? "🌙 Dark Mode" : "☀️ Light Mode";
-}
-
-toggleBtn.addEventListener('click', ()=>{
-  const current = root.getAttribute('data-theme');
-  const next = current === 'light' ? 'dark' : 'light';
-  root.setAttribute('data-theme', next);
-  localStorage.setItem('theme', next);
-  toggleBtn.textContent = next === 'light' ? "🌙 Dark Mode" : "☀️ Light Mode";
-});
-
-const chat = document.getElementById('chat');
-const msg = document.getElementById('msg');
-const send = document.getElementById('send');
-const toastEl = document.getElementById('toast');
-let toastTimer = null;
-
-
-function showToast(text){
-  if(!toastEl) return;
-  toastEl.textContent = text;
-  toastEl.classList.add('show');
-  clearTimeout(toastTimer);
-  toastTimer = setTimeout(()=> toastEl.classList.remove('show'), 1600);
-}
-
-function addBubble(text, who, options){
-  const row = document.createElement('div');
-  row.className = 'row ' + (who==='me' ? 'me' : 'bot');
-  const b = document.createElement('div');
-  b.className = 'bubble ' + (who==='me' ? 'me' : 'bot');
-  b.textContent = text;
-  row.appendChild(b);
-
-  // Feedback buttons (bot messages only)
-if (who !== 'me') {
-  const actions = document.createElement('div');
-  actions.className = 'actions';
-  actions.innerHTML = `
-    <button class="smallbtn" data-fb="up">👍 Helpful</button>
-    <button class="smallbtn" data-fb="down">👎 Not helpful</button>
-  `;
-  actions.addEventListener('click', async (e)=>{
-    const val = e.target.getAttribute('data-fb');
-    if(!val) return;
-    // disable both buttons after one click
-    actions.querySelectorAll('button').forEach(b=> b.disabled = true);
-
-    try{
-      const r = await fetch('/api/feedback', {
-        method:'POST',
-        headers:{'Content-Type':'application/json'},
-        body:JSON.stringify({q: window._lastUserQ || "", useful: (val==="up")})
-      });
-      const j = await r.json();
-      if (j && j.ok){
-        showToast(val === 'up' ? '✅ Feedback saved — thanks!' : '✅ Noted — we’ll improve this.');
-      } else {
-        showToast('⚠️ Could not save feedback.');
-      }
-    }catch(err){
-      showToast('⚠️ Network error saving feedback.');
-    }
-  });
-  row.appendChild(actions);
-}
-
-
-  // NEW: quick-reply buttons
-  if (options && options.length > 0) {
-    const qr = document.createElement('div');
-qr.className = 'actions quickreplies';
-    options.forEach(opt=>{
-      const btn = document.createElement('button');
-      btn.className = 'smallbtn';
-      btn.textContent = opt;
-      btn.addEventListener('click', ()=>{
-        msg.value = opt;  // autofill input
-        ask();            // auto-send
-      });
-      qr.appendChild(btn);
-    });
-    row.appendChild(qr);
-  }
-
-  chat.appendChild(row);
-  chat.scrollTop = chat.scrollHeight;
-}
-
-
-async function ask(){
-  const text = msg.value.trim();
-  if(!text) return;
-  window._lastUserQ = text;
-  addBubble(text,'me');
-  msg.value='';
-  const r = await fetch('/api/chat', {
-    method:'POST',
-    headers:{'Content-Type':'application/json'},
-    body:JSON.stringify({message:text})
-  });
-  const j = await r.json();
-  addBubble(j.reply,'bot', j.options || []);
-}
-
-
-send.addEventListener('click', ask);
-msg.addEventListener('keydown', (e)=>{ if(e.key==='Enter') ask(); });
-
-addBubble("Hi! I’m Coach FitEva. Ask me about pre-workout, post-workout, protein, hydration, a 20-minute workout, fat-loss basics, or supplement timing.","bot");
-</script>
+<script src="{{ js_url }}"></script>
 </body>
 </html>
 """
 
+@app.before_request
+def _start_watchers():
+    KB_WATCHER.start()
+    FEEDBACK_TAILER.start()
+
+# rendered and compressed once; CSS/JS live in static/ under content-hashed URLs
+STATIC = load_static()
+with app.app_context():
+    PAGE = Asset(render_template_string(HTML, css_url=url_for_asset(STATIC, "chat.css"),
+                                        js_url=url_for_asset(STATIC, "chat.js")).encode("utf-8"),
+                 "text/html; charset=utf-8")
+
+def _asset_response(asset: Asset, cache_control: str) -> Response:
+    status, headers, body = asset.serve(request.method, {k.lower(): v for k, v in request.headers.items()},
+                                        cache_control)
+    return Response(body, status=status, headers=headers)
+
 @app.route("/")
 def home():
-    return render_template_string(HTML)
+    return _asset_response(PAGE, REVALIDATE)
 
-@app.route("/api/chat", methods=["POST"])
-def chat_api():
-    data = request.get_json(force=True)
-    user_text = data.get("message","")
-    reply = smart_reply(user_text)
+@app.route("/static/<name>")
+def static_file(name):
+    asset = STATIC.get(name)
+    if asset is None:
+        abort(404)
+    return _asset_response(asset, cache_control_for(asset, request.args.get("v")))
 
+def reply_options(reply: str) -> list:
     # If steer back is in reply, add quick-reply suggestions
     options = []
     if "workouts or nutrition" in reply.lower():
         options = ["Workouts", "Nutrition"]
+    return options
+
+# -------------------- Admission control --------------------
+# Bounds concurrent replies and sheds load in steps (see admission.py); ADMISSION=0 turns it off
+ADMISSION = Admission.from_env() if os.getenv("ADMISSION", "1") == "1" else None
+if ADMISSION is not None:
+    METRICS.gauge("chat_degrade_level", "Load-shedding level a request arriving now gets (0 = full reply).",
+                  lambda: ADMISSION.level)
+    METRICS.gauge("chat_inflight", "Replies being computed.", lambda: ADMISSION.inflight)
+    METRICS.gauge("chat_queued", "Requests waiting for a reply slot.", lambda: ADMISSION.queued)
+
+def client_key() -> str:
+    # the address the nearest proxy saw (last X-Forwarded-For hop), not one the client can pick
+    route = request.access_route
+    return route[-1] if route else (request.remote_addr or "")
+
+def admit() -> int:
+    """-> degradation level for this request; raises Overloaded. Pair with ADMISSION.release()."""
+    return ADMISSION.acquire(client_key()) if ADMISSION is not None else 0
+
+def release():
+    if ADMISSION is not None:
+        ADMISSION.release()
+
+@app.errorhandler(Overloaded)
+def overloaded(e: Overloaded):
+    METRICS.count("rejected")
+    resp = jsonify({"error": "overloaded", "reason": e.reason, "retry_after": round(e.retry_after, 2)})
+    resp.headers["Retry-After"] = str(max(1, int(e.retry_after + 0.999)))
+    return resp, 429
+
+@app.route("/api/chat", methods=["POST"])
+def chat_api():
+    data = request.get_json(force=True)
+    user_text = data.get("message","")
+    level = admit()
+    try:
+        reply = cached_reply(user_text, data.get("session_id"), degrade=level)
+    finally:
+        release()
+    return jsonify({"reply": reply, "options": reply_options(reply)})
+
+@app.route("/api/chat/batch", methods=["POST"])
+def chat_batch_api():
+    # {"messages": ["...", ...], "k": 3} -> {"results": [...]} (see batch_reply)
+    data = request.get_json(force=True)
+    messages = data.get("messages")
+    if not isinstance(messages, list) or not all(isinstance(m, str) for m in messages):
+        return jsonify({"error": "messages must be a list of strings"}), 400
+    if len(messages) > BATCH_MAX:
+        return jsonify({"error": f"at most {BATCH_MAX} messages per batch"}), 413
+    k = data.get("k", 3)
+    if not isinstance(k, int) or isinstance(k, bool) or not 1 <= k <= 100:
+        return jsonify({"error": "k must be an integer from 1 to 100"}), 400
+    # one admission slot per batch: it waits behind (and sheds with) the chat traffic
+    # instead of running beside it; batch replies are never degraded
+    admit()
+    try:
+        return jsonify({"results": batch_reply(messages, k=k)})
+    finally:
+        release()
 
-    return jsonify({"reply": reply, "options": options})
+@app.route("/api/chat/stream", methods=["POST"])
+def chat_stream_api():
+    # Server-Sent Events: one `data: {"t": "<text>"}` per chunk, then `event: done`
+    data = request.get_json(force=True)
+    user_text = data.get("message","")
+    level = admit()  # released when the response is closed, even if the client leaves early
+
+    def events():
+        parts = []
+        for chunk in cached_reply_stream(user_text, data.get("session_id"), degrade=level):
+            parts.append(chunk)
+            yield "data: " + json.dumps({"t": chunk}, ensure_ascii=False) + "\n\n"
+        yield "event: done\ndata: " + json.dumps({"options": reply_options("".join(parts))}) + "\n\n"
+
+    resp = Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    resp.call_on_close(release)
+    return resp
+
+@app.route("/api/ready")
+def ready():
+    # readiness probe: 200 once the model/index are loaded; chit-chat, guardrails and
+    # lexical answers are served before that
+    ok = semantic_ready()
+    body = {"ready": ok, "warmup": MODEL_WARMUP, "error": WARMUP_ERROR,
+            "load": ADMISSION.stats() if ADMISSION is not None else None}
+    return jsonify(body), (200 if ok else 503)
+
+@app.route("/metrics")
+def metrics():
+    return Response(METRICS.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/api/cache/stats")
+def cache_stats():
+    return jsonify(REPLY_CACHE.stats())
 
 @app.route("/api/feedback", methods=["POST"])
 def feedback():
@@ -0,0 +1,133 @@
+# asgi_app.py
+# Async entry point with the same HTTP contract as the Flask app in app.py:
+#   GET /   GET /static/<name>   POST /api/chat   POST /api/chat/stream   POST /api/feedback
+#
+#   uvicorn asgi_app:app --host 0.0.0.0 --port $PORT
+#
+# Guardrails, encoding and retrieval are CPU-bound and run in a bounded thread
+# pool (ASGI_ENCODE_THREADS); the LLM call uses non-blocking HTTP, so one process
+# can hold hundreds of chats that are waiting on the provider.
+#
+# No admission control / load shedding here (admission.py blocks a thread per
+# waiting request, which is what this entry point avoids): the pool size is the
+# only bound, and excess work queues in front of it.
+import asyncio, json, os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+import app as chat
+from llm import agenerate_answer
+from logger import log_event
+from metrics import METRICS
+from static_assets import REVALIDATE, cache_control_for
+
+MAX_BODY = 64 * 1024
+POOL = ThreadPoolExecutor(max_workers=int(os.getenv("ASGI_ENCODE_THREADS", str(os.cpu_count() or 2))),
+                          thread_name_prefix="asgi-encode")
+
+async def areply(user_text: str, session_id=None) -> str:
+    # cached_reply / smart_reply, with the LLM step awaited instead of blocking a thread
+    loop = asyncio.get_running_loop()
+    with METRICS.span("request"):
+        reply, ctx, matches, version = await loop.run_in_executor(POOL, chat._cache_lookup, user_text, session_id)
+        if reply is not None:
+            await loop.run_in_executor(POOL, chat.remember_turn, session_id, ctx)  # SESSION_STORE=sqlite is disk I/O
+            return reply
+        reply, draft = await loop.run_in_executor(POOL, chat.plan_reply, user_text, ctx, matches)
+        if reply is None:
+            out, hits = draft
+            with METRICS.span("llm"):
+                llm_text = await agenerate_answer(chat.build_grounded_prompt(user_text, hits))
+            reply = chat.finish_llm_reply(user_text, ctx, out, hits, llm_text)
+        chat._cache_store(user_text, ctx, version, reply)
+        await loop.run_in_executor(POOL, chat.remember_turn, session_id, ctx)
+    return reply
+
+async def _read_json(receive) -> dict:
+    body, more = b"", True
+    while more:
+        msg = await receive()
+        body += msg.get("body", b"")
+        more = msg.get("more_body", False)
+        if len(body) > MAX_BODY:
+            raise ValueError("body too large")
+    data = json.loads(body or b"{}")
+    if not isinstance(data, dict):
+        raise ValueError("expected a JSON object")
+    return data
+
+async def _send(send, status: int, body: bytes, content_type: str, extra=()):
+    headers = [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode()), *extra]
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+async def _send_json(send, obj, status: int = 200):
+    await _send(send, status, json.dumps(obj, ensure_ascii=False).encode("utf-8"), "application/json")
+
+async def _send_asset(send, scope, asset, cache_control: str):
+    # the same pre-rendered, pre-compressed bytes the Flask app serves (static_assets.py)
+    headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+    status, out, body = asset.serve(scope["method"], headers, cache_control)
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(k.lower().encode(), v.encode()) for k, v in out]})
+    await send({"type": "http.response.body", "body": body})
+
+async def _lifespan(receive, send):
+    while True:
+        msg = await receive()
+        if msg["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif msg["type"] == "lifespan.shutdown":
+            POOL.shutdown(wait=True)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+    path, method = scope["path"], scope["method"]
+    chat.KB_WATCHER.start()
+    chat.FEEDBACK_TAILER.start()
+
+    if path == "/" or path.startswith("/static/"):
+        if method not in ("GET", "HEAD"):
+            return await _send_json(send, {"error": "method not allowed"}, 405)
+        if path == "/":
+            return await _send_asset(send, scope, chat.PAGE, REVALIDATE)
+        asset = chat.STATIC.get(path[len("/static/"):])
+        if asset is None:
+            return await _send_json(send, {"error": "not found"}, 404)
+        v = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("v", [None])[0]
+        return await _send_asset(send, scope, asset, cache_control_for(asset, v))
+
+    if path == "/metrics":
+        return await _send(send, 200, METRICS.render().encode("utf-8"), "text/plain; version=0.0.4")
+
+    if path == "/api/ready":
+        ok = chat.semantic_ready()
+        return await _send_json(send, {"ready": ok, "warmup": chat.MODEL_WARMUP, "error": chat.WARMUP_ERROR},
+                                200 if ok else 503)
+
+    if path not in ("/api/chat", "/api/chat/stream", "/api/feedback"):
+        return await _send_json(send, {"error": "not found"}, 404)
+    if method != "POST":
+        return await _send_json(send, {"error": "method not allowed"}, 405)
+    try:
+        data = await _read_json(receive)
+    except ValueError:
+        return await _send_json(send, {"error": "bad request"}, 400)
+
+    if path == "/api/feedback":
+        log_event({"type":"feedback", "q": data.get("q",""), "useful": bool(data.get("useful"))})
+        return await _send_json(send, {"ok": True})
+
+    reply = await areply(data.get("message",""), data.get("session_id"))
+    options = chat.reply_options(reply)
+    if path == "/api/chat":
+        return await _send_json(send, {"reply": reply, "options": options})
+    # no token streaming here yet: the whole reply goes out as one SSE frame
+    body = ("data: " + json.dumps({"t": reply}, ensure_ascii=False) + "\n\n"
+            "event: done\ndata: " + json.dumps({"options": options}) + "\n\n").encode("utf-8")
+    await _send(send, 200, body, "text/event-stream", [(b"cache-control", b"no-cache")])
@@ -0,0 +1,69 @@
+# batch_encoder.py
+# Coalesces concurrent single-query encodes into one model.encode() call.
+# A batch is flushed when it reaches max_batch texts or when the oldest queued
+# text has waited max_wait_ms, whichever comes first.
+import os, queue, threading, time
+from concurrent.futures import Future
+from typing import List
+import numpy as np
+
+class BatchEncoder:
+    def __init__(self, model, max_batch: int = 32, max_wait_ms: float = 4.0):
+        self.model = model
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._start_lock = threading.Lock()
+        self._start()
+
+    def _start(self):
+        # threads don't survive fork (gunicorn --preload): each process starts its own
+        self._pid = os.getpid()
+        self._q: "queue.Queue[tuple]" = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="batch-encoder", daemon=True)
+        self._worker.start()
+
+    @classmethod
+    def from_env(cls, model) -> "BatchEncoder":
+        return cls(model,
+                   max_batch=int(os.getenv("ENCODER_MAX_BATCH", "32")),
+                   max_wait_ms=float(os.getenv("ENCODER_MAX_WAIT_MS", "4")))
+
+    def submit(self, text: str, normalize_embeddings: bool = True) -> Future:
+        if self._pid != os.getpid():
+            with self._start_lock:
+                if self._pid != os.getpid():
+                    self._start()
+        fut = Future()
+        self._q.put((text, normalize_embeddings, fut))
+        return fut
+
+    def encode(self, texts: List[str], normalize_embeddings: bool = True) -> np.ndarray:
+        # same call shape as SentenceTransformer.encode for the query path
+        futs = [self.submit(t, normalize_embeddings) for t in texts]
+        if not futs:
+            return np.zeros((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+        return np.stack([f.result() for f in futs])
+
+    def _run(self):
+        while True:
+            batch = [self._q.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._q.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            # one model call per normalize flag; the query path always asks for normalized vectors
+            for norm in sorted({n for _, n, _ in batch}, reverse=True):
+                part = [(t, fut) for t, n, fut in batch if n == norm]
+                try:
+                    embs = self.model.encode([t for t, _ in part], normalize_embeddings=norm)
+                except Exception as e:
+                    for _, fut in part:
+                        fut.set_exception(e)
+                    continue
+                for (_, fut), emb in zip(part, embs):
+                    fut.set_result(np.asarray(emb, dtype=np.float32))
@@ -0,0 +1,91 @@
+# bench/async_load.py
+# Closed-loop load test of the Procfile setup (gunicorn app:app --workers=1 --threads=2)
+# vs. the ASGI entry point (uvicorn asgi_app:app), both with USE_LLM=1 against the
+# local fake LLM so most of each request is spent waiting on the provider.
+#
+#   python -m bench.async_load --users 10 50 200 --seconds 15 --first-token-ms 800
+import argparse, asyncio, json, os, subprocess, sys, tempfile, time
+import httpx
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench.fake_llm import serve
+
+QUESTIONS = ["how much protein do i need?", "what should I eat before running?", "20 minute home workout",
+             "hydration plan for lifting", "creatine timing", "post workout meal ideas"]
+
+SERVERS = {
+    "gunicorn_procfile": ["gunicorn", "app:app", "--workers=1", "--threads=2", "--timeout=120", "-b", "127.0.0.1:{port}"],
+    "uvicorn_asgi": ["uvicorn", "asgi_app:app", "--host", "127.0.0.1", "--port", "{port}", "--log-level", "warning"],
+}
+
+def _wait_ready(url: str, timeout: float = 180.0):
+    t_end = time.time() + timeout
+    while time.time() < t_end:
+        try:
+            if httpx.get(url, timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"{url} did not come up")
+
+async def _load(url: str, users: int, seconds: float) -> dict:
+    lat, errors = [], 0
+    stop = time.perf_counter() + seconds
+
+    async def user(i: int, client: httpx.AsyncClient):
+        nonlocal errors
+        n = i
+        while time.perf_counter() < stop:
+            q = QUESTIONS[n % len(QUESTIONS)] + f" #{n}"  # unique text: no reply-cache hits
+            n += users
+            t0 = time.perf_counter()
+            try:
+                r = await client.post(url + "/api/chat", json={"message": q})
+                r.raise_for_status()
+                lat.append(time.perf_counter() - t0)
+            except httpx.HTTPError:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(limits=limits, timeout=130) as client:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(user(i, client) for i in range(users)))
+        wall = time.perf_counter() - t0
+    arr = np.array(lat) * 1000 if lat else np.zeros(1)
+    return {"users": users, "requests": len(lat), "errors": errors, "rps": round(len(lat) / wall, 1),
+            "p50_ms": round(float(np.percentile(arr, 50)), 1), "p99_ms": round(float(np.percentile(arr, 99)), 1)}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, nargs="+", default=[10, 50, 200])
+    ap.add_argument("--seconds", type=float, default=15)
+    ap.add_argument("--first-token-ms", type=float, default=800)
+    ap.add_argument("--servers", nargs="+", default=list(SERVERS), choices=list(SERVERS))
+    args = ap.parse_args()
+
+    llm_port, app_port = 8092, 8093
+    serve(llm_port, first_token_ms=args.first_token_ms, token_ms=0, n_tokens=40, background=True)
+    tmp = tempfile.mkdtemp()
+    env = {**os.environ, "USE_LLM": "1", "OPENAI_API_KEY": "fake",
+           "OPENAI_BASE_URL": f"http://127.0.0.1:{llm_port}/v1", "REPLY_CACHE": "0",
+           "CHAT_LOG_FILE": os.path.join(tmp, "chat_logs.jsonl")}
+
+    report = {}
+    for name in args.servers:
+        cmd = [c.format(port=app_port) for c in SERVERS[name]]
+        proc = subprocess.Popen(cmd, cwd=ROOT, env=env)
+        try:
+            _wait_ready(f"http://127.0.0.1:{app_port}/")
+            report[name] = [asyncio.run(_load(f"http://127.0.0.1:{app_port}", u, args.seconds)) for u in args.users]
+        finally:
+            proc.terminate()
+            proc.wait(30)
+        print(json.dumps({name: report[name]}), flush=True)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# bench/batch_throughput.py
+# Scoring a question file through batch_reply (/api/chat/batch) vs. one
+# smart_reply per question, the per-request path. Reports questions/s for
+# both and how many replies differ (expected: none).
+#
+#   python -m bench.batch_throughput --n 10000
+#   python -m bench.batch_throughput --queries qa_questions.jsonl --n 0   # the file as-is
+#   python -m bench.batch_throughput --stub-encoder   # no torch; bench.common.StubEncoder
+#
+# With --n the logged questions are cycled and numbered ("... #17") so every
+# message is distinct and batch_reply's de-duplication doesn't flatter it.
+import argparse, json, os, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.common import DEFAULT_LOG, load_queries, offline_env, run_meta, use_stub_encoder
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--queries", nargs="+", default=[DEFAULT_LOG])
+    ap.add_argument("--n", type=int, default=10_000, help="questions to score; 0 = the files as-is")
+    ap.add_argument("--chunk", type=int, default=0, help="messages per batch_reply call; 0 = all at once")
+    ap.add_argument("--out")
+    ap.add_argument("--stub-encoder", action="store_true", help="hash-based stand-in for the sentence model")
+    args = ap.parse_args()
+
+    base = load_queries(*args.queries)
+    if not base:
+        sys.exit("no queries found in " + ", ".join(args.queries))
+    qs = base if args.n <= 0 else [f"{base[i % len(base)]} #{i}" for i in range(args.n)]
+    if args.stub_encoder:
+        use_stub_encoder()
+    os.environ.update(offline_env("off"))
+
+    import app as app_mod
+    app_mod.warm_up()
+    app_mod.smart_reply(qs[0])
+
+    t0 = time.perf_counter()
+    single = [app_mod.smart_reply(q) for q in qs]
+    t_single = time.perf_counter() - t0
+
+    chunk = args.chunk or len(qs)
+    t0 = time.perf_counter()
+    batch = []
+    for s in range(0, len(qs), chunk):
+        batch += [r["reply"] for r in app_mod.batch_reply(qs[s:s + chunk])]
+    t_batch = time.perf_counter() - t0
+
+    report = {
+        "meta": run_meta(args),
+        "n": len(qs),
+        "per_request": {"seconds": round(t_single, 3), "qps": round(len(qs) / t_single, 1)},
+        "batch": {"seconds": round(t_batch, 3), "qps": round(len(qs) / t_batch, 1), "chunk": chunk},
+        "speedup": round(t_single / t_batch, 2),
+        "reply_mismatches": sum(a != b for a, b in zip(single, batch)),
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# bench/bm25_index.py
+# Build time, size and query latency of lexical_index.BM25Index on a synthetic
+# article KB (chunks of ~130 Zipf-distributed words, like ingest.py output),
+# plus what a worker pays when the index comes from its data/cache .npz instead.
+#
+#   python -m bench.bm25_index --chunks 2000 20000 100000
+import argparse, json, os, random, sys, tempfile, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.common import run_meta
+from embeddings_store import load_lexical
+
+def synthetic_kb(n: int, rng: random.Random, vocab_size: int = 30_000, words: int = 130) -> list:
+    vocab = [f"w{i}" for i in range(vocab_size)]
+    weights = [1 / (i + 1) for i in range(vocab_size)]
+    kb = []
+    for _ in range(n):
+        w = rng.choices(vocab, weights, k=words)
+        kb.append({"q": "title " + " ".join(w[:words - 10]), "a": " ".join(w[10:])})
+    return kb, vocab
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--chunks", type=int, nargs="+", default=[2000, 20000])
+    ap.add_argument("--queries", type=int, default=500)
+    args = ap.parse_args()
+    rng = random.Random(0)
+    rows = []
+    for n in args.chunks:
+        kb, vocab = synthetic_kb(n, rng)
+        queries = [" ".join(rng.choices(vocab[:3000], k=5)) for _ in range(args.queries)]
+        with tempfile.TemporaryDirectory() as cache:
+            t0 = time.perf_counter()
+            index = load_lexical(kb, cache)  # cold: tokenizes the KB and writes the .npz
+            build_s = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            cached = load_lexical(kb, cache)  # a second worker / restart
+            load_s = time.perf_counter() - t0
+            npz_bytes = sum(os.path.getsize(os.path.join(cache, f)) for f in os.listdir(cache))
+        t0 = time.perf_counter()
+        for q in queries:
+            cached.search(q)
+        search_ms = (time.perf_counter() - t0) * 1000 / len(queries)
+        arrays = sum(a.nbytes for a in (index.indptr, index.docs, index.tfs, index.doc_len, index.idf, index.norm))
+        rows.append({"chunks": n, "terms": len(index.vocab), "postings": int(index.docs.size),
+                     "build_s": round(build_s, 2), "cached_load_s": round(load_s, 3),
+                     "postings_mb": round(arrays / 2**20, 1), "npz_mb": round(npz_bytes / 2**20, 1),
+                     "search_ms": round(search_ms, 3)})
+        print(json.dumps(rows[-1]), flush=True)
+    print(json.dumps({"meta": run_meta(args), "results": rows}, indent=2))
+
+if __name__ == "__main__":
+    main()
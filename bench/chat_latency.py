@@ -0,0 +1,58 @@
+# bench/chat_latency.py
+# p50/p99 latency of POST /api/chat, replaying the questions in data/chat_logs.jsonl.
+#
+#   python -m bench.chat_latency                  # current code (cached anchor index)
+#   python -m bench.chat_latency --legacy-anchors # old behaviour: re-encode anchors per request
+import argparse, json, os, sys, time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.common import load_queries, offline_env
+
+class _ReencodeAnchors:
+    # what is_in_fitness_domain used to do: encode every anchor on every call
+    def __init__(self, model, anchors):
+        self.model, self.anchors = model, anchors
+
+    def max_sim(self, q_emb):
+        anchors = self.model.encode(self.anchors, normalize_embeddings=True)
+        return float((np.atleast_2d(q_emb) @ anchors.T).max())
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--log", default=os.path.join("data", "chat_logs.jsonl"))
+    ap.add_argument("--rounds", type=int, default=5)
+    ap.add_argument("--legacy-anchors", action="store_true")
+    args = ap.parse_args()
+
+    # chat log in a temp dir, LLM off and REPLY_CACHE=0: replaying the same questions for
+    # --rounds would otherwise time exact-cache lookups, not the request path
+    os.environ.update(offline_env("off"))
+    import app as app_mod
+    if args.legacy_anchors:
+        app_mod.ANCHOR_INDEX = _ReencodeAnchors(app_mod.store.model, app_mod.FITNESS_ANCHORS)
+
+    client = app_mod.app.test_client()
+    queries = load_queries(args.log)
+    for q in queries[:10]:  # warm-up
+        client.post("/api/chat", json={"message": q})
+
+    lat = []
+    for _ in range(args.rounds):
+        for q in queries:
+            t0 = time.perf_counter()
+            client.post("/api/chat", json={"message": q})
+            lat.append((time.perf_counter() - t0) * 1000)
+
+    lat = np.array(lat)
+    print(json.dumps({
+        "mode": "legacy_anchors" if args.legacy_anchors else "anchor_index",
+        "requests": int(lat.size),
+        "p50_ms": round(float(np.percentile(lat, 50)), 3),
+        "p99_ms": round(float(np.percentile(lat, 99)), 3),
+        "mean_ms": round(float(lat.mean()), 3),
+    }))
+
+if __name__ == "__main__":
+    main()
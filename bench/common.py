@@ -0,0 +1,108 @@
+# bench/common.py
+# Helpers shared by the benchmarks: query loading, latency summaries, run metadata,
+# the offline LLM setup (bench/fake_llm.py behind the OpenAI-compatible backend)
+# and a stub sentence encoder for --stub-encoder runs.
+import hashlib, json, os, platform, subprocess, sys, tempfile, time, types
+from typing import Dict, Iterable, List
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_LOG = os.path.join("data", "chat_logs.jsonl")
+
+def load_queries(*paths: str) -> List[str]:
+    """User messages from JSONL files: the `q` of chat log events (feedback excluded)
+    or the `message` of captured /api/chat bodies. Order and duplicates are kept."""
+    qs = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    ev = json.loads(line)
+                except ValueError:
+                    continue
+                if not isinstance(ev, dict) or ev.get("type") == "feedback":
+                    continue
+                q = ev.get("q") or ev.get("message")
+                if isinstance(q, str) and q:
+                    qs.append(q)
+    return qs
+
+def summarize(lat_s: Iterable[float], wall_s: float = None) -> Dict[str, float]:
+    arr = np.asarray(list(lat_s), dtype=np.float64) * 1000
+    if not len(arr):
+        return {"n": 0}
+    out = {"n": int(len(arr)), "mean_ms": round(float(arr.mean()), 3)}
+    for p in (50, 95, 99):
+        out[f"p{p}_ms"] = round(float(np.percentile(arr, p)), 3)
+    out["max_ms"] = round(float(arr.max()), 3)
+    if wall_s:
+        out["rps"] = round(len(arr) / wall_s, 1)
+    return out
+
+def run_meta(args=None) -> dict:
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                             text=True).stdout.strip() or None
+    except OSError:
+        sha = None
+    keys = ("USE_LLM", "VECTOR_INDEX", "RETRIEVAL", "ENCODER_BATCH", "REPLY_CACHE", "METRICS", "LOG_ASYNC",
+            "STUB_ENCODER")
+    return {
+        "ts": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git": sha,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "env": {k: os.environ[k] for k in keys if k in os.environ},
+        "args": vars(args) if args is not None else None,
+    }
+
+def offline_env(llm: str = "fake", llm_port: int = 8096, first_token_ms: float = 50, token_ms: float = 2) -> dict:
+    """Env for an offline run: chat log in a temp dir, reply cache off, and the LLM
+    either off or served by the local fake. Starts the fake server when needed."""
+    env = {"CHAT_LOG_FILE": os.path.join(tempfile.mkdtemp(), "chat_logs.jsonl"), "REPLY_CACHE": "0"}
+    if llm == "fake":
+        from bench.fake_llm import serve
+        serve(llm_port, first_token_ms=first_token_ms, token_ms=token_ms, n_tokens=40, background=True)
+        env.update(USE_LLM="1", USE_OLLAMA="0", OPENAI_API_KEY="fake",
+                   OPENAI_BASE_URL=f"http://127.0.0.1:{llm_port}/v1")
+    else:
+        env["USE_LLM"] = "0"
+    return env
+
+class StubEncoder:
+    """Stands in for sentence_transformers.SentenceTransformer: each word hashed into
+    one of `dim` buckets, and every encode() call sleeps call_ms + text_ms per text,
+    roughly a small model on CPU. Lets the app-overhead benches run (and be
+    reproduced) without torch; their numbers then exclude real model cost."""
+
+    call_ms, text_ms = 2.0, 0.5
+
+    def __init__(self, model_name: str = "", dim: int = 384, **_):
+        self.model_name, self.dim = model_name, dim
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(self, texts, normalize_embeddings: bool = False, batch_size: int = 32, **_):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        time.sleep((self.call_ms + self.text_ms * len(texts)) / 1000)
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, t in enumerate(texts):
+            for w in t.lower().split():
+                out[i, int(hashlib.md5(w.encode("utf-8")).hexdigest(), 16) % self.dim] += 1.0
+            out[i, 0] += 0.1  # no all-zero rows
+        if normalize_embeddings:
+            out /= np.linalg.norm(out, axis=1, keepdims=True)
+        return out[0] if single else out
+
+def use_stub_encoder():
+    """Make `from sentence_transformers import SentenceTransformer` return StubEncoder.
+    Call before importing app. Embedding caches go to a temp dir so stub vectors never
+    land in data/cache next to the real model's."""
+    mod = types.ModuleType("sentence_transformers")
+    mod.SentenceTransformer = StubEncoder
+    sys.modules["sentence_transformers"] = mod
+    os.environ["EMB_CACHE_DIR"] = tempfile.mkdtemp()
+    os.environ["STUB_ENCODER"] = "1"  # recorded by run_meta
@@ -0,0 +1,70 @@
+# bench/encoder_load.py
+# Throughput of N threads each encoding single queries, calling the model
+# directly (one forward pass per query) vs. through BatchEncoder.
+#
+#   python -m bench.encoder_load --threads 16 --per-thread 50 --max-batch 32 --max-wait-ms 4
+import argparse, json, os, sys, threading, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch_encoder import BatchEncoder
+from embeddings_store import DEFAULT_MODEL
+
+def _run(encode, queries, threads: int, per_thread: int) -> dict:
+    lat = []
+    lock = threading.Lock()
+
+    def worker(tid):
+        mine = []
+        for j in range(per_thread):
+            q = queries[(tid * per_thread + j) % len(queries)]
+            t0 = time.perf_counter()
+            encode([q])
+            mine.append(time.perf_counter() - t0)
+        with lock:
+            lat.extend(mine)
+
+    ts = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    t0 = time.perf_counter()
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    wall = time.perf_counter() - t0
+    lat.sort()
+    return {
+        "queries": len(lat),
+        "qps": round(len(lat) / wall, 1),
+        "p50_ms": round(lat[len(lat) // 2] * 1000, 3),
+        "p99_ms": round(lat[min(len(lat) - 1, int(len(lat) * 0.99))] * 1000, 3),
+    }
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--threads", type=int, default=16)
+    ap.add_argument("--per-thread", type=int, default=50)
+    ap.add_argument("--max-batch", type=int, default=32)
+    ap.add_argument("--max-wait-ms", type=float, default=4.0)
+    ap.add_argument("--model", default=DEFAULT_MODEL)
+    args = ap.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(args.model)
+    queries = [
+        "how much protein do i need?", "what should I eat before running?",
+        "no water to workout", "20 minute workout at home", "creatine timing",
+        "how to lose belly fat", "electrolytes for a long ride", "post workout snack",
+    ]
+    model.encode(queries, normalize_embeddings=True)  # warm-up
+
+    direct = _run(lambda ts: model.encode(ts, normalize_embeddings=True), queries, args.threads, args.per_thread)
+    enc = BatchEncoder(model, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+    batched = _run(enc.encode, queries, args.threads, args.per_thread)
+    print(json.dumps({
+        "threads": args.threads, "max_batch": args.max_batch, "max_wait_ms": args.max_wait_ms,
+        "direct": direct, "batched": batched,
+        "speedup": round(batched["qps"] / direct["qps"], 2) if direct["qps"] else None,
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# bench/fake_llm.py
+# Local stand-in for the LLM backends so streaming can be tested and benchmarked offline.
+# Speaks the two APIs llm.py uses:
+#   POST /v1/chat/completions   OpenAI chat completions (JSON, or SSE with "stream": true)
+#   POST /api/generate          Ollama (JSON, or NDJSON with "stream": true)
+#
+#   python -m bench.fake_llm --port 8089 --first-token-ms 300 --token-ms 20
+#   python -m bench.fake_llm --fail-rate 0.3 --hang-rate 0.05 --jitter-ms 200   # fault injection
+#   USE_LLM=1 OPENAI_API_KEY=x OPENAI_BASE_URL=http://127.0.0.1:8089/v1 python app.py
+#   USE_LLM=1 USE_OLLAMA=1 OLLAMA_HOST=http://127.0.0.1:8089 python app.py
+import argparse, json, random, re, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def fake_completion(prompt: str, n_tokens: int) -> list:
+    # echo back the first source so the answer still looks grounded
+    m = re.search(r"Source 1 \(score=[^)]*\):\n(.*?)(?:\n\n|$)", prompt, re.S)
+    body = m.group(1) if m else "Here are some general fitness tips."
+    words = (body + " References: Source 1").split(" ")
+    while len(words) < n_tokens:
+        words += words
+    return [w + " " for w in words[:n_tokens]]
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # headers and body go out in separate writes
+    first_token_s = 0.3
+    token_s = 0.02
+    n_tokens = 60
+    # fault injection, applied per request before any byte is sent
+    fail_rate = 0.0     # share of requests answered with fail_status
+    fail_status = 503
+    hang_rate = 0.0     # share of requests that stall for hang_s (client timeouts)
+    hang_s = 30.0
+    jitter_s = 0.0      # extra uniform(0, jitter_s) first-token delay
+    requests_seen = 0
+
+    def log_message(self, *args):
+        pass
+
+    def _read_json(self) -> dict:
+        n = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(n) or b"{}")
+
+    def _send_json(self, obj: dict, status: int = 200):
+        body = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _chunk(self, data: bytes):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _stream(self, content_type: str, frames):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for frame in frames:
+            self._chunk(frame)
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _tokens(self, prompt: str):
+        time.sleep(self.first_token_s + random.uniform(0, self.jitter_s))
+        for i, tok in enumerate(fake_completion(prompt, self.n_tokens)):
+            if i:
+                time.sleep(self.token_s)
+            yield tok
+
+    def _inject_fault(self) -> bool:
+        cls = type(self)
+        cls.requests_seen += 1
+        r = random.random()
+        if r < self.hang_rate:
+            time.sleep(self.hang_s)
+        elif r < self.hang_rate + self.fail_rate:
+            self._send_json({"error": "injected failure"}, status=self.fail_status)
+            return True
+        return False
+
+    def do_POST(self):
+        req = self._read_json()
+        if self._inject_fault():
+            return
+        if self.path.endswith("/chat/completions"):
+            prompt = req["messages"][-1]["content"]
+            model = req.get("model", "fake")
+            if not req.get("stream"):
+                text = "".join(self._tokens(prompt))
+                return self._send_json({"id": "fake", "object": "chat.completion", "created": int(time.time()),
+                                        "model": model, "choices": [{"index": 0, "finish_reason": "stop",
+                                        "message": {"role": "assistant", "content": text}}],
+                                        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}})
+
+            def sse():
+                for tok in self._tokens(prompt):
+                    chunk = {"id": "fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                             "model": model, "choices": [{"index": 0, "delta": {"content": tok}, "finish_reason": None}]}
+                    yield b"data: " + json.dumps(chunk).encode() + b"\n\n"
+                yield b"data: [DONE]\n\n"
+            return self._stream("text/event-stream", sse())
+
+        if self.path == "/api/generate":
+            prompt = req.get("prompt", "")
+            if not req.get("stream", True):
+                return self._send_json({"model": req.get("model"), "response": "".join(self._tokens(prompt)), "done": True})
+
+            def ndjson():
+                for tok in self._tokens(prompt):
+                    yield json.dumps({"response": tok, "done": False}).encode() + b"\n"
+                yield json.dumps({"response": "", "done": True}).encode() + b"\n"
+            return self._stream("application/x-ndjson", ndjson())
+
+        self._send_json({"error": "not found"}, status=404)
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # clients hanging up on a slow / hung response is expected here
+
+def serve(port: int = 8089, first_token_ms: float = 300, token_ms: float = 20, n_tokens: int = 60,
+          background: bool = False, **faults) -> ThreadingHTTPServer:
+    # faults: any of fail_rate, fail_status, hang_rate, hang_s, jitter_s; tweak later via
+    # server.RequestHandlerClass.<attr> = value
+    handler = type("Handler", (FakeLLMHandler,), {
+        "first_token_s": first_token_ms / 1000.0, "token_s": token_ms / 1000.0, "n_tokens": n_tokens, **faults})
+    server = _Server(("127.0.0.1", port), handler)
+    if background:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    else:
+        server.serve_forever()
+    return server
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=8089)
+    ap.add_argument("--first-token-ms", type=float, default=300)
+    ap.add_argument("--token-ms", type=float, default=20)
+    ap.add_argument("--tokens", type=int, default=60)
+    ap.add_argument("--fail-rate", type=float, default=0.0)
+    ap.add_argument("--fail-status", type=int, default=503)
+    ap.add_argument("--hang-rate", type=float, default=0.0)
+    ap.add_argument("--hang-s", type=float, default=30.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    args = ap.parse_args()
+    print(f"fake LLM on http://127.0.0.1:{args.port}")
+    serve(args.port, args.first_token_ms, args.token_ms, args.tokens,
+          fail_rate=args.fail_rate, fail_status=args.fail_status, hang_rate=args.hang_rate,
+          hang_s=args.hang_s, jitter_s=args.jitter_ms / 1000.0)
+
+if __name__ == "__main__":
+    main()
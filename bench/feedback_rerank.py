@@ -0,0 +1,67 @@
+# bench/feedback_rerank.py
+# Checks that the feedback prior only re-orders hits draft_answer would answer
+# from: votes may pick which confident hit answers, but a well-rated hit below
+# the answer threshold must never push a confident one out (that would turn an
+# answer into a fallback, which carries no "kb" for feedback to repair).
+# Exits non-zero if any case misbehaves.
+#
+#   python -m bench.feedback_rerank
+import json, os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.common import offline_env
+from feedback_index import FeedbackIndex
+
+def _hit(kb: str, score: float) -> dict:
+    return {"id": kb, "i": 0, "q": kb, "a": f"answer from {kb}", "score": score}
+
+def _rated(votes: dict) -> FeedbackIndex:
+    # votes: kb -> (question, useful, count); each question was last answered by its kb
+    fb = FeedbackIndex(weight=0.1)
+    for kb, (q, useful, n) in votes.items():
+        fb.observe({"type": "answer", "q": q, "kb": kb})
+        for _ in range(n):
+            fb.observe({"type": "feedback", "q": q, "useful": useful})
+    return fb
+
+def main():
+    os.environ.update(offline_env("off"))
+    os.environ.setdefault("MODEL_WARMUP", "lazy")
+    import app  # noqa: E402 - after the offline env
+
+    q = "protein after workout"
+    fb = _rated({"a": (q, False, 10), "b": (q, True, 10)})
+    results, failed = {}, []
+
+    # 1) confident a (0.30, downvoted) vs. b below the threshold (0.22, upvoted)
+    hits = [_hit("a", 0.30), _hit("b", 0.22)]
+    unfloored = fb.rerank(q, hits)
+    floored = fb.rerank(q, hits, floor=app.ANSWER_THRESHOLD)
+    out, _ = app.compose_answer(floored)
+    results["below_threshold"] = {"unfloored": [h["id"] for h in unfloored],
+                                  "floored": [h["id"] for h in floored], "answered": out is not None}
+    if [h["id"] for h in floored] != ["a", "b"] or out is None:
+        failed.append("below_threshold")
+
+    # 2) both confident: the prior still decides between them
+    hits = [_hit("a", 0.31), _hit("b", 0.30), _hit("c", 0.10)]
+    floored = fb.rerank(q, hits, floor=app.ANSWER_THRESHOLD)
+    results["both_confident"] = {"floored": [h["id"] for h in floored]}
+    if [h["id"] for h in floored] != ["b", "a", "c"] or floored[0]["score"] != 0.30:
+        failed.append("both_confident")
+
+    # 3) nothing confident: order and fallback unchanged
+    hits = [_hit("a", 0.24), _hit("b", 0.20)]
+    floored = fb.rerank(q, hits, floor=app.ANSWER_THRESHOLD)
+    results["none_confident"] = {"floored": [h["id"] for h in floored],
+                                 "answered": app.compose_answer(floored)[0] is not None}
+    if [h["id"] for h in floored] != ["a", "b"] or results["none_confident"]["answered"]:
+        failed.append("none_confident")
+
+    results["failed"] = failed
+    print(json.dumps(results, indent=2))
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
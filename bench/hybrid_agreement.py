@@ -0,0 +1,60 @@
+# bench/hybrid_agreement.py
+# Replays logged questions through smart_reply and reports
+#   - how many requests were served without a query encode
+#   - how often hybrid retrieval picks the same answer as dense-only draft_answer
+#
+#   python -m bench.hybrid_agreement [--log data/chat_logs.jsonl]
+import argparse, json, os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.common import load_queries
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--log", default=os.path.join("data", "chat_logs.jsonl"))
+    args = ap.parse_args()
+
+    import app as app_mod
+    app_mod.log_event = lambda ev: None
+    queries = load_queries(args.log)
+
+    contexts = []
+    class CountingContext(app_mod.QueryContext):
+        def __init__(self, *a, **kw):
+            super().__init__(*a, **kw)
+            contexts.append(self)
+    app_mod.QueryContext = CountingContext
+
+    for q in queries:
+        app_mod.smart_reply(q)
+    n_requests = len(contexts)
+    no_encode = sum(1 for c in contexts if not c.encoded)
+
+    # answer agreement on questions that reach retrieval
+    same = total = lexical = 0
+    for q in queries:
+        if not q.strip() or app_mod.check_chitchat(q) or app_mod.should_refuse_medical(q):
+            continue
+        ctx = CountingContext(app_mod.store, q)
+        if not app_mod.is_in_fitness_domain(q, ctx=ctx):
+            continue
+        hybrid_out, hybrid_hits = app_mod.draft_answer(q, ctx=ctx)
+        dense_out, dense_hits = app_mod.draft_answer(q)
+        total += 1
+        lexical += bool(hybrid_hits) and hybrid_hits[0].get("via") == "lexical"
+        top_h = hybrid_hits[0]["i"] if hybrid_out else None
+        top_d = dense_hits[0]["i"] if dense_out else None
+        same += top_h == top_d
+
+    print(json.dumps({
+        "requests": n_requests,
+        "served_without_encode": no_encode,
+        "no_encode_fraction": round(no_encode / max(1, n_requests), 3),
+        "retrieval_queries": total,
+        "lexical_fast_path": lexical,
+        "top_answer_agreement": round(same / max(1, total), 3),
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# bench/index_recall.py
+# Recall@k vs. latency for the vector_index backends on synthetic clustered KBs.
+# Queries are drawn around the KB's own topic centres. Exact NumPy top-k is the
+# ground truth.
+#
+#   python -m bench.index_recall --sizes 1000 100000 1000000 --nprobe 4 8 16
+import argparse, json, os, sys, time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vector_index import IVFIndex, NumpyIndex, SklearnIndex
+
+def synthetic(n: int, d: int, n_topics: int, rng, centres: np.ndarray = None, noise=0.6):
+    """-> (rows, centres): unit rows scattered around topic centres, like many
+    paraphrases of a few questions. Pass a KB's centres back in to draw queries
+    about the same topics; noise (a scalar or one value per row) sets how far
+    each row strays from its centre."""
+    if centres is None:
+        centres = rng.standard_normal((n_topics, d)).astype(np.float32)
+    noise = np.broadcast_to(np.asarray(noise, dtype=np.float32), (n,))
+    out = np.empty((n, d), dtype=np.float32)
+    for s in range(0, n, 100_000):
+        m = min(100_000, n - s)
+        x = centres[rng.integers(0, len(centres), m)] \
+            + noise[s:s + m, None] * rng.standard_normal((m, d)).astype(np.float32)
+        out[s:s + m] = x / np.linalg.norm(x, axis=1, keepdims=True)
+    return out, centres
+
+def _time_search(index, queries, k):
+    lat = []
+    results = []
+    for q in queries:
+        t0 = time.perf_counter()
+        _, idx = index.search(q[None, :], k)
+        lat.append((time.perf_counter() - t0) * 1000)
+        results.append(idx[0])
+    lat = np.array(lat)
+    return results, round(float(np.percentile(lat, 50)), 3), round(float(np.percentile(lat, 99)), 3)
+
+def _recall(got, truth):
+    return round(float(np.mean([len(set(g) & set(t)) / len(t) for g, t in zip(got, truth)])), 4)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1000, 100_000, 1_000_000])
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--nprobe", type=int, nargs="+", default=[4, 16, 64])
+    ap.add_argument("--sklearn-max", type=int, default=100_000, help="skip sklearn above this size")
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    report = []
+    for n in args.sizes:
+        embs, centres = synthetic(n, args.dim, max(10, n // 200), rng)
+        queries, _ = synthetic(args.queries, args.dim, 0, rng, centres=centres)
+        row = {"n": n, "memory_mb_float32": round(embs.nbytes / 2**20, 1), "backends": []}
+
+        exact = NumpyIndex(embs)
+        truth, p50, p99 = _time_search(exact, queries, args.k)
+        row["backends"].append({"index": "numpy", "recall": 1.0, "p50_ms": p50, "p99_ms": p99})
+
+        if n <= args.sklearn_max:
+            got, p50, p99 = _time_search(SklearnIndex(embs), queries, args.k)
+            row["backends"].append({"index": "sklearn", "recall": _recall(got, truth), "p50_ms": p50, "p99_ms": p99})
+
+        t0 = time.perf_counter()
+        ivf = IVFIndex(embs)
+        build_s = round(time.perf_counter() - t0, 2)
+        for nprobe in args.nprobe:
+            ivf.nprobe = min(nprobe, ivf.nlist)
+            got, p50, p99 = _time_search(ivf, queries, args.k)
+            row["backends"].append({"index": "ivf", "nlist": ivf.nlist, "nprobe": ivf.nprobe, "build_s": build_s,
+                                    "memory_mb": round((ivf.codes.nbytes + ivf.scales.nbytes) / 2**20, 1),
+                                    "recall": _recall(got, truth), "p50_ms": p50, "p99_ms": p99})
+        report.append(row)
+        print(json.dumps(row), flush=True)
+
+if __name__ == "__main__":
+    main()
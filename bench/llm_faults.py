@@ -0,0 +1,136 @@
+# bench/llm_faults.py
+# Drives llm.LLMClient against bench/fake_llm.py with injected latency and failures
+# and checks the client stays inside its deadline, retries, hedges and trips the breaker.
+# Exits non-zero if any scenario misbehaves.
+#
+#   python -m bench.llm_faults
+import asyncio, json, os, statistics, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.fake_llm import serve
+from llm import LLMClient
+
+PROMPT = "Sources:\nSource 1 (score=0.80):\nOatmeal + banana 60-90 min before.\n\nAnswer briefly."
+
+def _calls(client: LLMClient, n: int, backend: str = "openai"):
+    lat, ok = [], 0
+    for _ in range(n):
+        t0 = time.perf_counter()
+        ok += client.complete(backend, PROMPT) is not None
+        lat.append(time.perf_counter() - t0)
+    lat.sort()
+    return {"calls": n, "success_rate": round(ok / n, 3),
+            "p50_ms": round(statistics.median(lat) * 1000, 1),
+            "max_ms": round(lat[-1] * 1000, 1)}
+
+def _drain(gen):
+    # -> (tokens, generator return value)
+    toks = []
+    while True:
+        try:
+            toks.append(next(gen))
+        except StopIteration as stop:
+            return toks, stop.value
+
+def main():
+    port = 8091
+    server = serve(port, first_token_ms=50, token_ms=1, n_tokens=10, background=True, hang_s=5.0)
+    handler = server.RequestHandlerClass
+    os.environ.update(OPENAI_API_KEY="fake", OPENAI_BASE_URL=f"http://127.0.0.1:{port}/v1")
+    results, failed = {}, []
+
+    def check(name, cond):
+        if not cond:
+            failed.append(name)
+
+    # 1) healthy upstream
+    r = _calls(LLMClient(deadline_s=2, retries=0), 20)
+    results["healthy"] = r
+    check("healthy", r["success_rate"] == 1.0)
+
+    # 2) 40% 503s: retries with jitter hide most of them
+    handler.fail_rate = 0.4
+    r = _calls(LLMClient(deadline_s=2, retries=3, backoff_s=0.02, breaker_failures=50), 40)
+    results["flaky_503_retry"] = r
+    check("flaky_503_retry", r["success_rate"] >= 0.9)
+    handler.fail_rate = 0.0
+
+    # 3) 30% of requests hang for 5 s: the deadline bounds every call ...
+    handler.hang_rate = 0.3
+    r = _calls(LLMClient(deadline_s=0.5, retries=0, breaker_failures=50), 20)
+    results["hangs_deadline_only"] = r
+    check("hangs_deadline_only", r["max_ms"] < 700)
+    # ... and hedging after 150 ms recovers most of them inside the same budget
+    r = _calls(LLMClient(deadline_s=0.5, retries=0, hedge_ms=150, breaker_failures=50), 20)
+    results["hangs_hedged"] = r
+    check("hangs_hedged", r["max_ms"] < 700 and r["success_rate"] >= 0.8)
+    handler.hang_rate = 0.0
+
+    # 4) provider down: breaker opens after 3 failures, later calls return None immediately
+    handler.fail_rate = 1.0
+    client = LLMClient(deadline_s=1, retries=1, backoff_s=0.01, breaker_failures=3, breaker_reset_s=60)
+    seen = handler.requests_seen
+    r = _calls(client, 20)
+    r["upstream_requests"] = handler.requests_seen - seen
+    r["client"] = client.stats()
+    results["provider_down_breaker"] = r
+    check("provider_down_breaker", r["client"]["breakers"]["openai"] == "open" and r["upstream_requests"] <= 6
+          and r["client"]["short_circuited"] == 17)
+    handler.fail_rate = 0.0
+
+    # 5) streaming: tokens arrive, and a dead provider ends the stream empty instead of hanging
+    stream_client = LLMClient(deadline_s=2, retries=0)
+    toks, done = _drain(stream_client.stream("openai", PROMPT))
+    handler.fail_rate = 1.0
+    t0 = time.perf_counter()
+    empty, _ = _drain(LLMClient(deadline_s=2, retries=1, backoff_s=0.01).stream("openai", PROMPT))
+    down_ms = round((time.perf_counter() - t0) * 1000, 1)
+    handler.fail_rate = 0.0
+    # ... and one cut at the deadline mid-answer is reported incomplete and counted as a failure
+    token_s, handler.token_s = handler.token_s, 0.05
+    cut_client = LLMClient(deadline_s=0.2, retries=0)
+    cut, cut_done = _drain(cut_client.stream("openai", PROMPT))
+    handler.token_s = token_s
+    results["stream"] = {"tokens": len(toks), "result": done, "down_tokens": len(empty), "down_ms": down_ms,
+                         "cut_tokens": len(cut), "cut_result": cut_done, "cut_failures": cut_client.failures}
+    check("stream", len(toks) == 10 and done == (True, True) and not empty
+          and 0 < len(cut) < 10 and cut_done == (True, False) and cut_client.failures == 1)
+
+    # 6) a half-open probe cut off on our side (SSE reader gone, ASGI request cancelled)
+    #    must not leave the breaker waiting on a probe that will never report back
+    def tripped():
+        c = LLMClient(deadline_s=1, retries=0, breaker_failures=1, breaker_reset_s=0.05)
+        handler.fail_rate = 1.0
+        c.complete("openai", PROMPT)
+        handler.fail_rate = 0.0
+        time.sleep(0.06)
+        return c
+
+    c = tripped()
+    gen = c.stream("openai", PROMPT)
+    next(gen)
+    gen.close()  # GeneratorExit at the yield
+    stream_left = c.complete("openai", PROMPT) is not None
+
+    async def cancelled_probe(c):
+        task = asyncio.ensure_future(c.acomplete("openai", PROMPT))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    c = tripped()
+    handler.hang_rate = 1.0
+    asyncio.run(cancelled_probe(c))
+    handler.hang_rate = 0.0
+    cancel_left = c.complete("openai", PROMPT) is not None
+    results["abandoned_probe"] = {"breaker_after": c.breakers["openai"].state,
+                                  "stream_close_recovers": stream_left, "cancel_recovers": cancel_left}
+    check("abandoned_probe", stream_left and cancel_left)
+
+    results["failed"] = failed
+    print(json.dumps(results, indent=2))
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# bench/metrics_overhead.py
+# Cost of the per-stage spans: smart_reply over the logged questions with
+# METRICS on vs. off, alternating rounds so drift hits both sides equally.
+# Also reports the raw cost of one span enter/exit.
+#
+#   python -m bench.metrics_overhead --rounds 20
+#   python -m bench.metrics_overhead --stub-encoder   # no torch; bench.common.StubEncoder
+import argparse, json, os, sys, time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.common import load_queries, offline_env, run_meta, use_stub_encoder
+
+def _round(app_mod, queries) -> float:
+    t0 = time.perf_counter()
+    for q in queries:
+        app_mod.smart_reply(q)
+    return (time.perf_counter() - t0) / len(queries)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--log", default=os.path.join("data", "chat_logs.jsonl"))
+    ap.add_argument("--rounds", type=int, default=20)
+    ap.add_argument("--stub-encoder", action="store_true", help="hash-based stand-in for the sentence model")
+    args = ap.parse_args()
+
+    if args.stub_encoder:
+        use_stub_encoder()
+    os.environ.update(offline_env("off"))
+    import app as app_mod
+    from metrics import METRICS
+    app_mod.warm_up()
+    queries = load_queries(args.log)
+    _round(app_mod, queries)  # warm-up
+
+    on, off = [], []
+    for i in range(args.rounds):
+        for enabled in ((True, False) if i % 2 else (False, True)):
+            METRICS.enabled = enabled
+            (on if enabled else off).append(_round(app_mod, queries))
+    METRICS.enabled = True
+
+    n = 200000
+    t0 = time.perf_counter()
+    for _ in range(n):
+        with METRICS.span("bench"):
+            pass
+    span_ns = (time.perf_counter() - t0) / n * 1e9
+
+    on_us, off_us = np.median(on) * 1e6, np.median(off) * 1e6
+    print(json.dumps({
+        "meta": run_meta(args),
+        "queries": len(queries), "rounds": args.rounds,
+        "per_request_us_metrics_on": round(float(on_us), 1),
+        "per_request_us_metrics_off": round(float(off_us), 1),
+        "overhead_pct": round(float((on_us - off_us) / off_us * 100), 2),
+        "span_ns": round(span_ns, 1),
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
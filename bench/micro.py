@@ -0,0 +1,88 @@
+# bench/micro.py
+# Per-call cost of the hot helpers, median of --repeat timed loops:
+#   search_text         EmbStore.search (encode + top-k)
+#   search_vector       EmbStore.search_vector with a pre-encoded query
+#   search_hybrid       EmbStore.search_hybrid on a fresh QueryContext (may skip the encode)
+#   domain_keyword      is_in_fitness_domain when a fitness keyword matches
+#   domain_semantic     is_in_fitness_domain falling through to the anchor check
+#   feedback_rerank     FeedbackIndex.rerank over 3 hits, every KB entry rated
+#   log_event_async     logger.log_event with the background writer (LOG_ASYNC=1)
+#   log_event_sync      logger.log_event appending synchronously (LOG_ASYNC=0)
+#
+#   python -m bench.micro --repeat 5 --number 200
+import argparse, json, os, sys, time
+from typing import Callable, Dict
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.common import DEFAULT_LOG, load_queries, offline_env, run_meta
+
+def per_call_us(fn: Callable[[int], None], number: int, repeat: int) -> Dict[str, float]:
+    # fn(i) is called `number` times per loop; i lets it rotate through inputs
+    loops = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for i in range(number):
+            fn(i)
+        loops.append((time.perf_counter() - t0) / number * 1e6)
+    return {"median_us": round(float(np.median(loops)), 2), "min_us": round(float(min(loops)), 2)}
+
+def run_micro(queries, number: int = 200, repeat: int = 5) -> Dict[str, dict]:
+    import app as app_mod
+    import logger
+    from embeddings_store import QueryContext
+    from feedback_index import FeedbackIndex, kb_key
+    store = app_mod.store.warm()
+    app_mod.ANCHOR_INDEX.load()
+    qs = list(dict.fromkeys(queries)) or ["how much protein do i need?"]
+    vecs = [store.encode_query(q) for q in qs]
+    keyword = "how much protein after a workout"
+    semantic = "what should I do about sore legs"
+    ev = {"type": "answer", "q": "how much protein do i need?", "top_score": 0.61}
+    fb = FeedbackIndex(weight=0.1)
+    hit_lists = [store.search_hybrid(QueryContext(store, q), k=3) for q in qs]
+    for q, hits in zip(qs, hit_lists):
+        for h in hits:
+            fb.observe({"type": "answer", "q": q, "kb": kb_key(h)})
+            fb.observe({"type": "feedback", "q": q, "useful": h["i"] % 2 == 0})
+
+    out = {
+        "search_text": per_call_us(lambda i: store.search(qs[i % len(qs)], k=3), number, repeat),
+        "search_vector": per_call_us(lambda i: store.search_vector(vecs[i % len(vecs)], k=3), number, repeat),
+        "search_hybrid": per_call_us(lambda i: store.search_hybrid(QueryContext(store, qs[i % len(qs)]), k=3),
+                                     number, repeat),
+        "domain_keyword": per_call_us(lambda i: app_mod.is_in_fitness_domain(keyword), number, repeat),
+        "domain_semantic": per_call_us(lambda i: app_mod.is_in_fitness_domain(semantic), number, repeat),
+        "feedback_rerank": per_call_us(lambda i: fb.rerank(qs[i % len(qs)], hit_lists[i % len(qs)]),
+                                       number, repeat),
+    }
+    prev = os.environ.get("LOG_ASYNC")
+    for mode in ("1", "0"):
+        os.environ["LOG_ASYNC"] = mode
+        name = "log_event_async" if mode == "1" else "log_event_sync"
+        out[name] = per_call_us(lambda i: logger.log_event(ev), number, repeat)
+    if prev is None:
+        os.environ.pop("LOG_ASYNC")
+    else:
+        os.environ["LOG_ASYNC"] = prev
+    return out
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--queries", nargs="+", default=[DEFAULT_LOG])
+    ap.add_argument("--number", type=int, default=200)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--out")
+    args = ap.parse_args()
+
+    os.environ.update(offline_env("off"))
+    report = {"meta": run_meta(args), "micro": run_micro(load_queries(*args.queries), args.number, args.repeat)}
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+if __name__ == "__main__":
+    main()
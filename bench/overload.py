@@ -0,0 +1,85 @@
+# bench/overload.py
+# Drives POST /api/chat well past capacity (open loop, --rate req/s) against a
+# local gunicorn with admission control on and off, with the fake LLM slowing
+# every full reply down. Reports latency of served replies, how many were
+# rejected with 429, and which degradation levels the server handed out.
+#
+#   python -m bench.overload --rate 40 --seconds 15
+#   python -m bench.overload --modes on --rate 100 --first-token-ms 500
+#
+# With admission off, requests queue inside gunicorn and p99 grows with the run
+# length (up to the client timeout); with it on, p99 stays near ADMIT_MAX_WAIT_S
+# plus one reply.
+import argparse, json, os, subprocess, sys, threading, time
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench.common import DEFAULT_LOG, load_queries, offline_env, run_meta, summarize
+from bench.replay import _wait_ready
+
+def run(mode: str, queries, rate: float, seconds: float, port: int, timeout: float) -> dict:
+    url = f"http://127.0.0.1:{port}"
+    env = {**os.environ, "GUNICORN_BIND": f"127.0.0.1:{port}", "WEB_CONCURRENCY": "1",
+           "ADMISSION": "1" if mode == "on" else "0"}
+    proc = subprocess.Popen(["gunicorn", "app:app", "-c", "gunicorn.conf.py", "--log-level", "warning"],
+                            cwd=ROOT, env=env)
+    n = int(rate * seconds)
+    lat = {"ok": [], "rejected": [], "error": []}
+    lock = threading.Lock()
+    try:
+        _wait_ready(url)
+        with httpx.Client(base_url=url, timeout=timeout,
+                          limits=httpx.Limits(max_connections=None, max_keepalive_connections=64)) as client:
+            t0 = time.perf_counter()
+
+            def send(i: int):
+                start = t0 + i / rate
+                try:
+                    r = client.post("/api/chat", json={"message": queries[i % len(queries)]})
+                    kind = "ok" if r.status_code == 200 else "rejected" if r.status_code == 429 else "error"
+                except httpx.HTTPError:
+                    kind = "error"
+                with lock:
+                    lat[kind].append(time.perf_counter() - start)
+
+            threads = []
+            for i in range(n):
+                delay = t0 + i / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                th = threading.Thread(target=send, args=(i,), daemon=True)
+                th.start()
+                threads.append(th)
+            for th in threads:
+                th.join()
+            wall = time.perf_counter() - t0
+            load = client.get("/api/ready").json().get("load")
+    finally:
+        proc.terminate()
+        proc.wait(60)
+    return {"admission": mode, "sent": n, "served": summarize(lat["ok"], wall),
+            "rejected": summarize(lat["rejected"]), "errors": len(lat["error"]), "load": load}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--modes", nargs="+", choices=["on", "off"], default=["off", "on"])
+    ap.add_argument("--queries", nargs="+", default=[DEFAULT_LOG])
+    ap.add_argument("--rate", type=float, default=40)
+    ap.add_argument("--seconds", type=float, default=15)
+    ap.add_argument("--first-token-ms", type=float, default=300)
+    ap.add_argument("--timeout", type=float, default=60, help="client timeout; slower replies count as errors")
+    ap.add_argument("--port", type=int, default=8098)
+    args = ap.parse_args()
+
+    queries = load_queries(*args.queries)
+    if not queries:
+        sys.exit("no queries found in " + ", ".join(args.queries))
+    os.environ.update(offline_env("fake", first_token_ms=args.first_token_ms))
+    report = {"meta": run_meta(args),
+              "results": [run(m, queries, args.rate, args.seconds, args.port, args.timeout) for m in args.modes]}
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# bench/quant_eval.py
+# Compressed VECTOR_INDEX backends vs. exact float32 search: scan memory, latency,
+# top-k agreement, and whether the top score lands on the same side of
+# draft_answer's 0.25 threshold. Each backend runs with float32 rescoring
+# (RESCORE_CANDIDATES) and without, to show what the rescoring buys.
+#
+#   python -m bench.quant_eval --sizes 10000 200000 --rescore 50 100
+#   python -m bench.quant_eval --kb     # the real KB + logged questions (needs the model)
+import argparse, json, os, sys, time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.index_recall import synthetic
+from vector_index import BinaryIndex, Int8Index, IVFIndex, NumpyIndex, PCAIndex
+
+THRESHOLD = 0.25  # draft_answer's answer / no-answer cut
+
+def _run(index, queries, k):
+    lat, scores, ids = [], [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        s, i = index.search(q[None, :], k)
+        lat.append((time.perf_counter() - t0) * 1000)
+        scores.append(s[0])
+        ids.append(i[0])
+    return np.array(lat), scores, ids
+
+def evaluate(embs: np.ndarray, queries: np.ndarray, k: int, rescores, pca_dims, nprobe: int) -> list:
+    exact = NumpyIndex(embs)
+    lat, t_scores, t_ids = _run(exact, queries, k)
+    top1 = np.array([float(t[0]) for t in t_scores])
+    rows = [{"index": "numpy", "memory_mb": round(exact.memory_bytes() / 2**20, 2),
+             "p50_ms": round(float(np.percentile(lat, 50)), 3), "p99_ms": round(float(np.percentile(lat, 99)), 3),
+             "top1_mean": round(float(top1.mean()), 3), "above_threshold": round(float((top1 >= THRESHOLD).mean()), 3)}]
+    variants = [("int8", lambda r: Int8Index(embs, rescore=r)), ("binary", lambda r: BinaryIndex(embs, rescore=r))]
+    variants += [(f"pca{d}", lambda r, d=d: PCAIndex(embs, dim=d, rescore=r)) for d in pca_dims]
+    variants += [("ivf", lambda r: IVFIndex(embs, nprobe=nprobe, rescore=r))]
+    for name, make in variants:
+        index = make(0)
+        for r in [0] + list(rescores):
+            index.rescore = r
+            lat, scores, ids = _run(index, queries, k)
+            top1_err = [abs(float(s[0]) - float(t[0])) for s, t in zip(scores, t_scores)]
+            rows.append({
+                "index": name, "rescore": r,
+                "memory_mb": round(index.memory_bytes() / 2**20, 2),
+                "p50_ms": round(float(np.percentile(lat, 50)), 3),
+                "p99_ms": round(float(np.percentile(lat, 99)), 3),
+                f"recall@{k}": round(float(np.mean([len(set(i) & set(t)) / len(t) for i, t in zip(ids, t_ids)])), 4),
+                "top1_agree": round(float(np.mean([i[0] == t[0] for i, t in zip(ids, t_ids)])), 4),
+                "top1_score_abs_err": round(float(np.max(top1_err)), 4),
+                "threshold_agree": round(float(np.mean([(s[0] >= THRESHOLD) == (t[0] >= THRESHOLD)
+                                                        for s, t in zip(scores, t_scores)])), 4),
+            })
+    return rows
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10_000, 200_000])
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--rescore", type=int, nargs="+", default=[50, 100])
+    ap.add_argument("--pca-dims", type=int, nargs="+", default=[64, 128])
+    ap.add_argument("--nprobe", type=int, default=16)
+    ap.add_argument("--kb", action="store_true", help="evaluate on the configured KB and logged questions")
+    args = ap.parse_args()
+
+    report = []
+    if args.kb:
+        import app as app_mod
+        from bench.common import DEFAULT_LOG, load_queries
+        store = app_mod.store.warm()
+        qs = list(dict.fromkeys(load_queries(DEFAULT_LOG)))
+        queries = np.asarray(store.model.encode(qs, normalize_embeddings=True), dtype=np.float32)
+        embs = np.asarray(store.embs, dtype=np.float32)
+        report.append({"n": len(embs), "source": "kb", "rows": evaluate(embs, queries, min(args.k, len(embs)),
+                                                                          args.rescore, args.pca_dims, args.nprobe)})
+        print(json.dumps(report[-1]), flush=True)
+    else:
+        rng = np.random.default_rng(0)
+        for n in args.sizes:
+            topics = max(10, n // 200)
+            embs, centres = synthetic(n, args.dim, topics, rng)
+            # about the KB's topics, from close paraphrases to loosely related, so the exact
+            # top score spreads across the threshold and threshold_agree means something
+            queries, _ = synthetic(args.queries, args.dim, 0, rng, centres=centres,
+                                   noise=rng.uniform(0.6, 6.0, args.queries))
+            report.append({"n": n, "source": "synthetic", "rows": evaluate(embs, queries, args.k, args.rescore,
+                                                                             args.pca_dims, args.nprobe)})
+            print(json.dumps(report[-1]), flush=True)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
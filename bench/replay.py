@@ -0,0 +1,171 @@
+# bench/replay.py
+# Replays logged user messages against smart_reply in process, or against
+# POST /api/chat over HTTP, and reports throughput, p50/p95/p99 and the
+# per-stage breakdown from /metrics (metrics.py) as JSON.
+#
+#   python -m bench.replay --mode inproc --concurrency 4 --requests 500
+#   python -m bench.replay --mode http --concurrency 16 --rate 50 --out run.json
+#   python -m bench.replay --mode http --url http://127.0.0.1:8000   # existing server
+#
+# --rate 0 is closed loop (each worker sends as soon as its last reply is back);
+# --rate N schedules N requests/s and measures latency from the scheduled send
+# time, so a stalled server shows up as queueing instead of hiding it.
+# The LLM is the local fake (--llm fake) or off (--llm off); nothing leaves the box.
+import argparse, itertools, json, os, re, subprocess, sys, threading, time
+from typing import Callable, Dict, List, Tuple
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench.common import DEFAULT_LOG, load_queries, offline_env, run_meta, summarize
+
+_METRIC = re.compile(r'^chat_(stage_seconds_sum|stage_seconds_count|replies_total)\{(?:stage|outcome)="([^"]+)"\} (\S+)$')
+
+def parse_metrics(text: str) -> Dict[str, Dict[str, float]]:
+    out = {"stage_seconds_sum": {}, "stage_seconds_count": {}, "replies_total": {}}
+    for line in text.splitlines():
+        m = _METRIC.match(line)
+        if m:
+            out[m.group(1)][m.group(2)] = float(m.group(3))
+    return out
+
+def breakdown(before: str, after: str, n_requests: int) -> Tuple[dict, dict]:
+    """Per-stage calls/mean/ms-per-request and outcome counts between two /metrics scrapes."""
+    b, a = parse_metrics(before), parse_metrics(after)
+    stages = {}
+    for stage, total in a["stage_seconds_sum"].items():
+        calls = a["stage_seconds_count"][stage] - b["stage_seconds_count"].get(stage, 0)
+        secs = total - b["stage_seconds_sum"].get(stage, 0.0)
+        if calls:
+            stages[stage] = {"calls": int(calls), "mean_ms": round(secs / calls * 1000, 3),
+                             "ms_per_request": round(secs / max(n_requests, 1) * 1000, 3)}
+    outcomes = {k: int(v - b["replies_total"].get(k, 0)) for k, v in a["replies_total"].items()
+                if v - b["replies_total"].get(k, 0)}
+    return stages, outcomes
+
+def drive(call: Callable[[str], None], queries: List[str], concurrency: int, rate: float,
+          n_requests: int) -> Tuple[List[float], int, float]:
+    """Send n_requests (cycling through queries) from `concurrency` threads.
+    -> (latencies in s, error count, wall time in s)"""
+    counter = itertools.count()
+    lat, errors = [], [0]
+    lock = threading.Lock()
+    t0 = time.perf_counter()
+
+    def worker():
+        while True:
+            i = next(counter)
+            if i >= n_requests:
+                return
+            start = time.perf_counter()
+            if rate > 0:
+                start = t0 + i / rate
+                delay = start - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            try:
+                call(queries[i % len(queries)])
+                ok = True
+            except Exception:
+                ok = False
+            done = time.perf_counter()
+            with lock:
+                if ok:
+                    lat.append(done - start)
+                else:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return lat, errors[0], time.perf_counter() - t0
+
+def replay_inproc(queries: List[str], concurrency: int, rate: float, n_requests: int, warmup: int = 20) -> dict:
+    import app as app_mod
+    from metrics import METRICS
+    app_mod.store.warm()
+    for q in queries[:warmup]:
+        app_mod.smart_reply(q)
+    before = METRICS.render()
+    lat, errors, wall = drive(app_mod.smart_reply, queries, concurrency, rate, n_requests)
+    stages, outcomes = breakdown(before, METRICS.render(), len(lat))
+    return {"latency": summarize(lat, wall), "errors": errors, "stages": stages, "outcomes": outcomes}
+
+def _wait_ready(url: str, timeout: float = 300.0):
+    t_end = time.time() + timeout
+    while time.time() < t_end:
+        try:
+            if httpx.get(url + "/api/ready", timeout=5).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not become ready")
+
+def replay_http(queries: List[str], concurrency: int, rate: float, n_requests: int, url: str = None,
+                port: int = 8097, workers: int = 1, warmup: int = 20) -> dict:
+    proc = None
+    if url is None:
+        url = f"http://127.0.0.1:{port}"
+        env = {**os.environ, "GUNICORN_BIND": f"127.0.0.1:{port}", "WEB_CONCURRENCY": str(workers),
+               "GUNICORN_THREADS": str(max(2, concurrency))}
+        proc = subprocess.Popen(["gunicorn", "app:app", "-c", "gunicorn.conf.py", "--log-level", "warning"],
+                                cwd=ROOT, env=env)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    try:
+        _wait_ready(url)
+        with httpx.Client(base_url=url, limits=limits, timeout=120) as client:
+            def call(q: str):
+                client.post("/api/chat", json={"message": q}).raise_for_status()
+
+            for q in queries[:warmup]:
+                call(q)
+            # with several workers this is whichever one answers the scrape
+            before = client.get("/metrics").text
+            lat, errors, wall = drive(call, queries, concurrency, rate, n_requests)
+            stages, outcomes = breakdown(before, client.get("/metrics").text, len(lat))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(60)
+    return {"latency": summarize(lat, wall), "errors": errors, "stages": stages, "outcomes": outcomes}
+
+def add_args(ap: argparse.ArgumentParser):
+    ap.add_argument("--queries", nargs="+", default=[DEFAULT_LOG],
+                    help="JSONL files with `q` (chat log) or `message` (request bodies) fields")
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--rate", type=float, default=0, help="requests/s; 0 = closed loop")
+    ap.add_argument("--requests", type=int, default=0, help="default: every query once")
+    ap.add_argument("--llm", choices=["fake", "off"], default="fake")
+    ap.add_argument("--first-token-ms", type=float, default=50)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mode", choices=["inproc", "http"], default="inproc")
+    ap.add_argument("--url", help="replay against a running server instead of starting gunicorn")
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--out", help="also write the JSON report here")
+    add_args(ap)
+    args = ap.parse_args()
+
+    queries = load_queries(*args.queries)
+    if not queries:
+        sys.exit("no queries found in " + ", ".join(args.queries))
+    os.environ.update(offline_env(args.llm, first_token_ms=args.first_token_ms))
+    n = args.requests or len(queries)
+    if args.mode == "inproc":
+        res = replay_inproc(queries, args.concurrency, args.rate, n)
+    else:
+        res = replay_http(queries, args.concurrency, args.rate, n, url=args.url, workers=args.workers)
+    report = {"meta": run_meta(args), "mode": args.mode, "distinct_queries": len(set(queries)), **res}
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# bench/sessions.py
+# Session store cost at scale: fills --sessions live sessions (each with
+# SESSION_TURNS turns and a topic vector), then reports RSS growth, bytes per
+# session, and p50/p99 of the per-request operations (last() before the reply,
+# add() after it).
+#
+#   python -m bench.sessions --sessions 100000
+#   python -m bench.sessions --store sqlite --sessions 100000
+import argparse, json, os, sys, tempfile, time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.common import run_meta, summarize
+from sessions import MemorySessionStore, SQLiteSessionStore
+
+def rss_bytes() -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+def run(kind: str, n: int, turns: int, dim: int, probes: int) -> dict:
+    rng = np.random.default_rng(0)
+    topics = rng.standard_normal((256, dim)).astype(np.float32)
+    text = "what should I eat before an early morning run if I train fasted?"
+    base = rss_bytes()
+    if kind == "sqlite":
+        store = SQLiteSessionStore(os.path.join(tempfile.mkdtemp(), "sessions.sqlite"), max_sessions=n,
+                                   max_turns=turns)
+    else:
+        store = MemorySessionStore(max_sessions=n, max_turns=turns)
+
+    t0 = time.perf_counter()
+    for t in range(turns):
+        for i in range(n):
+            store.add(f"session-{i:08d}", text, "answer", topics[i % len(topics)] if t == 0 else None)
+    fill_s = time.perf_counter() - t0
+    grown = rss_bytes() - base
+
+    ids = [f"session-{i:08d}" for i in rng.integers(0, n, probes)]
+    last, add = [], []
+    for sid in ids:
+        t0 = time.perf_counter()
+        store.last(sid)
+        last.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        store.add(sid, text, "answer", topics[0])
+        add.append(time.perf_counter() - t0)
+    out = {"store": kind, "sessions": len(store), "turns_per_session": turns,
+           "fill_s": round(fill_s, 2), "rss_growth_mb": round(grown / 2**20, 1),
+           "bytes_per_session": round(grown / n), "last": summarize(last), "add": summarize(add)}
+    if kind == "sqlite":
+        out["db_mb"] = round(os.path.getsize(store.path) / 2**20, 1)
+    return out
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--store", choices=["memory", "sqlite"], nargs="+", default=["memory"])
+    ap.add_argument("--sessions", type=int, default=100_000)
+    ap.add_argument("--turns", type=int, default=int(os.getenv("SESSION_TURNS", "4")))
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--probes", type=int, default=5000)
+    args = ap.parse_args()
+    report = {"meta": run_meta(args),
+              "results": [run(k, args.sessions, args.turns, args.dim, args.probes) for k in args.store]}
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# bench/startup.py
+# Cold start per MODEL_WARMUP mode (lazy | background | eager):
+#   import_s          - `import app` in a fresh interpreter
+#   first_byte_s      - process start -> first 200 on GET /
+#   first_chitchat_s  - process start -> first /api/chat reply that needs no model
+#   first_semantic_s  - process start -> first /api/chat reply that needs the encoder
+#   ready_s           - process start -> GET /api/ready returns 200
+# Servers are one gunicorn worker from gunicorn.conf.py, run twice per mode: with
+# the shipped default (GUNICORN_PRELOAD=1: the master imports the app, then forks)
+# and with GUNICORN_PRELOAD=0 (the worker imports it); LLM off.
+#
+#   python -m bench.startup --runs 3
+#   python -m bench.startup --preload 1          # only the shipped default
+import argparse, json, os, subprocess, sys, tempfile, time
+import httpx
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = ["lazy", "background", "eager"]
+CHITCHAT_Q = "hello"
+SEMANTIC_Q = "how do I recover after a long run"  # keyword-matched domain, but BM25 isn't confident
+
+IMPORT_SNIPPET = ("import time; t = time.perf_counter(); import app; "
+                  "print(time.perf_counter() - t)")
+
+def _env(mode: str, **extra) -> dict:
+    return {**os.environ, "MODEL_WARMUP": mode, "USE_LLM": "0", "REPLY_CACHE": "0",
+            "CHAT_LOG_FILE": os.path.join(tempfile.mkdtemp(), "log.jsonl"), **extra}
+
+def import_time(mode: str) -> float:
+    out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=ROOT, env=_env(mode),
+                         capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+def _until(fn, t0: float, timeout: float = 300.0) -> float:
+    while time.perf_counter() - t0 < timeout:
+        try:
+            if fn():
+                return time.perf_counter() - t0
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.01)
+    raise RuntimeError("timed out")
+
+def serve_times(mode: str, preload: str, port: int) -> dict:
+    url = f"http://127.0.0.1:{port}"
+    env = _env(mode, GUNICORN_PRELOAD=preload, WEB_CONCURRENCY="1", GUNICORN_BIND=f"127.0.0.1:{port}")
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(["gunicorn", "app:app", "-c", "gunicorn.conf.py", "--log-level", "warning"],
+                            cwd=ROOT, env=env)
+    chat = lambda q: httpx.post(url + "/api/chat", json={"message": q}, timeout=300).status_code == 200
+    try:
+        out = {"first_byte_s": _until(lambda: httpx.get(url + "/", timeout=300).status_code == 200, t0)}
+        out["first_chitchat_s"] = _until(lambda: chat(CHITCHAT_Q), t0)
+        out["first_semantic_s"] = _until(lambda: chat(SEMANTIC_Q), t0)
+        out["ready_s"] = _until(lambda: httpx.get(url + "/api/ready", timeout=300).status_code == 200, t0)
+    finally:
+        proc.terminate()
+        proc.wait(60)
+    return out
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--modes", nargs="+", default=MODES, choices=MODES)
+    ap.add_argument("--preload", nargs="+", default=["1", "0"], choices=["1", "0"])
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--port", type=int, default=8095)
+    args = ap.parse_args()
+    rows = []
+    for mode in args.modes:
+        for preload in args.preload:
+            runs = [{"import_s": import_time(mode), **serve_times(mode, preload, args.port)}
+                    for _ in range(args.runs)]
+            row = {"mode": mode, "preload": preload == "1",
+                   **{k: round(float(np.median([r[k] for r in runs])), 3) for k in runs[0]}}
+            rows.append(row)
+            print(json.dumps(row), flush=True)
+    print(json.dumps(rows, indent=2))
+
+if __name__ == "__main__":
+    main()
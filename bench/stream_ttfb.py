@@ -0,0 +1,63 @@
+# bench/stream_ttfb.py
+# Time to first byte / first token and total time for /api/chat vs /api/chat/stream
+# with USE_LLM=1, against the local fake LLM (bench/fake_llm.py) so it runs offline.
+#
+#   python -m bench.stream_ttfb --backend openai --first-token-ms 300 --token-ms 20
+import argparse, json, os, sys, time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.fake_llm import serve
+
+QUESTIONS = ["how much protein do i need?", "what should I eat before running?",
+             "20 minute home workout", "hydration plan for lifting", "creatine timing"]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--backend", choices=["openai", "ollama"], default="openai")
+    ap.add_argument("--port", type=int, default=8089)
+    ap.add_argument("--first-token-ms", type=float, default=300)
+    ap.add_argument("--token-ms", type=float, default=20)
+    ap.add_argument("--tokens", type=int, default=60)
+    ap.add_argument("--rounds", type=int, default=3)
+    args = ap.parse_args()
+
+    serve(args.port, args.first_token_ms, args.token_ms, args.tokens, background=True)
+    os.environ.update(USE_LLM="1", REPLY_CACHE="0")
+    if args.backend == "openai":
+        os.environ.update(OPENAI_API_KEY="fake", OPENAI_BASE_URL=f"http://127.0.0.1:{args.port}/v1")
+    else:
+        os.environ.update(USE_OLLAMA="1", OLLAMA_HOST=f"http://127.0.0.1:{args.port}")
+
+    import app as app_mod
+    app_mod.log_event = lambda ev: None
+    client = app_mod.app.test_client()
+
+    plain, first, total = [], [], []
+    for _ in range(args.rounds):
+        for q in QUESTIONS:
+            t0 = time.perf_counter()
+            client.post("/api/chat", json={"message": q}).get_json()
+            plain.append(time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            resp = client.post("/api/chat/stream", json={"message": q}, buffered=False)
+            t_first = None
+            for chunk in resp.response:
+                # skip the "Coach FitEva:" header frame: measure the first generated token
+                if t_first is None and b"Coach FitEva" not in (chunk if isinstance(chunk, bytes) else chunk.encode()):
+                    t_first = time.perf_counter() - t0
+            total.append(time.perf_counter() - t0)
+            first.append(t_first if t_first is not None else total[-1])
+
+    ms = lambda xs, p: round(float(np.percentile(np.array(xs) * 1000, p)), 1)
+    print(json.dumps({
+        "backend": args.backend, "requests": len(plain),
+        "api_chat": {"ttfb_p50_ms": ms(plain, 50), "ttfb_p99_ms": ms(plain, 99)},
+        "api_chat_stream": {"first_token_p50_ms": ms(first, 50), "first_token_p99_ms": ms(first, 99),
+                            "total_p50_ms": ms(total, 50)},
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# bench/suite.py
+# One reproducible run: micro-benchmarks + in-process replay (+ HTTP replay with
+# --http), written as one JSON file so two runs can be diffed.
+#
+#   python -m bench.suite                              # -> bench/results/<utc stamp>-<sha>.json
+#   python -m bench.suite --http --compare bench/results/<older>.json
+import argparse, json, os, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.common import load_queries, offline_env, run_meta
+from bench.micro import run_micro
+from bench.replay import add_args, replay_http, replay_inproc
+
+RESULTS_DIR = os.path.join("bench", "results")
+
+def _flatten(obj, prefix: str = "") -> dict:
+    out = {}
+    for k, v in obj.items():
+        key = f"{prefix}{k}"
+        if isinstance(v, dict):
+            out.update(_flatten(v, key + "."))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            out[key] = v
+    return out
+
+def compare(old: dict, new: dict) -> dict:
+    """Relative change of every numeric result present in both runs (meta excluded)."""
+    a = _flatten({k: v for k, v in old.items() if k != "meta"})
+    b = _flatten({k: v for k, v in new.items() if k != "meta"})
+    return {k: {"old": a[k], "new": b[k], "change_pct": round((b[k] - a[k]) / a[k] * 100, 1) if a[k] else None}
+            for k in sorted(a.keys() & b.keys())}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--http", action="store_true", help="also replay over HTTP against a local gunicorn")
+    ap.add_argument("--number", type=int, default=200, help="calls per micro-benchmark loop")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--out")
+    ap.add_argument("--compare", help="earlier suite JSON to diff against")
+    add_args(ap)
+    args = ap.parse_args()
+
+    queries = load_queries(*args.queries)
+    if not queries:
+        sys.exit("no queries found in " + ", ".join(args.queries))
+    os.environ.update(offline_env(args.llm, first_token_ms=args.first_token_ms))
+    n = args.requests or len(queries)
+    meta = run_meta(args)
+    report = {"meta": meta, "micro": run_micro(queries, args.number, args.repeat),
+              "inproc": replay_inproc(queries, args.concurrency, args.rate, n)}
+    if args.http:
+        report["http"] = replay_http(queries, args.concurrency, args.rate, n)
+
+    out = args.out or os.path.join(RESULTS_DIR, time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+                                   + f"-{meta['git'] or 'nogit'}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print(json.dumps({"compare": compare(json.load(f), report)}, indent=2))
+    print(f"wrote {out}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
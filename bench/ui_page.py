@@ -0,0 +1,163 @@
+# bench/ui_page.py
+# Cost of serving the chat page: requests/s and bytes on the wire for GET /,
+# comparing the old per-request render of the page with its CSS/JS inlined
+# against the pre-rendered page (identity, gzip, br if installed, 304), and the
+# total bytes of a first visit (page + CSS + JS) vs. a repeat visit.
+#
+# It also runs the shipped static/chat.js ask() (under node, if installed) on a
+# real /api/chat/stream body and checks it renders the whole reply without
+# falling back to /api/chat; that a 429 is shown, not retried; that a stream
+# dropped mid-reply keeps its text without a second request; and that only a
+# server that can't stream gets the /api/chat fallback.
+#
+#   python -m bench.ui_page --seconds 3
+import argparse, json, os, shutil, subprocess, sys, tempfile, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.common import offline_env, run_meta
+from static_assets import STATIC_DIR
+
+def legacy_template(app) -> str:
+    # the page as it was before static/: CSS and JS inlined, rendered on every request
+    css = app.STATIC["chat.css"].body.decode("utf-8")
+    js = app.STATIC["chat.js"].body.decode("utf-8")
+    html = app.HTML
+    for name, inline in (("css", f"<style>\n{css}</style>"), ("js", f"<script>\n{js}</script>")):
+        start = html.index("{{ %s_url }}" % name)
+        open_tag = html.rindex("<", 0, start)
+        close_tag = html.index(">", start) + 1
+        if name == "js":
+            close_tag = html.index("</script>", start) + len("</script>")
+        html = html[:open_tag] + inline + html[close_tag:]
+    return html
+
+# just enough DOM for chat.js to load; fetch replays the captured SSE body in odd-sized chunks,
+# or answers as an overloaded / non-streaming server, or drops the stream after its first frame
+NODE_HARNESS = r"""
+const fs = require('fs');
+const [jsPath, bodyPath, mode] = process.argv.slice(2);
+const el = () => ({textContent: '', className: '', innerHTML: '', value: '', scrollTop: 0, scrollHeight: 0,
+  children: [], parentElement: null, setAttribute(){}, getAttribute(){ return null; },
+  addEventListener(){}, querySelectorAll(){ return []; }, classList: {add(){}, remove(){}},
+  appendChild(c){ c.parentElement = this; this.children.push(c); return c; }});
+const store = {getItem(){ return null; }, setItem(){}};
+global.document = {documentElement: el(), getElementById: el, createElement: el};
+global.localStorage = store; global.sessionStorage = store; global.window = {};
+const body = fs.readFileSync(bodyPath);
+const noHeaders = {get(){ return null; }};
+const posts = [];
+global.fetch = async (url) => {
+  posts.push(url);
+  if(mode === 'busy') return {ok: false, status: 429, headers: {get(){ return '3'; }}, body: null};
+  if(url === '/api/chat') return {ok: true, status: 200, headers: noHeaders, json: async () => ({reply: 'JSON REPLY'})};
+  if(mode === 'unsupported') return {ok: true, status: 200, headers: noHeaders, body: null};
+  const limit = mode === 'cut' ? body.indexOf('\n\n') + 2 : body.length;
+  let off = 0;
+  return {ok: true, status: 200, headers: noHeaders, body: {getReader: () => ({read: async () => {
+    if(off >= limit){
+      if(mode === 'cut') throw new TypeError('network error');
+      return {done: true};
+    }
+    const n = Math.min(7, limit - off); const v = body.subarray(off, off + n); off += n;
+    return {done: false, value: v};
+  }})}};
+};
+eval(fs.readFileSync(jsPath, 'utf8') + ';globalThis.ask = ask; globalThis.msgEl = msg; globalThis.chatEl = chat;');
+msgEl.value = 'q';
+ask().then(() => {
+  const bubbles = [];
+  (function walk(n){ if(n.className && n.className.startsWith('bubble')) bubbles.push(n.textContent); n.children.forEach(walk); })(chatEl);
+  console.log(JSON.stringify({ok: true, posts, bubbles: bubbles.slice(1)}));  // [0] is the greeting
+}).catch(e => console.log(JSON.stringify({ok: false, posts, error: String(e)})));
+"""
+
+def stream_check(app, client) -> dict:
+    """Run the shipped ask()/askStream on a real /api/chat/stream body, and as a 429,
+    a non-streaming server and a stream dropped after its first frame."""
+    node = shutil.which("node")
+    if node is None:
+        return {"skipped": "node not installed"}
+    resp = client.post("/api/chat/stream", json={"message": "how much protein do I need?"})
+    body = resp.get_data()
+    frames = [f for f in body.decode("utf-8").split("\n\n") if f.startswith("data: ")]
+    expected = "".join(json.loads(f[len("data: "):])["t"] for f in frames)
+    stream = ["/api/chat/stream"]
+    checks = {  # mode -> (expected posts, test on the bot bubble); each run shows "q" plus one bot bubble
+        "stream": (stream, lambda t: t == expected),
+        "busy": (stream, lambda t: "3 seconds" in t),
+        "cut": (stream, lambda t: t.startswith(json.loads(frames[0][len("data: "):])["t"]) and "Connection lost" in t),
+        "unsupported": (stream + ["/api/chat"], lambda t: t == "JSON REPLY"),
+    }
+    out = {"ok": True, "frames": len(frames)}
+    with tempfile.TemporaryDirectory() as tmp:
+        harness, sse = os.path.join(tmp, "harness.js"), os.path.join(tmp, "body.sse")
+        with open(harness, "w", encoding="utf-8") as f:
+            f.write(NODE_HARNESS)
+        with open(sse, "wb") as f:
+            f.write(body)
+        for mode, (posts, test) in checks.items():
+            run = subprocess.run([node, harness, os.path.join(STATIC_DIR, "chat.js"), sse, mode],
+                                 capture_output=True, text=True, timeout=30)
+            try:
+                got = json.loads(run.stdout.strip().splitlines()[-1])
+            except (ValueError, IndexError):
+                got = {"ok": False, "error": run.stderr.strip()[-500:]}
+            bubbles = got.get("bubbles", [])
+            ok = got["ok"] and got["posts"] == posts and len(bubbles) == 2 and test(bubbles[-1])
+            out[mode] = {"ok": ok, "posts": got.get("posts"), "bubbles": len(bubbles), "error": got.get("error")}
+            out["ok"] = out["ok"] and ok
+    return out
+
+def rate(fn, seconds: float) -> float:
+    n, t0 = 0, time.perf_counter()
+    while time.perf_counter() - t0 < seconds:
+        for _ in range(50):
+            fn()
+        n += 50
+    return n / (time.perf_counter() - t0)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--seconds", type=float, default=3.0)
+    args = ap.parse_args()
+    os.environ.update(offline_env("off"))  # the stream check posts a chat: keep it out of data/chat_logs.jsonl
+    os.environ.setdefault("MODEL_WARMUP", "lazy")
+    import app  # noqa: E402 - after MODEL_WARMUP so the encoder isn't loaded
+
+    client = app.app.test_client()
+    legacy = legacy_template(app)
+
+    @app.app.route("/__legacy")
+    def _legacy():
+        return app.render_template_string(legacy)
+
+    out = {"meta": run_meta(args), "brotli": "br" in app.PAGE.variants, "routes": {}}
+    etag = client.get("/", headers={"Accept-Encoding": "gzip"}).headers["ETag"]
+    cases = {
+        "legacy_render": ("/__legacy", {}),
+        "page_identity": ("/", {}),
+        "page_gzip": ("/", {"Accept-Encoding": "gzip"}),
+        "page_br": ("/", {"Accept-Encoding": "br, gzip"}),
+        "page_304": ("/", {"Accept-Encoding": "gzip", "If-None-Match": etag}),
+    }
+    for name, (path, headers) in cases.items():
+        resp = client.get(path, headers=headers)
+        out["routes"][name] = {"status": resp.status_code, "bytes": len(resp.data),
+                               "encoding": resp.headers.get("Content-Encoding", "identity"),
+                               "req_per_s": round(rate(lambda: client.get(path, headers=headers), args.seconds))}
+
+    enc = {"Accept-Encoding": "br, gzip"}
+    urls = ["/"] + [app.url_for_asset(app.STATIC, n) for n in ("chat.css", "chat.js")]
+    first = sum(len(client.get(u, headers=enc).data) for u in urls)
+    # a repeat visit: the page is revalidated, the versioned CSS/JS come from the browser cache
+    repeat = len(client.get("/", headers={**enc, "If-None-Match": etag}).data)
+    out["visits"] = {"legacy_bytes": len(legacy.encode("utf-8")), "first_visit_bytes": first,
+                     "repeat_visit_bytes": repeat}
+    out["stream_check"] = stream_check(app, client)
+    print(json.dumps(out, indent=2))
+    if out["stream_check"].get("ok") is False:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# bench/worker_rss.py
+# Memory of a gunicorn deployment at several worker counts, with and without
+# preload_app. Reads /proc/<pid>/smaps_rollup (Linux) for the master and every
+# worker. PSS splits shared pages between the processes that map them, so
+# "pss_total_mb" is the real footprint. RSS counts shared pages once per process.
+#
+#   python -m bench.worker_rss --workers 4 8
+import argparse, json, os, subprocess, sys, tempfile, time
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def smaps(pid: int) -> dict:
+    out = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 3 and parts[-1] == "kB":
+                out[parts[0].rstrip(":")] = int(parts[1]) / 1024.0
+    return out
+
+def children(pid: int) -> list:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+def measure(workers: int, preload: bool, port: int) -> dict:
+    env = {**os.environ, "WEB_CONCURRENCY": str(workers), "GUNICORN_PRELOAD": "1" if preload else "0",
+           "GUNICORN_BIND": f"127.0.0.1:{port}", "CHAT_LOG_FILE": os.path.join(tempfile.mkdtemp(), "log.jsonl")}
+    proc = subprocess.Popen(["gunicorn", "app:app", "-c", "gunicorn.conf.py"], cwd=ROOT, env=env)
+    try:
+        deadline = time.time() + 600
+        while len(children(proc.pid)) < workers or not _up(port):
+            if time.time() > deadline or proc.poll() is not None:
+                raise RuntimeError("gunicorn did not come up")
+            time.sleep(1)
+        # touch the semantic path in every worker so lazily-built state is counted
+        for i in range(workers * 4):
+            httpx.post(f"http://127.0.0.1:{port}/api/chat", json={"message": f"recovery snack after a long ride {i}"}, timeout=60)
+        time.sleep(1)
+        master = smaps(proc.pid)
+        kids = [smaps(p) for p in children(proc.pid)]
+    finally:
+        proc.terminate()
+        proc.wait(60)
+    procs = [master] + kids
+    return {
+        "workers": workers, "preload": preload,
+        "rss_per_worker_mb": round(sum(k["Rss"] for k in kids) / len(kids), 1),
+        "private_per_worker_mb": round(sum(k.get("Private_Clean", 0) + k.get("Private_Dirty", 0) for k in kids) / len(kids), 1),
+        "rss_total_mb": round(sum(p["Rss"] for p in procs), 1),
+        "pss_total_mb": round(sum(p["Pss"] for p in procs), 1),
+    }
+
+def _up(port: int) -> bool:
+    try:
+        return httpx.get(f"http://127.0.0.1:{port}/", timeout=2).status_code == 200
+    except httpx.HTTPError:
+        return False
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, nargs="+", default=[4, 8])
+    ap.add_argument("--port", type=int, default=8094)
+    args = ap.parse_args()
+    rows = []
+    for n in args.workers:
+        for preload in (False, True):
+            rows.append(measure(n, preload, args.port))
+            print(json.dumps(rows[-1]), flush=True)
+    print(json.dumps(rows, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,444 @@
 # embeddings_store.py
-from typing import List, Dict, Any
+from typing import Any, Callable, Dict, List, Optional
+import glob, hashlib, json, os, threading
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from sklearn.neighbors import NearestNeighbors
+from vector_index import make_index
+from lexical_index import BM25Index
+from metrics import METRICS
+
+DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+CACHE_DIR = os.getenv("EMB_CACHE_DIR", os.path.join("data", "cache"))
+
+def _cache_key(model_name: str, texts: List[str]) -> str:
+    # changes whenever the model or any text (or their order) changes
+    h = hashlib.sha1(model_name.encode("utf-8"))
+    h.update(json.dumps(texts, ensure_ascii=False).encode("utf-8"))
+    return h.hexdigest()[:16]
+
+def _atomic_save(path: str, arr: np.ndarray):
+    # write to a temp file first so a concurrent worker never reads a half-written .npy
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, arr)
+    os.replace(tmp, path)
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+class KBEmbeddingCache:
+    """Content-addressed on-disk store of KB embeddings for one model.
+
+    Each distinct ordered text list is saved as <key>.npy plus a <key>.json
+    manifest of per-row text hashes. Matrices are opened with mmap so all
+    workers on a host share the same pages, and rows for texts seen in an
+    earlier version are copied over instead of re-encoded.
+    """
+
+    KEEP_VERSIONS = 3
+
+    def __init__(self, model_name: str, cache_dir: str = CACHE_DIR):
+        self.dir = os.path.join(cache_dir, "kb-" + model_name.replace("/", "__"))
+
+    def load(self, model, texts: List[str], known: Dict[str, np.ndarray] = None) -> np.ndarray:
+        # known: text hash -> row already in memory (the previous KB snapshot)
+        key = _cache_key("", texts)
+        path = os.path.join(self.dir, key + ".npy")
+        try:
+            embs = np.load(path, mmap_mode="r")
+            if embs.shape[0] == len(texts):
+                return embs
+        except (OSError, ValueError):
+            pass
+
+        hashes = [_text_hash(t) for t in texts]
+        embs = self._reuse_rows(hashes, known or {})
+        todo = [i for i, row in enumerate(embs) if row is None]
+        if todo:
+            fresh = model.encode([texts[i] for i in todo], normalize_embeddings=True)
+            for i, e in zip(todo, fresh):
+                embs[i] = e
+        embs = np.asarray(np.stack(embs), dtype=np.float32) if texts else np.zeros((0, 0), np.float32)
+        try:
+            _atomic_save(path, embs)
+            tmp = os.path.join(self.dir, f"{key}.json.{os.getpid()}.tmp")
+            with open(tmp, "w") as f:
+                json.dump(hashes, f)
+            os.replace(tmp, os.path.join(self.dir, key + ".json"))
+            self._prune()
+            return np.load(path, mmap_mode="r")
+        except OSError:
+            return embs  # read-only disk: keep the in-memory copy
+
+    def _manifests(self) -> List[str]:
+        try:
+            names = [n for n in os.listdir(self.dir) if n.endswith(".json")]
+        except OSError:
+            return []
+        paths = [os.path.join(self.dir, n) for n in names]
+        return sorted(paths, key=os.path.getmtime, reverse=True)
+
+    def _reuse_rows(self, hashes: List[str], known: Dict[str, np.ndarray]) -> list:
+        rows = [None] * len(hashes)
+        wanted = {}
+        for i, h in enumerate(hashes):
+            if h in known:
+                rows[i] = np.array(known[h])
+            else:
+                wanted.setdefault(h, []).append(i)
+        for man in self._manifests():
+            if not wanted:
+                break
+            try:
+                with open(man) as f:
+                    old_hashes = json.load(f)
+                old = np.load(man[:-len(".json")] + ".npy", mmap_mode="r")
+            except (OSError, ValueError):
+                continue
+            if old.shape[0] != len(old_hashes):
+                continue
+            for j, h in enumerate(old_hashes):
+                for i in wanted.pop(h, ()):
+                    rows[i] = np.array(old[j])
+        return rows
+
+    def _prune(self):
+        for man in self._manifests()[self.KEEP_VERSIONS:]:
+            for p in (man, man[:-len(".json")] + ".npy"):
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+
+def load_lexical(kb_items: List[Dict[str, str]], cache_dir: str = CACHE_DIR, keep: int = 3) -> BM25Index:
+    """BM25Index for kb_items, read from cache_dir/bm25-<key>.npz if this exact KB was
+    indexed before (by another worker or an earlier start); built and saved otherwise."""
+    key = _cache_key("bm25", [[it["q"], it.get("a", "")] for it in kb_items])
+    path = os.path.join(cache_dir, f"bm25-{key}.npz")
+    try:
+        index = BM25Index.load(path)
+        if index.n == len(kb_items):
+            return index
+    except (OSError, ValueError, KeyError):
+        pass
+    index = BM25Index(kb_items)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        index.save(path)
+        old = sorted(glob.glob(os.path.join(cache_dir, "bm25-*.npz")), key=os.path.getmtime, reverse=True)
+        for p in old[keep:]:
+            os.remove(p)
+    except OSError:
+        pass  # read-only disk: keep the in-memory index
+    return index
+
+class AnchorIndex:
+    """Normalized embeddings of a fixed list of anchor phrases, encoded once and persisted.
+
+    Nothing is read or encoded until the first max_sim()/load(); get_model is only
+    called if the persisted matrix is missing.
+    """
+
+    def __init__(self, get_model: Callable[[], Any], anchors: List[str], model_name: str = DEFAULT_MODEL,
+                 cache_dir: str = CACHE_DIR):
+        self.anchors = list(anchors)
+        self.key = _cache_key(model_name, self.anchors)
+        self.path = os.path.join(cache_dir, f"anchors-{self.key}.npy")
+        self._get_model = get_model
+        self.embs = None
+
+    def load(self) -> "AnchorIndex":
+        if self.embs is None:
+            self.embs = self._load_or_build()
+        return self
+
+    def _load_or_build(self) -> np.ndarray:
+        try:
+            embs = np.load(self.path)
+            if embs.shape[0] == len(self.anchors):
+                return embs
+        except (OSError, ValueError):
+            pass
+        embs = self._get_model().encode(self.anchors, normalize_embeddings=True)
+        embs = np.asarray(embs, dtype=np.float32)
+        try:
+            _atomic_save(self.path, embs)
+        except OSError:
+            pass  # read-only disk: keep the in-memory copy
+        return embs
+
+    def max_sim(self, q_emb: np.ndarray) -> float:
+        # q_emb: normalized (1, d) or (d,) query embedding
+        return float((np.atleast_2d(q_emb) @ self.load().embs.T).max())
+
+    def max_sims(self, q_embs: np.ndarray) -> np.ndarray:
+        # one row per query: (n, d) -> (n,)
+        return (np.atleast_2d(q_embs) @ self.load().embs.T).max(axis=1)
+
+class KBSnapshot:
+    """One immutable KB version: entries, BM25, and (once warm) embeddings + index.
+    EmbStore replaces the whole snapshot in one assignment, so a search that
+    reads `store._snap` once sees a consistent KB without taking a lock."""
+
+    __slots__ = ("kb", "texts", "version", "lexical", "embs", "index")
+
+    def __init__(self, kb, texts, version, lexical, embs=None, index=None):
+        self.kb, self.texts, self.version, self.lexical = kb, texts, version, lexical
+        self.embs, self.index = embs, index
 
 class EmbStore:
-    def __init__(self, kb_items: List[Dict[str, str]], model_name: str = "sentence-transformers/all-MiniLM-L6-v2"):
-        self.kb = kb_items[:]  # keep original order for stable indices
-        self.model = SentenceTransformer(model_name)
+    """KB retrieval. Construction is cheap (texts, version, BM25); the
+    SentenceTransformer, KB embeddings and vector index are built by warm(),
+    which runs on first use of model/encoder/embs/index or from a warm-up thread.
+    reload() swaps in a new KB, re-encoding only entries whose text changed.
+    """
+
+    def __init__(self, kb_items: List[Dict[str, str]], model_name: str = DEFAULT_MODEL):
+        self.model_name = model_name
+        self.hybrid = os.getenv("RETRIEVAL", "hybrid") == "hybrid"
+        self.dense_weight = float(os.getenv("HYBRID_DENSE_WEIGHT", "0.7"))
+        self._emb_cache = KBEmbeddingCache(model_name)
+        self._lock = threading.Lock()  # writers only (warm / reload); searches never take it
+        self._model = self._encoder = None
+        self._snap = self._snapshot(kb_items)
+
+    def _snapshot(self, kb_items: List[Dict[str, str]], model=None, prev: KBSnapshot = None) -> KBSnapshot:
+        kb = kb_items[:]  # keep original order for stable indices
         # We embed the KB "q" field (queries/prompts). You can also embed answers if you prefer.
-        self.texts = [it["q"] for it in self.kb]
-        self.embs = self.model.encode(self.texts, normalize_embeddings=True)
-        self.nn = NearestNeighbors(n_neighbors=5, metric="cosine")
-        self.nn.fit(self.embs)
+        texts = [it["q"] for it in kb]
+        # changes whenever the model or any KB q/a changes; caches of derived replies key on it
+        version = _cache_key(self.model_name, [[it["q"], it["a"]] for it in kb])
+        # BM25 over q + a, loaded from data/cache when this KB was indexed before;
+        # RETRIEVAL=dense turns hybrid search back into dense-only
+        snap = KBSnapshot(kb, texts, version, load_lexical(kb))
+        if model is not None:
+            known = None
+            if prev is not None and prev.embs is not None:
+                known = {_text_hash(t): row for t, row in zip(prev.texts, prev.embs)}
+            # mmap'd from data/cache; only texts not seen before are encoded
+            snap.embs = self._emb_cache.load(model, texts, known=known)
+            # top-k backend picked by VECTOR_INDEX (numpy | ivf | sklearn); IVF keeps its centroids across reloads
+            if prev is not None and prev.index is not None:
+                snap.index = prev.index.with_embs(snap.embs)
+            else:
+                snap.index = make_index(snap.embs)
+        return snap
+
+    def warm(self) -> "EmbStore":
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer  # heavy: torch, transformers
+                    model = SentenceTransformer(self.model_name)
+                    # per-request query encodes go through the micro-batcher when ENCODER_BATCH=1;
+                    # bulk KB/anchor encodes always call the model directly
+                    encoder = model
+                    if os.getenv("ENCODER_BATCH") == "1":
+                        from batch_encoder import BatchEncoder
+                        encoder = BatchEncoder.from_env(model)
+                    self._snap = self._snapshot(self._snap.kb, model)
+                    self._encoder = encoder
+                    self._model = model  # set last: marks the store warm
+        return self
+
+    def reload(self, kb_items: List[Dict[str, str]]) -> KBSnapshot:
+        """Build a snapshot for kb_items off to the side and swap it in. Searches keep
+        using the previous one until the swap; unchanged entries are not re-encoded."""
+        with self._lock:
+            prev = self._snap
+            snap = self._snapshot(kb_items, self._model, prev)
+            self._snap = snap
+        return snap
+
+    @property
+    def ready(self) -> bool:
+        return self._model is not None
+
+    @property
+    def kb(self) -> List[Dict[str, str]]:
+        return self._snap.kb
+
+    @property
+    def texts(self) -> List[str]:
+        return self._snap.texts
+
+    @property
+    def version(self) -> str:
+        return self._snap.version
+
+    @property
+    def lexical(self) -> BM25Index:
+        return self._snap.lexical
+
+    @property
+    def model(self):
+        return self.warm()._model
+
+    @property
+    def encoder(self):
+        return self.warm()._encoder
+
+    @property
+    def embs(self) -> np.ndarray:
+        return self.warm()._snap.embs
+
+    @property
+    def index(self):
+        return self.warm()._snap.index
+
+    def entry_embedding(self, hit: Dict[str, Any]) -> Optional[np.ndarray]:
+        """The embedding of the KB entry `hit` came from, or None if the store is cold
+        or a reload since the search moved or changed the entry at hit["i"]."""
+        snap = self._snap
+        i = hit["i"]
+        if snap.embs is None or i >= len(snap.kb):
+            return None
+        item = snap.kb[i]
+        if item.get("id") != hit.get("id") or item["q"] != hit["q"]:
+            return None
+        return snap.embs[i]
+
+    def anchor_index(self, anchors: List[str]) -> AnchorIndex:
+        return AnchorIndex(lambda: self.model, anchors, model_name=self.model_name)
+
+    def encode_query(self, query: str) -> np.ndarray:
+        return self.encoder.encode([query], normalize_embeddings=True)
 
     def search(self, query: str, k: int = 3) -> List[Dict[str, Any]]:
-        q_emb = self.model.encode([query], normalize_embeddings=True)
-        distances, idxs = self.nn.kneighbors(q_emb, n_neighbors=min(k, len(self.texts)))
-        # cosine distance ∈ [0,2], similarity = 1 - distance
-        results = []
-        for d, i in zip(distances[0], idxs[0]):
-            sim = 1.0 - float(d)
-            item = self.kb[int(i)]
-            results.append({
-                "i": int(i),
-                "score": sim,
-                "q": item["q"],
-                "a": item["a"]
-            })
-        return results
\ No newline at end of file
+        return self.search_vector(self.encode_query(query), k=k)
+
+    def search_vector(self, q_emb: np.ndarray, k: int = 3) -> List[Dict[str, Any]]:
+        # q_emb: normalized query embedding, (d,) or (1, d); skips the encoder entirely
+        return self._dense(self.warm()._snap, q_emb, k)
+
+    def _dense(self, snap: KBSnapshot, q_emb: np.ndarray, k: int) -> List[Dict[str, Any]]:
+        if not snap.texts:
+            return []
+        scores, idxs = snap.index.search(np.atleast_2d(q_emb), min(k, len(snap.texts)))
+        return [self._hit(snap, i, sim) for sim, i in zip(scores[0], idxs[0]) if i >= 0]
+
+    def _hit(self, snap: KBSnapshot, i, score: float, via: str = "dense") -> Dict[str, Any]:
+        item = snap.kb[int(i)]
+        return {
+            "i": int(i),
+            "id": item.get("id"),
+            "score": float(score),
+            "q": item["q"],
+            "a": item["a"],
+            "source": item.get("source"),
+            "url": item.get("url"),
+            "via": via
+        }
+
+    def search_hybrid(self, ctx: "QueryContext", k: int = 3) -> List[Dict[str, Any]]:
+        """BM25 + dense retrieval for one request.
+
+        If BM25 alone is confident (top doc covers the query terms and clearly
+        beats the runner-up) the hits come back without touching ctx.vec, and
+        "score" is the lexical coverage (0..1). Otherwise candidates from both
+        sides are ranked by a weighted sum of cosine and max-normalized BM25,
+        and "score" stays the cosine similarity draft_answer is tuned for.
+        """
+        if not self.hybrid:
+            return self.search_vector(ctx.vec, k=k)
+        snap = self._snap
+        lex, coverage = snap.lexical.search(ctx.text, k=10)
+        # a follow-up's words alone say little about what it refers to: go through the folded vector
+        if ctx.topic is None and BM25Index.confident(lex, coverage):
+            return self._lexical_hits(snap, lex, coverage, k)
+
+        q = ctx.vec  # may warm the store, which swaps in a snapshot with embeddings
+        if self.warm()._snap is not snap:
+            snap = self._snap
+            lex, coverage = snap.lexical.search(ctx.text, k=10)
+        return self._fuse(snap, q, self._dense(snap, q, max(k, 10)), lex, k)
+
+    def search_lexical(self, query: str, k: int = 3) -> List[Dict[str, Any]]:
+        # BM25 only, never touches the model; "score" is the lexical coverage as in search_hybrid
+        snap = self._snap
+        lex, coverage = snap.lexical.search(query, k=k)
+        return self._lexical_hits(snap, lex, coverage, k) if lex else []
+
+    def _lexical_hits(self, snap: KBSnapshot, lex, coverage: float, k: int) -> List[Dict[str, Any]]:
+        top = lex[0][1]
+        return [self._hit(snap, i, coverage * s / top, via="lexical") for i, s in lex[:k]]
+
+    def _fuse(self, snap: KBSnapshot, q: np.ndarray, dense, lex, k: int) -> List[Dict[str, Any]]:
+        cands = list(dict.fromkeys([h["i"] for h in dense] + [i for i, _ in lex]))
+        cos = np.asarray(snap.embs[cands]) @ np.ravel(q)
+        bm25 = dict(lex)
+        top = lex[0][1] if lex else 1.0
+        w = self.dense_weight
+        fused = [(w * c + (1 - w) * bm25.get(i, 0.0) / top, i, c) for i, c in zip(cands, cos)]
+        fused.sort(key=lambda x: -x[0])
+        return [self._hit(snap, i, c, via="hybrid") for _, i, c in fused[:k]]
+
+    def encode_batch(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        # bulk encodes go straight to the model, not through the per-request micro-batcher
+        if not texts:
+            return np.zeros((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+        return np.asarray(self.model.encode(texts, batch_size=batch_size, normalize_embeddings=True),
+                          dtype=np.float32)
+
+    def search_batch(self, texts: List[str], q_embs: np.ndarray, k: int = 3) -> List[List[Dict[str, Any]]]:
+        """search_hybrid for many messages against one snapshot, with a single
+        index.search over every query row. q_embs: (len(texts), d), normalized."""
+        snap = self.warm()._snap
+        if not snap.texts:
+            return [[] for _ in texts]
+        q_embs = np.atleast_2d(q_embs)
+        scores, idxs = snap.index.search(q_embs, min(max(k, 10) if self.hybrid else k, len(snap.texts)))
+        out = []
+        for r, text in enumerate(texts):
+            dense = [self._hit(snap, i, sim) for sim, i in zip(scores[r], idxs[r]) if i >= 0]
+            if not self.hybrid:
+                out.append(dense[:k])
+                continue
+            lex, coverage = snap.lexical.search(text, k=10)
+            if BM25Index.confident(lex, coverage):
+                out.append(self._lexical_hits(snap, lex, coverage, k))
+            else:
+                out.append(self._fuse(snap, q_embs[r], dense, lex, k))
+        return out
+
+
+class QueryContext:
+    """Per-request view of one user message; the text is encoded at most once, on first use.
+
+    topic: for a follow-up, the conversation's topic embedding; it is folded into
+    the query vector (q + fold * topic, renormalized) so "what about after?"
+    retrieves near the previous answer. `vec` is that folded vector (retrieval);
+    `raw_vec` is the message alone (the domain check, which must judge this message).
+    """
+
+    def __init__(self, store: EmbStore, text: str, topic: np.ndarray = None, fold: float = 0.5):
+        self.store = store
+        self.text = text
+        self.topic = topic
+        self.fold = fold
+        self._raw = None
+        self._vec = None
+        self.event = None  # the chat event logged for this request, if any
+        self.hits = None   # draft_answer's hits, if retrieval ran
+        self.degrade = 0   # load-shedding level from admission.py (0 = full reply)
+
+    @property
+    def encoded(self) -> bool:
+        return self._raw is not None
+
+    @property
+    def raw_vec(self) -> np.ndarray:
+        if self._raw is None:
+            with METRICS.span("encode"):
+                self._raw = self.store.encode_query(self.text)
+        return self._raw
+
+    @property
+    def vec(self) -> np.ndarray:
+        if self._vec is None:
+            q = self.raw_vec
+            if self.topic is not None:
+                q = q + self.fold * np.asarray(self.topic, dtype=np.float32).reshape(q.shape)
+                q = q / max(float(np.linalg.norm(q)), 1e-12)
+            self._vec = q
+        return self._vec
@@ -0,0 +1,258 @@
+# feedback_index.py
+# 👍/👎 from /api/feedback, aggregated per KB entry and per (query cluster, KB
+# entry), and used by draft_answer as a small re-rank prior over its top-k hits.
+#
+# Answer events carry "kb" (the answered entry's id, or a hash of its "q"); a
+# feedback event only has the question text, so it is credited to the entry
+# that most recently answered the same (normalized) question. A query cluster
+# is the question's sorted content words, so "protein after workout?" and
+# "workout protein after" share one.
+#
+# FeedbackTailer follows the chat log (every worker appends to the same file),
+# applies new events as they land - O(1) each - and snapshots the counts plus
+# its read position to data/feedback_index.json, so a restart only catches up.
+#
+#   python feedback_index.py --rebuild     # one streaming pass over the log + rotated / .gz files
+#   python feedback_index.py --top 20      # worst-rated entries in the current snapshot
+import argparse, hashlib, json, os, sys, threading, time
+from collections import OrderedDict
+from typing import Dict, List
+
+from lexical_index import tokenize
+from log_analytics import _file_id, log_files, parse_events, read_lines
+from logger import LOG_FILE
+
+STATE_FILE = os.getenv("FEEDBACK_INDEX", os.path.join("data", "feedback_index.json"))
+ANSWER_TYPES = ("answer", "llm_answer")
+
+def kb_key(hit: dict) -> str:
+    # stable across KB reloads and re-orderings, unlike the row index
+    if hit.get("id"):
+        return str(hit["id"])
+    return "q:" + hashlib.sha1(hit["q"].encode("utf-8")).hexdigest()[:12]
+
+def _norm_q(q) -> str:
+    return " ".join(str(q or "").lower().split())
+
+def query_cluster(text: str) -> str:
+    return " ".join(sorted(set(tokenize(text))))
+
+class FeedbackIndex:
+    """Counts [useful, not useful] per entry and per (cluster, entry).
+
+    prior = weight * ((m_entry - 0.5) + (m_pair - 0.5)), where m is the
+    Beta(alpha, alpha)-smoothed useful ratio, so a handful of votes moves a hit
+    a little and an entry nobody rated isn't moved at all.
+    """
+
+    def __init__(self, weight: float = 0.1, alpha: float = 2.0, max_recent: int = 50_000):
+        self.weight = weight
+        self.alpha = alpha
+        self.max_recent = max_recent
+        self.entries: Dict[str, List[int]] = {}
+        self.pairs: Dict[str, List[int]] = {}
+        self.recent: "OrderedDict[str, tuple]" = OrderedDict()  # norm q -> (cluster, kb) of its last answer
+        self.events = self.unmatched = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "FeedbackIndex":
+        return cls(weight=float(os.getenv("FEEDBACK_WEIGHT", "0.1")))
+
+    def observe(self, ev: dict):
+        t = ev.get("type")
+        if t in ANSWER_TYPES and ev.get("kb"):
+            q = _norm_q(ev.get("q"))
+            with self._lock:
+                self.recent[q] = (query_cluster(q), ev["kb"])
+                self.recent.move_to_end(q)
+                if len(self.recent) > self.max_recent:
+                    self.recent.popitem(last=False)
+        elif t == "feedback":
+            with self._lock:
+                self.events += 1
+                hit = self.recent.get(_norm_q(ev.get("q")))
+                if hit is None:
+                    self.unmatched += 1
+                    return
+                cluster, kb = hit
+                slot = 0 if ev.get("useful") else 1
+                self.entries.setdefault(kb, [0, 0])[slot] += 1
+                self.pairs.setdefault(cluster + "\t" + kb, [0, 0])[slot] += 1
+
+    def _mean(self, counts) -> float:
+        if counts is None:
+            return 0.5
+        return (counts[0] + self.alpha) / (counts[0] + counts[1] + 2 * self.alpha)
+
+    def prior(self, cluster: str, kb: str) -> float:
+        return self.weight * (self._mean(self.entries.get(kb)) - 0.5
+                              + self._mean(self.pairs.get(cluster + "\t" + kb)) - 0.5)
+
+    def rerank(self, text: str, hits: List[dict], floor: float = None) -> List[dict]:
+        """hits re-ordered by score + prior; "score" itself is left as retrieval computed it.
+
+        floor: only hits scoring at least this are re-ordered (among themselves), the
+        rest keep their place behind them, so a prior can pick which confident hit
+        answers but never swaps a confident one for one below the answer threshold.
+        """
+        if floor is not None:
+            head = [h for h in hits if h["score"] >= floor]
+            if len(head) < len(hits):
+                return self.rerank(text, head) + [h for h in hits if h["score"] < floor]
+        if not self.entries or self.weight <= 0 or len(hits) < 2:
+            return hits
+        cluster = None
+        keyed = []
+        for h in hits:
+            kb = kb_key(h)
+            p = 0.0
+            if kb in self.entries:
+                cluster = query_cluster(text) if cluster is None else cluster
+                p = self.prior(cluster, kb)
+            keyed.append((h["score"] + p, p, h))
+        if cluster is None:
+            return hits
+        keyed.sort(key=lambda x: -x[0])  # stable: ties keep retrieval order
+        return [{**h, "prior": round(p, 4)} if p else h for _, p, h in keyed]
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {"entries": dict(self.entries), "pairs": dict(self.pairs),
+                    "recent": [[q, c, kb] for q, (c, kb) in self.recent.items()],
+                    "events": self.events, "unmatched": self.unmatched}
+
+    def load_dict(self, d: dict):
+        with self._lock:
+            self.entries = {k: list(v) for k, v in d.get("entries", {}).items()}
+            self.pairs = {k: list(v) for k, v in d.get("pairs", {}).items()}
+            self.recent = OrderedDict((q, (c, kb)) for q, c, kb in d.get("recent", []))
+            self.events, self.unmatched = d.get("events", 0), d.get("unmatched", 0)
+
+    def stats(self) -> dict:
+        return {"entries": len(self.entries), "pairs": len(self.pairs), "feedback_events": self.events,
+                "unmatched": self.unmatched, "weight": self.weight}
+
+class FeedbackTailer:
+    """Polls the live chat log every `interval` s and feeds new lines to `index`.
+    start() is safe to call on every request (one thread per process, like KBWatcher)."""
+
+    def __init__(self, index: FeedbackIndex, log_file: str = LOG_FILE, state_file: str = STATE_FILE,
+                 interval: float = 2.0, snapshot_s: float = 60.0):
+        self.index = index
+        self.log_file = log_file
+        self.state_file = state_file
+        self.interval = interval
+        self.snapshot_s = snapshot_s
+        self.fid, self.offset = None, 0
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, index: FeedbackIndex) -> "FeedbackTailer":
+        tail = cls(index, interval=float(os.getenv("FEEDBACK_POLL_S", "2")),
+                   snapshot_s=float(os.getenv("FEEDBACK_SNAPSHOT_S", "60")))
+        tail.load()
+        return tail
+
+    def load(self):
+        try:
+            with open(self.state_file, encoding="utf-8") as f:
+                st = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.index.load_dict(st.get("index", {}))
+        self.fid, self.offset = st.get("fid"), st.get("offset", 0)
+
+    def save(self):
+        st = {"fid": self.fid, "offset": self.offset, "index": self.index.to_dict()}
+        tmp = f"{self.state_file}.{os.getpid()}.tmp"
+        os.makedirs(os.path.dirname(self.state_file) or ".", exist_ok=True)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(st, f, ensure_ascii=False)
+        os.replace(tmp, self.state_file)  # several workers may write it; each snapshot is self-consistent
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    def _read(self, path: str, start: int) -> int:
+        """Apply every complete line from `start` on; -> offset just past the last one."""
+        if start > os.path.getsize(path):
+            start = 0  # truncated / replaced under the same first line
+        pos = start
+        for line in read_lines(path, start):
+            pos += len(line)
+            for ev in parse_events((line,)):
+                self.index.observe(ev)
+                self._dirty = True
+        return pos
+
+    def poll(self):
+        if not os.path.exists(self.log_file):
+            return
+        fid = _file_id(self.log_file)
+        if fid is None:
+            return  # first line not complete yet
+        if fid != self.fid and self.fid is not None:
+            # the file we were reading was rotated away: finish it before starting the new one
+            for p in reversed(log_files(self.log_file)[:-1]):
+                if not p.endswith(".gz") and _file_id(p) == self.fid:
+                    self._read(p, self.offset)
+                    break
+            self.offset = 0
+        self.fid = fid
+        self.offset = self._read(self.log_file, self.offset)
+        if self._dirty and time.monotonic() - self._saved_at >= self.snapshot_s:
+            self.save()
+
+    def start(self):
+        if self._pid == os.getpid() or self.interval <= 0:
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                threading.Thread(target=self._run, name="feedback-tailer", daemon=True).start()
+
+    def _run(self):
+        while True:
+            try:
+                self.poll()
+            except (OSError, ValueError) as e:
+                print(f"feedback tail failed: {e!r}", file=sys.stderr)
+            time.sleep(self.interval)
+
+def rebuild(log_file: str = LOG_FILE, state_file: str = STATE_FILE) -> FeedbackTailer:
+    """Fresh index from every log file, oldest first, in one streaming pass; saved with the
+    live file's end as the resume point."""
+    tail = FeedbackTailer(FeedbackIndex.from_env(), log_file, state_file)
+    for path in log_files(log_file):
+        if path == log_file:
+            tail.fid = _file_id(path)
+            tail.offset = tail._read(path, 0)
+        else:
+            for ev in parse_events(read_lines(path)):
+                tail.index.observe(ev)
+    tail.save()
+    return tail
+
+def main():
+    ap = argparse.ArgumentParser(description="Feedback re-rank index over chat_logs.jsonl")
+    ap.add_argument("--log", default=LOG_FILE)
+    ap.add_argument("--state", default=STATE_FILE)
+    ap.add_argument("--rebuild", action="store_true", help="rebuild from the full log instead of reading the snapshot")
+    ap.add_argument("--top", type=int, default=10, help="list the N entries with the lowest useful ratio")
+    args = ap.parse_args()
+
+    if args.rebuild:
+        index = rebuild(args.log, args.state).index
+    else:
+        index = FeedbackIndex.from_env()
+        FeedbackTailer(index, args.log, args.state).load()
+    worst = sorted(index.entries.items(), key=lambda kv: index._mean(kv[1]))[:args.top]
+    print(json.dumps({"stats": index.stats(),
+                      "worst": [{"kb": kb, "useful": u, "not_useful": n, "smoothed": round(index._mean([u, n]), 3)}
+                                for kb, (u, n) in worst]}, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
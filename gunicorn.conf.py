@@ -0,0 +1,45 @@
+# gunicorn.conf.py
+# Multi-worker mode: the app is imported once in the master with preload_app, and
+# workers share its pages copy-on-write. The model itself follows MODEL_WARMUP:
+# with eager it loads in the master before the fork and is shared too; otherwise
+# each worker loads it after the fork (background thread or first request), so
+# preload doesn't undo a lazy start. KB embeddings are an mmap of
+# data/cache/*.npy (see embeddings_store.KBEmbeddingCache), so they stay shared
+# page cache either way.
+#
+#   WEB_CONCURRENCY=4 gunicorn app:app -c gunicorn.conf.py
+import gc, os, sys
+
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+threads = int(os.getenv("GUNICORN_THREADS", "2"))
+if os.getenv("ADMISSION", "1") == "1":
+    # admission.py runs ADMIT_MAX_INFLIGHT (default: GUNICORN_THREADS) replies at once and
+    # queues ADMIT_QUEUE more; the extra threads only wait there, or serve /metrics and /api/ready
+    threads = (int(os.getenv("ADMIT_MAX_INFLIGHT", str(threads))) + int(os.getenv("ADMIT_QUEUE", "16")) + 2)
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+bind = os.getenv("GUNICORN_BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}")
+if preload_app and os.getenv("MODEL_WARMUP", "background") == "background":
+    # a warm-up thread started in the master could be mid-load (holding the store's lock)
+    # when a worker forks; app.py leaves it to post_fork to start one in each worker
+    os.environ["MODEL_WARMUP_THREAD"] = "post_fork"
+
+def when_ready(server):
+    # Move everything the import created into the permanent generation so the
+    # cyclic GC in each worker doesn't write to (and un-share) those pages.
+    if preload_app:
+        gc.collect()
+        gc.freeze()
+
+def post_fork(server, worker):
+    # Torch's intra-op pool isn't fork-safe and N workers x all cores oversubscribes
+    # the CPU; give each worker its own small pool. Without preload torch may not be
+    # imported yet (the model loads lazily), so leave the limit for it to pick up.
+    n = os.getenv("TORCH_THREADS_PER_WORKER", "1")
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(int(n))
+    else:
+        os.environ["OMP_NUM_THREADS"] = n
+    if os.environ.get("MODEL_WARMUP_THREAD") == "post_fork":
+        import app  # already imported by the master (preload)
+        app.start_warm_up_thread()
@@ -0,0 +1,284 @@
+# ingest.py
+# Turns long-form articles into KB chunks that EmbStore serves like hand-written entries.
+#
+#   python ingest.py articles/ more.jsonl --out data/articles.jsonl --jobs 8
+#   KB_PATH=data/kb.jsonl:data/articles.jsonl gunicorn app:app -c gunicorn.conf.py
+#
+# Input: .txt / .md files (one document each; title = first "# " heading or the
+# file name) and .jsonl files with one {"id"?, "title", "text", "url"?} per line.
+# Directories are walked recursively in name order.
+#
+# Everything streams: documents are chunked as they are read, chunks are
+# encoded in batches by a process pool with a bounded number of batches in
+# flight, and kept embeddings go straight to disk. Memory grows only with
+# the per-chunk dedup keys, not with the documents or embeddings.
+#
+# Output: a KB JSONL ({"id", "q", "a", "source", "url"} per chunk; "q" is what
+# gets embedded) plus its embeddings written into the EmbStore cache
+# (data/cache/kb-<model>/), so loading the KB does not re-encode anything.
+import argparse, hashlib, json, os, re, sys, time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Tuple
+import numpy as np
+
+from embeddings_store import CACHE_DIR, DEFAULT_MODEL, KBEmbeddingCache, _text_hash
+
+DOC_SUFFIXES = (".txt", ".md", ".jsonl")
+_SENTENCE = re.compile(r"(?<=[.!?])\s+|\n{2,}")
+_HEADING = re.compile(r"^#\s+(.+)$", re.M)
+
+# -------------------- Reading & chunking --------------------
+def iter_paths(paths: List[str]) -> Iterator[str]:
+    for p in paths:
+        if os.path.isdir(p):
+            for root, dirs, files in os.walk(p):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.endswith(DOC_SUFFIXES):
+                        yield os.path.join(root, name)
+        else:
+            yield p
+
+def iter_documents(paths: List[str]) -> Iterator[dict]:
+    """{"id", "title", "text", "url"} per document, one file/line at a time."""
+    for path in iter_paths(paths):
+        if path.endswith(".jsonl"):
+            with open(path, encoding="utf-8") as f:
+                for n, line in enumerate(f):
+                    try:
+                        doc = json.loads(line)
+                    except ValueError:
+                        continue
+                    text = isinstance(doc, dict) and (doc.get("text") or doc.get("body") or doc.get("content"))
+                    if not text:
+                        continue
+                    yield {"id": str(doc.get("id") or f"{path}:{n}"), "title": doc.get("title") or "",
+                           "text": text, "url": doc.get("url")}
+        else:
+            with open(path, encoding="utf-8") as f:
+                text = f.read()
+            m = _HEADING.search(text)
+            if m:
+                title, text = m.group(1).strip(), text[:m.start()] + text[m.end():]
+            else:
+                title = os.path.splitext(os.path.basename(path))[0].replace("_", " ")
+            yield {"id": path, "title": title, "text": text, "url": None}
+
+def split_chunks(text: str, chunk_words: int = 120, overlap_words: int = 30) -> List[str]:
+    """Sentence-packed windows of ~chunk_words words; each window repeats the last
+    ~overlap_words words of sentences from the previous one."""
+    sents = []
+    for s in _SENTENCE.split(text):
+        words = s.split()
+        # a "sentence" longer than a chunk (lists, tables) is cut on word boundaries
+        for i in range(0, len(words), chunk_words):
+            sents.append(words[i:i + chunk_words])
+    chunks, cur = [], []
+    for words in sents:
+        if cur and sum(map(len, cur)) + len(words) > chunk_words:
+            chunks.append(" ".join(w for s in cur for w in s))
+            keep = []
+            while cur and sum(map(len, keep)) < overlap_words:
+                keep.insert(0, cur.pop())
+            cur = keep if sum(map(len, keep)) + len(words) <= chunk_words else []
+        cur.append(words)
+    if cur:
+        chunks.append(" ".join(w for s in cur for w in s))
+    return chunks
+
+def iter_chunks(docs: Iterator[dict], chunk_words: int, overlap_words: int) -> Iterator[dict]:
+    for doc in docs:
+        doc_id = hashlib.sha1(doc["id"].encode("utf-8")).hexdigest()[:12]
+        for n, chunk in enumerate(split_chunks(doc["text"], chunk_words, overlap_words)):
+            q = f"{doc['title']}: {chunk}" if doc["title"] else chunk
+            yield {"id": f"{doc_id}#{n}", "q": q, "a": chunk, "source": doc["title"] or doc["id"],
+                   "url": doc["url"]}
+
+def _norm_key(text: str) -> bytes:
+    return hashlib.blake2b(" ".join(text.lower().split()).encode("utf-8"), digest_size=8).digest()
+
+def batches(chunks: Iterator[dict], size: int) -> Iterator[List[dict]]:
+    batch = []
+    for c in chunks:
+        batch.append(c)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# -------------------- Encoding (process pool) --------------------
+_model = None
+
+def _init_worker(model_name: str):
+    global _model
+    try:
+        import torch
+        torch.set_num_threads(1)  # one core per process; the pool provides the parallelism
+    except ImportError:
+        pass
+    from sentence_transformers import SentenceTransformer
+    _model = SentenceTransformer(model_name)
+
+def _encode(texts: List[str]) -> np.ndarray:
+    return np.asarray(_model.encode(texts, normalize_embeddings=True), dtype=np.float32)
+
+def encoded_batches(batch_iter: Iterator[List[dict]], model_name: str, jobs: int) -> Iterator[Tuple[List[dict], np.ndarray]]:
+    """(batch, embeddings) in input order; at most 2*jobs batches are in flight."""
+    if jobs <= 1:
+        _init_worker(model_name)
+        for b in batch_iter:
+            yield b, _encode([c["q"] for c in b])
+        return
+    with ProcessPoolExecutor(jobs, initializer=_init_worker, initargs=(model_name,)) as pool:
+        pending = []
+        for b in batch_iter:
+            pending.append((b, pool.submit(_encode, [c["q"] for c in b])))
+            if len(pending) >= 2 * jobs:
+                b0, fut = pending.pop(0)
+                yield b0, fut.result()
+        for b0, fut in pending:
+            yield b0, fut.result()
+
+# -------------------- Near-duplicate filter --------------------
+class NearDupFilter:
+    """Drops chunks whose embedding has cosine >= threshold with one already kept.
+
+    Candidates come from random-hyperplane LSH (bands x bits sign patterns), so
+    each chunk is compared with a handful of earlier ones rather than all of them;
+    the kept vectors are read back from the embeddings file on disk.
+    """
+
+    def __init__(self, dim: int, threshold: float, raw_fd: int, bands: int = 8, bits: int = 12,
+                 max_per_bucket: int = 32, seed: int = 0):
+        self.threshold = threshold
+        self.dim = dim
+        self.fd = raw_fd
+        self.bits = bits
+        self.max_per_bucket = max_per_bucket
+        self.planes = np.random.default_rng(seed).standard_normal((bands * bits, dim)).astype(np.float32)
+        self.weights = 1 << np.arange(bits, dtype=np.int64)
+        self.buckets: Dict[Tuple[int, int], List[int]] = {}
+
+    def keys(self, embs: np.ndarray) -> np.ndarray:
+        signs = (embs @ self.planes.T > 0).reshape(len(embs), -1, self.bits)
+        return signs.astype(np.int64) @ self.weights  # (n, bands)
+
+    def _row(self, i: int) -> np.ndarray:
+        size = self.dim * 4
+        return np.frombuffer(os.pread(self.fd, size, i * size), dtype=np.float32)
+
+    def is_dup(self, emb: np.ndarray, keys: np.ndarray) -> bool:
+        seen = set()
+        for band, key in enumerate(keys):
+            for j in self.buckets.get((band, int(key)), ()):
+                if j not in seen:
+                    seen.add(j)
+                    if float(self._row(j) @ emb) >= self.threshold:
+                        return True
+        return False
+
+    def add(self, i: int, keys: np.ndarray):
+        for band, key in enumerate(keys):
+            ids = self.buckets.setdefault((band, int(key)), [])
+            ids.append(i)
+            if len(ids) > self.max_per_bucket:
+                del ids[0]
+
+# -------------------- Pipeline --------------------
+def ingest(paths: List[str], out: str, model_name: str = DEFAULT_MODEL, jobs: int = 1,
+           chunk_words: int = 120, overlap_words: int = 30, dedup_sim: float = 0.95,
+           batch_size: int = 256, cache_dir: str = CACHE_DIR) -> dict:
+    cache = KBEmbeddingCache(model_name, cache_dir)
+    os.makedirs(cache.dir, exist_ok=True)
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    tag = f"ingest-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+    raw_path = os.path.join(cache.dir, tag + ".f32.tmp")
+    hashes_path = os.path.join(cache.dir, tag + ".hashes.tmp")
+    out_tmp = f"{out}.{os.getpid()}.tmp"
+    stats = {"documents": 0, "chunks": 0, "exact_dups": 0, "near_dups": 0, "kept": 0}
+
+    def counted_docs():
+        for d in iter_documents(paths):
+            stats["documents"] += 1
+            yield d
+
+    seen_exact = set()
+
+    def unique_chunks():
+        for c in iter_chunks(counted_docs(), chunk_words, overlap_words):
+            stats["chunks"] += 1
+            key = _norm_key(c["a"])
+            if key in seen_exact:
+                stats["exact_dups"] += 1
+                continue
+            seen_exact.add(key)
+            yield c
+
+    t0 = time.perf_counter()
+    dim = None
+    near = None
+    with open(raw_path, "wb+") as raw, open(hashes_path, "w") as hashes, \
+            open(out_tmp, "w", encoding="utf-8") as kb_out:
+        for batch, embs in encoded_batches(batches(unique_chunks(), batch_size), model_name, jobs):
+            if dim is None:
+                dim = embs.shape[1]
+                if dedup_sim > 0:
+                    near = NearDupFilter(dim, dedup_sim, raw.fileno())
+            keys = near.keys(embs) if near else None
+            for r, (chunk, emb) in enumerate(zip(batch, embs)):
+                if near is not None:
+                    if near.is_dup(emb, keys[r]):
+                        stats["near_dups"] += 1
+                        continue
+                    near.add(stats["kept"], keys[r])
+                raw.write(emb.astype(np.float32).tobytes())
+                raw.flush()  # near-dup checks of later chunks read this row back
+                hashes.write(_text_hash(chunk["q"]) + "\n")
+                kb_out.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+                stats["kept"] += 1
+
+    try:
+        if stats["kept"]:
+            # raw rows -> <tag>.npy + <tag>.json manifest, the format KBEmbeddingCache reuses rows from
+            n = stats["kept"]
+            src = np.memmap(raw_path, dtype=np.float32, mode="r", shape=(n, dim))
+            npy_tmp = os.path.join(cache.dir, tag + ".npy.tmp")
+            dst = np.lib.format.open_memmap(npy_tmp, mode="w+", dtype=np.float32, shape=(n, dim))
+            for s in range(0, n, 65_536):
+                dst[s:s + 65_536] = src[s:s + 65_536]
+            dst.flush()
+            del src, dst
+            os.replace(npy_tmp, os.path.join(cache.dir, tag + ".npy"))
+            with open(hashes_path) as f, open(os.path.join(cache.dir, tag + ".json.tmp"), "w") as man:
+                man.write("[")
+                for i, line in enumerate(f):
+                    man.write(("," if i else "") + json.dumps(line.strip()))
+                man.write("]")
+            os.replace(os.path.join(cache.dir, tag + ".json.tmp"), os.path.join(cache.dir, tag + ".json"))
+        # KB file last: a watcher that sees it finds the embeddings already cached
+        os.replace(out_tmp, out)
+    finally:
+        for p in (raw_path, hashes_path, out_tmp):
+            if os.path.exists(p):
+                os.remove(p)
+    stats["seconds"] = round(time.perf_counter() - t0, 2)
+    return stats
+
+def main():
+    ap = argparse.ArgumentParser(description="Chunk long-form articles into a KB file EmbStore can load")
+    ap.add_argument("paths", nargs="+", help=".txt/.md/.jsonl files or directories")
+    ap.add_argument("--out", default=os.path.join("data", "articles.jsonl"))
+    ap.add_argument("--model", default=DEFAULT_MODEL)
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="encoder processes")
+    ap.add_argument("--chunk-words", type=int, default=120)
+    ap.add_argument("--overlap-words", type=int, default=30)
+    ap.add_argument("--dedup-sim", type=float, default=0.95, help="cosine at which chunks count as duplicates (0 = exact only)")
+    ap.add_argument("--batch-size", type=int, default=256)
+    args = ap.parse_args()
+    stats = ingest(args.paths, args.out, args.model, args.jobs, args.chunk_words, args.overlap_words,
+                   args.dedup_sim, args.batch_size)
+    print(json.dumps(stats, indent=2), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# knowledge_base.py
+# The KB lives outside the code: one file or a directory of files (several joined
+# with os.pathsep, e.g. KB_PATH=data/kb.jsonl:data/articles.jsonl), each entry
+#   {"id": "protein-needs", "q": "<keywords / question>", "a": "<answer>"}
+# as JSON lines (*.jsonl), a JSON list (*.json) or a YAML list (*.yaml/*.yml,
+# needs PyYAML). "id" is optional; "source" / "url" (set by ingest.py for article
+# chunks) are cited in replies. Files in a directory are read in name order.
+#
+# KBWatcher polls the files' mtimes/sizes and hands a changed KB to
+# EmbStore.reload, which re-encodes only new or edited entries and swaps the
+# result in atomically.
+import json, os, sys, threading, time
+from typing import Dict, List, Tuple
+
+KB_PATH = os.getenv("KB_PATH", os.path.join("data", "kb.jsonl"))
+KB_SUFFIXES = (".jsonl", ".json", ".yaml", ".yml")
+
+def kb_files(path: str = KB_PATH) -> List[str]:
+    files = []
+    for p in path.split(os.pathsep):
+        if os.path.isdir(p):
+            files += sorted(os.path.join(p, n) for n in os.listdir(p)
+                            if n.endswith(KB_SUFFIXES) and not n.startswith("."))
+        elif os.path.exists(p):
+            files.append(p)
+    return files
+
+def _read_file(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            items = []
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    items.append(json.loads(line))
+                except ValueError:
+                    continue  # one bad line shouldn't take the rest of the file down
+            return items
+        if path.endswith((".yaml", ".yml")):
+            import yaml  # optional; only needed for YAML KB files
+            return yaml.safe_load(f) or []
+        return json.load(f)
+
+def load_kb(path: str = KB_PATH) -> List[Dict[str, str]]:
+    """Entries with a non-empty "q" and "a", in file order. Later duplicates of an id are dropped."""
+    items, seen = [], set()
+    for p in kb_files(path):
+        for it in _read_file(p):
+            if not isinstance(it, dict) or not it.get("q") or not it.get("a"):
+                continue
+            key = it.get("id")
+            if key is not None:
+                if key in seen:
+                    continue
+                seen.add(key)
+            items.append(it)
+    return items
+
+def fingerprint(path: str = KB_PATH) -> Tuple:
+    out = []
+    for p in kb_files(path):
+        try:
+            st = os.stat(p)
+        except OSError:
+            continue
+        out.append((p, st.st_mtime_ns, st.st_size))
+    return tuple(out)
+
+class KBWatcher:
+    """Polls the KB path every `interval` seconds and reloads `store` on change.
+
+    start() is safe to call on every request: it only starts a thread once per
+    process, so after a gunicorn fork each worker gets its own watcher.
+    """
+
+    def __init__(self, store, path: str = KB_PATH, interval: float = 2.0):
+        self.store = store
+        self.path = path
+        self.interval = interval
+        self.reloads = 0
+        self.last_error = None
+        self._seen = fingerprint(path)
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, store, path: str = KB_PATH) -> "KBWatcher":
+        return cls(store, path, interval=float(os.getenv("KB_WATCH_S", "2")))
+
+    def start(self):
+        if self._pid == os.getpid() or self.interval <= 0:
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                threading.Thread(target=self._run, name="kb-watcher", daemon=True).start()
+
+    def check(self) -> bool:
+        """Reload if the files changed since the last look. Returns True when it reloaded."""
+        fp = fingerprint(self.path)
+        if fp == self._seen:
+            return False
+        try:
+            self.store.reload(load_kb(self.path))
+        except Exception as e:
+            # keep serving the previous snapshot; retried when the files change again
+            self.last_error = repr(e)
+            print(f"kb reload failed: {e!r}", file=sys.stderr)
+        else:
+            self.reloads += 1
+            self.last_error = None
+        self._seen = fp
+        return self.last_error is None
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.check()
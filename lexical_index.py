@@ -0,0 +1,108 @@
+# lexical_index.py
+# BM25 inverted index over KB "q" and "a" fields, plus the confidence test that
+# lets EmbStore answer clear keyword questions ("creatine", "protein per day")
+# without running the encoder.
+import math, os, re
+from array import array
+from collections import Counter
+from typing import Dict, List, Tuple
+import numpy as np
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    "a", "an", "and", "are", "at", "be", "can", "do", "does", "for", "how", "i", "in", "is", "it",
+    "me", "my", "of", "on", "or", "should", "the", "to", "what", "when", "which", "with", "you",
+}
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+class BM25Index:
+    """Postings are CSR numpy arrays: term id j owns docs[indptr[j]:indptr[j+1]] and the
+    matching tfs. A 20k-chunk KB is a few MB instead of millions of tuples, and
+    save()/load() round-trip it through one .npz so workers don't re-tokenize the KB."""
+
+    def __init__(self, kb_items: List[Dict[str, str]], k1: float = 1.5, b: float = 0.75, q_weight: int = 2):
+        vocab: Dict[str, int] = {}
+        docs, terms, tfs, doc_len = array("i"), array("i"), array("i"), array("i")
+        for i, it in enumerate(kb_items):
+            # the short "q" field is a hand-written keyword list, so it counts q_weight times
+            tf = Counter(tokenize(it["q"]) * q_weight + tokenize(it.get("a", "")))
+            doc_len.append(sum(tf.values()))
+            for term, n in tf.items():
+                docs.append(i)
+                terms.append(vocab.setdefault(term, len(vocab)))
+                tfs.append(n)
+        terms = np.frombuffer(terms, dtype=np.int32)
+        order = np.argsort(terms, kind="stable")  # group by term; docs stay ascending within a term
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(vocab)), out=indptr[1:])
+        self._finish(k1, b, list(vocab), indptr, np.frombuffer(docs, dtype=np.int32)[order],
+                     np.frombuffer(tfs, dtype=np.int32)[order], np.frombuffer(doc_len, dtype=np.int32))
+
+    def _finish(self, k1: float, b: float, terms: List[str], indptr: np.ndarray, docs: np.ndarray,
+                tfs: np.ndarray, doc_len: np.ndarray):
+        self.k1, self.b = k1, b
+        self.vocab = {t: j for j, t in enumerate(terms)}
+        self.indptr, self.docs, self.tfs, self.doc_len = indptr, docs, tfs, doc_len
+        self.n = len(doc_len)
+        self.avg_len = float(doc_len.sum()) / self.n if self.n else 0.0
+        df = np.diff(indptr)
+        self.idf = np.log(1 + (self.n - df + 0.5) / (df + 0.5))
+        # per-doc length normalization, the part of the BM25 denominator that doesn't depend on the term
+        self.norm = self.k1 * (1 - self.b + self.b * doc_len / self.avg_len) if self.n else np.zeros(0)
+
+    def save(self, path: str):
+        # temp file + rename so a concurrent worker never loads a half-written index
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, params=np.array([self.k1, self.b]), terms=np.array(list(self.vocab), dtype=str),
+                     indptr=self.indptr, docs=self.docs, tfs=self.tfs, doc_len=self.doc_len)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with np.load(path) as z:
+            index = cls.__new__(cls)
+            k1, b = z["params"].tolist()
+            index._finish(k1, b, z["terms"].tolist(), z["indptr"], z["docs"], z["tfs"], z["doc_len"])
+        return index
+
+    def search(self, query: str, k: int = 10) -> Tuple[List[Tuple[int, float]], float]:
+        """Return ([(doc, bm25)], coverage) where coverage is the share of the
+        query's IDF mass that the best doc contains (0..1)."""
+        terms = set(tokenize(query))
+        if not terms or not self.n:
+            return [], 0.0
+        docs, scores, matched = [], [], []
+        total_idf = 0.0
+        for t in terms:
+            j = self.vocab.get(t)
+            if j is None:
+                total_idf += math.log(1 + (self.n + 0.5) / 0.5)  # unseen term: max IDF
+                continue
+            idf = float(self.idf[j])
+            total_idf += idf
+            lo, hi = self.indptr[j], self.indptr[j + 1]
+            d, tf = self.docs[lo:hi], self.tfs[lo:hi]
+            docs.append(d)
+            scores.append(idf * tf * (self.k1 + 1) / (tf + self.norm[d]))
+            matched.append(np.full(d.size, idf))
+        if not docs:
+            return [], 0.0
+        uniq, inv = np.unique(np.concatenate(docs), return_inverse=True)
+        score = np.bincount(inv, weights=np.concatenate(scores))
+        top = np.argsort(-score, kind="stable")[:k]
+        ranked = [(int(uniq[i]), float(score[i])) for i in top]
+        coverage = float(np.bincount(inv, weights=np.concatenate(matched))[top[0]]) / total_idf
+        return ranked, coverage
+
+    @staticmethod
+    def confident(ranked: List[Tuple[int, float]], coverage: float,
+                  min_coverage: float = 0.8, min_margin: float = 1.5) -> bool:
+        # every meaningful query term is in the top doc, and it clearly beats the runner-up
+        if not ranked or coverage < min_coverage:
+            return False
+        if len(ranked) == 1:
+            return True
+        return ranked[0][1] >= min_margin * ranked[1][1]
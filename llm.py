@@ -1,6 +1,8 @@
 # llm.py
-import os, json, requests
-from typing import Optional
+import asyncio, os, json, random, threading, time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Generator, Optional, Tuple
+import httpx
 
 # Env flags:
 # USE_LLM=1 enables the LLM step
@@ -8,33 +10,423 @@ from typing import Optional
 #     USE_OLLAMA=1 and OLLAMA_MODEL=llama3 (and OLLAMA_HOST=http://localhost:11434 optional)
 #   OR:
 #     OPENAI_API_KEY=<key> and OPENAI_MODEL=gpt-4o-mini (or similar)
+#     (OPENAI_BASE_URL=http://127.0.0.1:8089/v1 points it at bench/fake_llm.py)
+#
+# Client tuning (all optional):
+#   LLM_DEADLINE_S=15        whole-call budget incl. retries; after it we answer from retrieval
+#   LLM_CONNECT_TIMEOUT_S=2  TCP/TLS connect timeout per attempt
+#   LLM_RETRIES=2            extra attempts on timeouts / 429 / 5xx, with full-jitter backoff
+#   LLM_BACKOFF_S=0.2        base backoff (attempt n sleeps uniform(0, base * 2**n))
+#   LLM_HEDGE_MS=0           >0: fire a second identical request if the first is this slow
+#   LLM_POOL_SIZE=8          keep-alive connections per backend
+#   LLM_BREAKER_FAILURES=5   consecutive failures that open the circuit
+#   LLM_BREAKER_RESET_S=30   how long an open circuit skips the backend before one probe
 
+RETRY_STATUS = {408, 425, 429, 500, 502, 503, 504}
+_DONE = object()  # parse_line: end-of-stream marker
 
+class LLMError(Exception):
+    def __init__(self, msg: str, retryable: bool = True):
+        super().__init__(msg)
+        self.retryable = retryable
 
-def _openai_generate(prompt: str) -> Optional[str]:
-    # Minimal dependency; requires `openai` package and env OPENAI_API_KEY
-    try:
-        import openai
-        api_key = os.getenv("OPENAI_API_KEY")
-        model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-        if not api_key:
+class CircuitBreaker:
+    """closed -> (N consecutive failures) -> open -> (reset_s) -> half-open: one probe call."""
+
+    def __init__(self, failures: int = 5, reset_s: float = 30.0):
+        self.max_failures = failures
+        self.reset_s = reset_s
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_s else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            st = self.state
+            if st == "closed":
+                return True
+            if st == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record(self, ok: bool):
+        with self._lock:
+            self._probing = False
+            if ok:
+                self.failures, self.opened_at = 0, None
+                return
+            self.failures += 1
+            if self.failures >= self.max_failures or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+    def abandon(self):
+        # the call was cut off on our side (client gone, request cancelled): free a
+        # half-open probe without counting it either way
+        with self._lock:
+            self._probing = False
+
+class _Backend:
+    # request/response shapes for one provider
+    name = ""
+
+    def url(self) -> str: ...
+    def headers(self) -> dict: return {}
+    def payload(self, prompt: str, stream: bool) -> dict: ...
+    def parse(self, body: dict) -> str: ...
+    def parse_line(self, line: str): ...  # token text, None to skip, or _DONE
+
+class _OpenAIBackend(_Backend):
+    name = "openai"
+
+    def url(self):
+        return os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/") + "/chat/completions"
+
+    def headers(self):
+        return {"Authorization": f"Bearer {os.getenv('OPENAI_API_KEY', '')}"}
+
+    def payload(self, prompt, stream):
+        return {"model": os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
+                "messages": [{"role": "user", "content": prompt}],
+                "temperature": 0.2, "max_tokens": 400, "stream": stream}
+
+    def parse(self, body):
+        return body["choices"][0]["message"]["content"]
+
+    def parse_line(self, line):
+        # SSE: "data: {...chunk...}" ... "data: [DONE]"
+        if not line.startswith("data:"):
             return None
-        openai.api_key = api_key
-        # Chat Completions
-        resp = openai.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.2,
-            max_tokens=400
-        )
-        return resp.choices[0].message.content.strip()
-    except Exception:
-        return None
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return _DONE
+        choices = json.loads(data).get("choices") or [{}]
+        return choices[0].get("delta", {}).get("content")
 
-def generate_answer(prompt: str) -> Optional[str]:
-   
-    # Try OpenAI next
+class _OllamaBackend(_Backend):
+    name = "ollama"
+
+    def url(self):
+        return os.getenv("OLLAMA_HOST", "http://localhost:11434").rstrip("/") + "/api/generate"
+
+    def payload(self, prompt, stream):
+        return {"model": os.getenv("OLLAMA_MODEL", "llama3"), "prompt": prompt, "stream": stream,
+                "options": {"temperature": 0.2, "num_predict": 400}}
+
+    def parse(self, body):
+        return body.get("response", "")
+
+    def parse_line(self, line):
+        # NDJSON: {"response": "<token>", "done": false}
+        msg = json.loads(line)
+        if msg.get("done") and not msg.get("response"):
+            return _DONE
+        return msg.get("response")
+
+class LLMClient:
+    """Long-lived client: pooled keep-alive connections, per-call deadline,
+    retry with jitter, optional hedging and a circuit breaker per backend."""
+
+    def __init__(self, deadline_s: float = 15.0, connect_timeout_s: float = 2.0, retries: int = 2,
+                 backoff_s: float = 0.2, hedge_ms: float = 0.0, pool_size: int = 8,
+                 breaker_failures: int = 5, breaker_reset_s: float = 30.0):
+        self.deadline_s = deadline_s
+        self.connect_timeout_s = connect_timeout_s
+        self.retries = retries
+        self.backoff_s = backoff_s
+        self.hedge_s = hedge_ms / 1000.0
+        self.http = httpx.Client(limits=httpx.Limits(max_connections=pool_size * 2,
+                                                     max_keepalive_connections=pool_size))
+        self.backends = {"openai": _OpenAIBackend(), "ollama": _OllamaBackend()}
+        self.breakers = {name: CircuitBreaker(breaker_failures, breaker_reset_s) for name in self.backends}
+        self._hedge_pool = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="llm-hedge") if hedge_ms else None
+        self.pool_size = pool_size
+        self._ahttp = None  # httpx.AsyncClient, created on first async call (needs a running loop)
+        self.pid = os.getpid()
+        self.calls = self.failures = self.retried = self.hedged = self.short_circuited = 0
+
+    @classmethod
+    def from_env(cls) -> "LLMClient":
+        return cls(deadline_s=float(os.getenv("LLM_DEADLINE_S", "15")),
+                   connect_timeout_s=float(os.getenv("LLM_CONNECT_TIMEOUT_S", "2")),
+                   retries=int(os.getenv("LLM_RETRIES", "2")),
+                   backoff_s=float(os.getenv("LLM_BACKOFF_S", "0.2")),
+                   hedge_ms=float(os.getenv("LLM_HEDGE_MS", "0")),
+                   pool_size=int(os.getenv("LLM_POOL_SIZE", "8")),
+                   breaker_failures=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+                   breaker_reset_s=float(os.getenv("LLM_BREAKER_RESET_S", "30")))
+
+    def _timeout(self, remaining: float) -> httpx.Timeout:
+        return httpx.Timeout(remaining, connect=min(self.connect_timeout_s, remaining))
+
+    def _attempt(self, be: _Backend, prompt: str, deadline: float) -> str:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise LLMError("deadline exceeded")
+        try:
+            resp = self.http.post(be.url(), headers=be.headers(), json=be.payload(prompt, False),
+                                  timeout=self._timeout(remaining))
+        except httpx.TimeoutException as e:
+            raise LLMError(f"timeout: {e}")
+        except httpx.TransportError as e:
+            raise LLMError(f"transport: {e}")
+        if resp.status_code != 200:
+            raise LLMError(f"HTTP {resp.status_code}", retryable=resp.status_code in RETRY_STATUS)
+        try:
+            text = (be.parse(resp.json()) or "").strip()
+        except (ValueError, KeyError, IndexError, TypeError):
+            raise LLMError("bad response body", retryable=False)
+        if not text:
+            raise LLMError("empty completion", retryable=False)
+        return text
+
+    def _hedged_attempt(self, be: _Backend, prompt: str, deadline: float) -> str:
+        if self._hedge_pool is None:
+            return self._attempt(be, prompt, deadline)
+        first = self._hedge_pool.submit(self._attempt, be, prompt, deadline)
+        done, _ = wait([first], timeout=self.hedge_s)
+        if done:
+            return first.result()
+        self.hedged += 1
+        pending = {first, self._hedge_pool.submit(self._attempt, be, prompt, deadline)}
+        err = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for fut in done:
+                try:
+                    return fut.result()
+                except LLMError as e:
+                    err = e
+        raise err or LLMError("deadline exceeded")
+
+    def complete(self, backend: str, prompt: str) -> Optional[str]:
+        be, breaker = self.backends[backend], self.breakers[backend]
+        if not breaker.allow():
+            self.short_circuited += 1
+            return None
+        self.calls += 1
+        deadline = time.monotonic() + self.deadline_s
+        recorded = False
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    text = self._hedged_attempt(be, prompt, deadline)
+                    recorded = True
+                    breaker.record(True)
+                    return text
+                except LLMError as e:
+                    if not e.retryable or attempt == self.retries:
+                        break
+                    pause = random.uniform(0, self.backoff_s * 2 ** attempt)
+                    if time.monotonic() + pause >= deadline:
+                        break
+                    self.retried += 1
+                    time.sleep(pause)
+            self.failures += 1
+            recorded = True
+            breaker.record(False)
+            return None
+        finally:
+            if not recorded:
+                breaker.abandon()
+
+    def stream(self, backend: str, prompt: str) -> Generator[str, None, Tuple[bool, bool]]:
+        # Retries only happen before the first token; once text is flowing a failure just ends the stream.
+        # Returns (any token yielded, end-of-stream seen): a stream cut at the deadline or by a
+        # transport / parse error after some tokens is (True, False) and counts as a failure.
+        be, breaker = self.backends[backend], self.breakers[backend]
+        if not breaker.allow():
+            self.short_circuited += 1
+            return False, False
+        self.calls += 1
+        deadline = time.monotonic() + self.deadline_s
+        recorded = False
+        try:
+            for attempt in range(self.retries + 1):
+                got = complete = False
+                retryable = True
+                try:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    with self.http.stream("POST", be.url(), headers=be.headers(), json=be.payload(prompt, True),
+                                          timeout=self._timeout(remaining)) as resp:
+                        if resp.status_code != 200:
+                            retryable = resp.status_code in RETRY_STATUS
+                            raise LLMError(f"HTTP {resp.status_code}", retryable)
+                        for line in resp.iter_lines():
+                            if time.monotonic() > deadline:
+                                break
+                            if not line:
+                                continue
+                            tok = be.parse_line(line)
+                            if tok is _DONE:
+                                complete = True
+                                break
+                            if tok:
+                                got = True
+                                yield tok  # GeneratorExit lands here if the reader goes away
+                except (httpx.HTTPError, LLMError, ValueError):
+                    pass
+                if got:
+                    recorded = True
+                    if not complete:
+                        self.failures += 1
+                    breaker.record(complete)
+                    return True, complete
+                pause = random.uniform(0, self.backoff_s * 2 ** attempt)
+                if not retryable or attempt == self.retries or time.monotonic() + pause >= deadline:
+                    break
+                self.retried += 1
+                time.sleep(pause)
+            self.failures += 1
+            recorded = True
+            breaker.record(False)
+            return False, False
+        finally:
+            if not recorded:
+                breaker.abandon()
+
+    # ---- asyncio variants (used by asgi_app.py): same deadline / retry / hedge / breaker rules ----
+    def _async_http(self) -> httpx.AsyncClient:
+        if self._ahttp is None:
+            self._ahttp = httpx.AsyncClient(limits=httpx.Limits(max_connections=self.pool_size * 8,
+                                                                max_keepalive_connections=self.pool_size * 4))
+        return self._ahttp
+
+    async def _aattempt(self, be: _Backend, prompt: str, deadline: float) -> str:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise LLMError("deadline exceeded")
+        try:
+            resp = await asyncio.wait_for(
+                self._async_http().post(be.url(), headers=be.headers(), json=be.payload(prompt, False),
+                                        timeout=self._timeout(remaining)),
+                remaining)
+        except (httpx.TimeoutException, asyncio.TimeoutError) as e:
+            raise LLMError(f"timeout: {e}")
+        except httpx.TransportError as e:
+            raise LLMError(f"transport: {e}")
+        if resp.status_code != 200:
+            raise LLMError(f"HTTP {resp.status_code}", retryable=resp.status_code in RETRY_STATUS)
+        try:
+            text = (be.parse(resp.json()) or "").strip()
+        except (ValueError, KeyError, IndexError, TypeError):
+            raise LLMError("bad response body", retryable=False)
+        if not text:
+            raise LLMError("empty completion", retryable=False)
+        return text
+
+    async def _ahedged_attempt(self, be: _Backend, prompt: str, deadline: float) -> str:
+        first = asyncio.ensure_future(self._aattempt(be, prompt, deadline))
+        if not self.hedge_s:
+            return await first
+        done, _ = await asyncio.wait({first}, timeout=self.hedge_s)
+        if done:
+            return first.result()
+        self.hedged += 1
+        pending = {first, asyncio.ensure_future(self._aattempt(be, prompt, deadline))}
+        err = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=max(0.0, deadline - time.monotonic()),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for fut in done:
+                    if fut.exception() is None:
+                        return fut.result()
+                    err = fut.exception()
+        finally:
+            for fut in pending:
+                fut.cancel()
+        raise err if isinstance(err, LLMError) else LLMError("deadline exceeded")
+
+    async def acomplete(self, backend: str, prompt: str) -> Optional[str]:
+        be, breaker = self.backends[backend], self.breakers[backend]
+        if not breaker.allow():
+            self.short_circuited += 1
+            return None
+        self.calls += 1
+        deadline = time.monotonic() + self.deadline_s
+        recorded = False
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    text = await self._ahedged_attempt(be, prompt, deadline)
+                    recorded = True
+                    breaker.record(True)
+                    return text
+                except LLMError as e:
+                    if not e.retryable or attempt == self.retries:
+                        break
+                    pause = random.uniform(0, self.backoff_s * 2 ** attempt)
+                    if time.monotonic() + pause >= deadline:
+                        break
+                    self.retried += 1
+                    await asyncio.sleep(pause)
+            self.failures += 1
+            recorded = True
+            breaker.record(False)
+            return None
+        finally:
+            if not recorded:  # CancelledError: the ASGI request went away mid-call
+                breaker.abandon()
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "failures": self.failures, "retried": self.retried, "hedged": self.hedged,
+                "short_circuited": self.short_circuited,
+                "breakers": {name: b.state for name, b in self.breakers.items()}}
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client() -> LLMClient:
+    # one client (and connection pool) per process; re-created after fork
+    global _client
+    if _client is None or _client.pid != os.getpid():
+        with _client_lock:
+            if _client is None or _client.pid != os.getpid():
+                _client = LLMClient.from_env()
+    return _client
+
+def _backend_order() -> list:
+    # Try Ollama first (local), OpenAI next
+    order = []
+    if os.getenv("USE_OLLAMA") == "1":
+        order.append("ollama")
     if os.getenv("OPENAI_API_KEY"):
-        text = _openai_generate(prompt)
+        order.append("openai")
+    return order
+
+def generate_answer(prompt: str) -> Optional[str]:
+    # None means "no LLM text": callers fall back to the retrieval answer
+    for backend in _backend_order():
+        text = get_client().complete(backend, prompt)
         if text: return text
     return None
+
+async def agenerate_answer(prompt: str) -> Optional[str]:
+    # generate_answer without blocking the event loop
+    for backend in _backend_order():
+        text = await get_client().acomplete(backend, prompt)
+        if text: return text
+    return None
+
+def stream_answer(prompt: str) -> Generator[str, None, Tuple[bool, bool]]:
+    # Same backend order as generate_answer; yields nothing if no backend produced a token.
+    # Returns (streamed, complete) of the backend that answered, see LLMClient.stream.
+    for backend in _backend_order():
+        got, complete = yield from get_client().stream(backend, prompt)
+        if got:
+            return True, complete
+    return False, False
@@ -0,0 +1,273 @@
+# log_analytics.py
+# Daily numbers from the chat event log, computed in one streaming pass.
+#
+#   python log_analytics.py                      # all of data/chat_logs.jsonl + rotated / .gz siblings
+#   python log_analytics.py --incremental        # only bytes appended since the last --incremental run
+#   python log_analytics.py --jobs 4 --json      # aggregate shards in 4 processes, print JSON
+#
+# Reads the schema log_event writes: type, q, top_score, via, useful, ts.
+# top_score stats are cosine only: hits from the BM25 fast path (via == "lexical")
+# score lexical coverage instead and are just counted.
+import argparse, glob, gzip, hashlib, json, os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Tuple
+
+try:  # optional, ~3-5x faster line parsing
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+from logger import LOG_FILE
+
+STATE_FILE = os.path.join("data", "analytics_state.json")
+REPLY_TYPES = {"answer", "llm_answer", "fallback_intent", "fallback_generic", "out_of_scope", "chitchat"}
+FALLBACK_TYPES = {"fallback_intent", "fallback_generic"}
+SCORE_BUCKETS = 10  # top_score histogram over [0, 1) in 0.1 steps
+CHUNK_BYTES = 64 * 2**20
+
+# -------------------- Reading --------------------
+def log_files(log_file: str = LOG_FILE) -> List[str]:
+    # rotated files sort chronologically by their UTC stamp; the live file goes last
+    root, ext = os.path.splitext(log_file)
+    rotated = glob.glob(f"{root}-*{ext}") + glob.glob(f"{root}-*{ext}.gz") + glob.glob(f"{log_file}.gz")
+    files = sorted(set(rotated))
+    return files + [log_file] if os.path.exists(log_file) else files
+
+def read_lines(path: str, start: int = 0, end: int = None) -> Iterator[bytes]:
+    """Lines whose first byte lies in [start, end). Offsets are in uncompressed bytes for .gz."""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        if start:
+            f.seek(start - 1)
+            if f.read(1) != b"\n":
+                f.readline()  # start is mid-line: that line belongs to the previous shard
+        pos = f.tell()
+        for line in f:
+            if end is not None and pos >= end:
+                break
+            pos += len(line)
+            if line.endswith(b"\n"):  # a partial last line is picked up by the next run
+                yield line
+
+def parse_events(lines: Iterator[bytes]) -> Iterator[dict]:
+    for line in lines:
+        try:
+            ev = _loads(line)
+        except ValueError:
+            continue
+        if isinstance(ev, dict):
+            yield ev
+
+# -------------------- Aggregation --------------------
+def _norm_q(q) -> str:
+    return " ".join(str(q or "").lower().split())
+
+class DayStats:
+    """Aggregates for one UTC day. Memory grows with distinct questions, not with events."""
+
+    def __init__(self):
+        self.types = Counter()
+        self.score_n = 0
+        self.score_sum = 0.0
+        self.score_hist = [0] * SCORE_BUCKETS
+        self.lexical_n = 0  # answers whose top_score is BM25 coverage, not a cosine
+        self.feedback = {}  # q -> [useful, total]
+        self.unanswered = Counter()
+
+    def add(self, ev: dict):
+        t = ev.get("type")
+        self.types[t] += 1
+        s = ev.get("top_score")
+        if ev.get("via") == "lexical":
+            self.lexical_n += 1
+        elif isinstance(s, (int, float)):
+            self.score_n += 1
+            self.score_sum += s
+            self.score_hist[min(SCORE_BUCKETS - 1, max(0, int(s * SCORE_BUCKETS)))] += 1
+        if t == "feedback":
+            fb = self.feedback.setdefault(_norm_q(ev.get("q")), [0, 0])
+            fb[0] += bool(ev.get("useful"))
+            fb[1] += 1
+        elif t in FALLBACK_TYPES:
+            self.unanswered[_norm_q(ev.get("q"))] += 1
+
+    def merge(self, other: "DayStats"):
+        self.types.update(other.types)
+        self.score_n += other.score_n
+        self.score_sum += other.score_sum
+        self.score_hist = [a + b for a, b in zip(self.score_hist, other.score_hist)]
+        self.lexical_n += other.lexical_n
+        for q, (u, n) in other.feedback.items():
+            fb = self.feedback.setdefault(q, [0, 0])
+            fb[0] += u
+            fb[1] += n
+        self.unanswered.update(other.unanswered)
+
+    def to_dict(self) -> dict:
+        return {"types": dict(self.types), "score_n": self.score_n, "score_sum": self.score_sum,
+                "score_hist": self.score_hist, "lexical_n": self.lexical_n, "feedback": self.feedback, "unanswered": dict(self.unanswered)}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "DayStats":
+        st = cls()
+        st.types = Counter(d["types"])
+        st.score_n, st.score_sum, st.score_hist = d["score_n"], d["score_sum"], list(d["score_hist"])
+        st.lexical_n = d.get("lexical_n", 0)  # state files written before via was logged
+        st.feedback = {q: list(v) for q, v in d["feedback"].items()}
+        st.unanswered = Counter(d["unanswered"])
+        return st
+
+    def report(self, top: int = 10) -> dict:
+        replies = sum(n for t, n in self.types.items() if t in REPLY_TYPES)
+        fallbacks = sum(n for t, n in self.types.items() if t in FALLBACK_TYPES)
+        fb = sorted(self.feedback.items(), key=lambda x: -x[1][1])[:top]
+        return {
+            "events": sum(self.types.values()),
+            "types": dict(self.types.most_common()),
+            "fallback_rate": round(fallbacks / replies, 4) if replies else None,
+            "top_score": {
+                "n": self.score_n,
+                "mean": round(self.score_sum / self.score_n, 4) if self.score_n else None,
+                "hist": {f"{i / SCORE_BUCKETS:.1f}": c for i, c in enumerate(self.score_hist)},
+                "lexical_n": self.lexical_n,
+            },
+            "feedback": [{"q": q, "useful": u, "total": n, "useful_ratio": round(u / n, 3)} for q, (u, n) in fb],
+            "top_unanswered": [{"q": q, "count": n} for q, n in self.unanswered.most_common(top)],
+        }
+
+def aggregate(events: Iterator[dict], days: Dict[str, DayStats] = None) -> Dict[str, DayStats]:
+    days = {} if days is None else days
+    for ev in events:
+        day = str(ev.get("ts", ""))[:10] or "unknown"
+        st = days.get(day)
+        if st is None:
+            st = days[day] = DayStats()
+        st.add(ev)
+    return days
+
+def merge_days(into: Dict[str, DayStats], other: Dict[str, DayStats]) -> Dict[str, DayStats]:
+    for day, st in other.items():
+        if day in into:
+            into[day].merge(st)
+        else:
+            into[day] = st
+    return into
+
+# -------------------- Shards & incremental state --------------------
+def _file_id(path: str) -> str:
+    # files are identified by their first line (it carries a microsecond ts), so
+    # offsets survive rotation renames and gzip copies of a file we already read
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        head = f.readline()
+    if not head.endswith(b"\n"):
+        return None
+    return "head:" + hashlib.sha1(head).hexdigest()
+
+def _size(path: str) -> int:
+    if not path.endswith(".gz"):
+        return os.path.getsize(path)
+    with gzip.open(path, "rb") as f:
+        return f.seek(0, os.SEEK_END)
+
+def plan_shards(paths: List[str], offsets: Dict[str, int], chunk: int = CHUNK_BYTES) -> List[Tuple[str, int, int]]:
+    shards = []
+    for p in paths:
+        fid = _file_id(p)
+        if fid is None:
+            continue
+        start, end = offsets.get(fid, 0), _size(p)
+        if start > end:
+            start = 0  # file was truncated / replaced
+        if p.endswith(".gz"):  # gzip can't seek cheaply, keep it one shard
+            if start < end:
+                shards.append((p, start, end))
+            continue
+        for s in range(start, end, chunk):
+            shards.append((p, s, min(end, s + chunk)))
+    return shards
+
+def _run_shard(shard: Tuple[str, int, int]) -> Tuple[Tuple[str, int, int], Dict[str, dict]]:
+    path, start, end = shard
+    days = aggregate(parse_events(read_lines(path, start, end)))
+    return shard, {d: st.to_dict() for d, st in days.items()}
+
+def _shard_end(path: str, end: int) -> int:
+    # resume point = just past the last complete line before `end`
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        back = min(end, 1 << 16)
+        while True:
+            f.seek(end - back)
+            buf = f.read(back)
+            i = buf.rfind(b"\n")
+            if i >= 0:
+                return end - back + i + 1
+            if back >= end:
+                return 0
+            back = min(end, back * 2)
+
+def load_state(path: str = STATE_FILE) -> Tuple[Dict[str, int], Dict[str, DayStats]]:
+    try:
+        with open(path) as f:
+            st = json.load(f)
+    except (OSError, ValueError):
+        return {}, {}
+    return st.get("offsets", {}), {d: DayStats.from_dict(v) for d, v in st.get("days", {}).items()}
+
+def save_state(offsets: Dict[str, int], days: Dict[str, DayStats], path: str = STATE_FILE):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"offsets": offsets, "days": {d: st.to_dict() for d, st in days.items()}}, f)
+    os.replace(tmp, path)
+
+def run(log_file: str = LOG_FILE, jobs: int = 1, incremental: bool = False,
+        state_file: str = STATE_FILE) -> Dict[str, DayStats]:
+    offsets, days = load_state(state_file) if incremental else ({}, {})
+    paths = log_files(log_file)
+    shards = plan_shards(paths, offsets)
+    if jobs > 1 and len(shards) > 1:
+        with ProcessPoolExecutor(jobs) as pool:
+            results = list(pool.map(_run_shard, shards))
+    else:
+        results = [_run_shard(s) for s in shards]
+    for (path, _, end), part in results:
+        merge_days(days, {d: DayStats.from_dict(v) for d, v in part.items()})
+        fid = _file_id(path)
+        offsets[fid] = max(offsets.get(fid, 0), _shard_end(path, end))
+    if incremental:
+        live = {_file_id(p) for p in paths if os.path.exists(p)}
+        save_state({k: v for k, v in offsets.items() if k in live}, days, state_file)
+    return days
+
+def main():
+    ap = argparse.ArgumentParser(description="Daily analytics over chat_logs.jsonl")
+    ap.add_argument("--log", default=LOG_FILE)
+    ap.add_argument("--day", help="only report this UTC day (YYYY-MM-DD)")
+    ap.add_argument("--top", type=int, default=10)
+    ap.add_argument("--jobs", type=int, default=1, help="processes used to aggregate shards")
+    ap.add_argument("--incremental", action="store_true", help=f"resume from offsets stored in {STATE_FILE}")
+    ap.add_argument("--state", default=STATE_FILE)
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args()
+
+    days = run(args.log, jobs=args.jobs, incremental=args.incremental, state_file=args.state)
+    out = {d: days[d].report(args.top) for d in sorted(days) if not args.day or d == args.day}
+    if args.json:
+        print(json.dumps(out, ensure_ascii=False, indent=2))
+        return
+    for day, r in out.items():
+        print(f"== {day}  events={r['events']}  fallback_rate={r['fallback_rate']}  "
+              f"top_score_mean={r['top_score']['mean']}")
+        print("   types: " + ", ".join(f"{t}={n}" for t, n in r["types"].items()))
+        print("   top_score hist: " + " ".join(f"{b}:{n}" for b, n in r["top_score"]["hist"].items())
+              + f"  (+{r['top_score']['lexical_n']} lexical, not scored)")
+        for fb in r["feedback"]:
+            print(f"   feedback {fb['useful_ratio']:.2f} ({fb['useful']}/{fb['total']})  {fb['q']}")
+        for u in r["top_unanswered"]:
+            print(f"   unanswered x{u['count']}  {u['q']}")
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,223 @@
 # logger.py
-from datetime import datetime
-import json, os
+# Chat events are appended to data/chat_logs.jsonl as JSON lines.
+# By default log_event only enqueues the event; a background thread batches,
+# writes, fsyncs and rotates, so request threads never touch the disk.
+#
+# Every gunicorn worker has its own writer on the same file. Writes hold a shared
+# flock on <log>.lock and rotation an exclusive one, and a writer reopens the live
+# path whenever the file there is not the one it has open, so a rotation by any
+# worker moves all of them to the new file.
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import atexit, json, os, queue, threading, time
+
+try:  # POSIX only; without it each process rotates on its own
+    import fcntl
+except ImportError:
+    fcntl = None
 
 LOG_DIR = "data"
-LOG_FILE = os.path.join(LOG_DIR, "chat_logs.jsonl")
-os.makedirs(LOG_DIR, exist_ok=True)
+LOG_FILE = os.getenv("CHAT_LOG_FILE", os.path.join(LOG_DIR, "chat_logs.jsonl"))
+os.makedirs(os.path.dirname(LOG_FILE) or ".", exist_ok=True)
+
+_STOP = object()
+
+class EventWriter:
+    """Background JSONL writer fed by a bounded queue.
+
+    fsync:    "always" (after every batch), "interval" (at most every fsync_interval s), "never"
+    overflow: "drop" (count and discard when the queue is full) or "block" (wait up to block_timeout s, then drop)
+    Rotation renames the file to <name>-<UTC stamp>.jsonl once it exceeds rotate_bytes
+    or is older than rotate_seconds (0 disables either); a file's age counts from its
+    first event.
+    """
+
+    def __init__(self, path: str = LOG_FILE, max_queue: int = 10_000, batch_size: int = 256,
+                 flush_interval: float = 0.2, fsync: str = "interval", fsync_interval: float = 1.0,
+                 rotate_bytes: int = 50 * 2**20, rotate_seconds: float = 0, overflow: str = "drop",
+                 block_timeout: float = 0.05):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.pid = os.getpid()
+        self.written = self.dropped = self.rotations = 0
+        self._q: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._f = None
+        self._ino = None
+        self._lock_f = None
+        self._created_at = 0.0
+        self._last_fsync = 0.0
+        self._thread = threading.Thread(target=self._run, name="event-writer", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_env(cls, path: str = LOG_FILE) -> "EventWriter":
+        return cls(path,
+                   max_queue=int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+                   batch_size=int(os.getenv("LOG_BATCH_SIZE", "256")),
+                   flush_interval=float(os.getenv("LOG_FLUSH_MS", "200")) / 1000.0,
+                   fsync=os.getenv("LOG_FSYNC", "interval"),
+                   fsync_interval=float(os.getenv("LOG_FSYNC_S", "1.0")),
+                   rotate_bytes=int(float(os.getenv("LOG_ROTATE_MB", "50")) * 2**20),
+                   rotate_seconds=float(os.getenv("LOG_ROTATE_HOURS", "0")) * 3600,
+                   overflow=os.getenv("LOG_OVERFLOW", "drop"),
+                   block_timeout=float(os.getenv("LOG_BLOCK_MS", "50")) / 1000.0)
+
+    def put(self, ev: dict) -> bool:
+        try:
+            if self.overflow == "block":
+                self._q.put(ev, timeout=self.block_timeout)
+            else:
+                self._q.put_nowait(ev)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def close(self, timeout: float = 5.0):
+        # drain everything queued so far, then stop the thread
+        if self._thread.is_alive():
+            self._q.put(_STOP)
+            self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {"queued": self._q.qsize(), "written": self.written,
+                "dropped": self.dropped, "rotations": self.rotations}
+
+    @contextmanager
+    def _locked(self, op: int):
+        if fcntl is None:
+            yield
+            return
+        if self._lock_f is None:
+            self._lock_f = open(self.path + ".lock", "a")
+        fcntl.flock(self._lock_f, op)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_f, fcntl.LOCK_UN)
+
+    def _creation_time(self) -> float:
+        # the first event's ts: the same in every worker, unlike our open time or the
+        # mtime (which is the last write)
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                first = f.readline()
+            return datetime.fromisoformat(json.loads(first)["ts"]).replace(tzinfo=timezone.utc).timestamp()
+        except (OSError, ValueError, KeyError, TypeError):
+            return time.time()  # empty (new) file, or its first line is still being written
+
+    def _open(self):
+        if self._f is not None:
+            self._f.close()
+        self._f = open(self.path, "a", encoding="utf-8")
+        self._ino = os.fstat(self._f.fileno()).st_ino
+        self._created_at = self._creation_time()
+
+    def _stale(self) -> bool:
+        # another worker rotated the file we have open
+        try:
+            return os.stat(self.path).st_ino != self._ino
+        except FileNotFoundError:
+            return True
+
+    def _maybe_rotate(self):
+        size = os.fstat(self._f.fileno()).st_size
+        too_big = self.rotate_bytes and size >= self.rotate_bytes
+        too_old = self.rotate_seconds and time.time() - self._created_at >= self.rotate_seconds
+        if not (too_big or too_old) or not size:
+            return
+        with self._locked(fcntl.LOCK_EX if fcntl else 0):
+            if self._stale():  # another worker got there first
+                self._open()
+                return
+            root, ext = os.path.splitext(self.path)
+            stamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+            target, n = f"{root}-{stamp}{ext}", 1
+            while os.path.exists(target):  # several rotations within one second
+                target, n = f"{root}-{stamp}.{n}{ext}", n + 1
+            try:
+                os.replace(self.path, target)
+                self.rotations += 1
+            except OSError:
+                pass
+            self._open()
+
+    def _write(self, batch: list):
+        with self._locked(fcntl.LOCK_SH if fcntl else 0):
+            if self._f is None or self._stale():
+                self._open()
+            self._f.write("".join(json.dumps(ev, ensure_ascii=False) + "\n" for ev in batch))
+            self._f.flush()
+        now = time.monotonic()
+        if self.fsync == "always" or (self.fsync == "interval" and now - self._last_fsync >= self.fsync_interval):
+            os.fsync(self._f.fileno())
+            self._last_fsync = now
+        self.written += len(batch)
+        self._maybe_rotate()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            try:
+                first = self._q.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = []
+            item = first
+            while True:
+                if item is _STOP:
+                    stopping = True
+                else:
+                    batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._q.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    self._write(batch)
+                except (OSError, TypeError, ValueError):
+                    self.dropped += len(batch)
+        if self._f is not None:
+            self._f.flush()
+            os.fsync(self._f.fileno())
+            self._f.close()
+            self._f = None
+        if self._lock_f is not None:
+            self._lock_f.close()
+            self._lock_f = None
+
+_writer = None
+_writer_lock = threading.Lock()
+_sync_lock = threading.Lock()
+
+def get_writer() -> EventWriter:
+    # one writer per process; re-created after fork (e.g. gunicorn --preload)
+    global _writer
+    if _writer is None or _writer.pid != os.getpid():
+        with _writer_lock:
+            if _writer is None or _writer.pid != os.getpid():
+                _writer = EventWriter.from_env()
+    return _writer
 
 def log_event(ev: dict):
     ev = {**ev, "ts": datetime.utcnow().isoformat()}
-    with open(LOG_FILE, "a") as f:
+    if os.getenv("LOG_ASYNC", "1") == "1":
+        get_writer().put(ev)
+        return
+    with _sync_lock, open(LOG_FILE, "a") as f:
         f.write(json.dumps(ev, ensure_ascii=False) + "\n")
+
+@atexit.register
+def shutdown():
+    if _writer is not None and _writer.pid == os.getpid():
+        _writer.close()
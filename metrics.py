@@ -0,0 +1,147 @@
+# metrics.py
+# In-process request metrics, served as Prometheus text on GET /metrics:
+#   chat_stage_seconds{stage=...}   histogram of time spent in each smart_reply stage
+#   chat_replies_total{outcome=...} replies by outcome (chitchat, refusal, out_of_scope,
+#                                   answer, llm_answer, fallback, rejected)
+#   gauges registered with METRICS.gauge(), e.g. chat_degrade_level from admission.py
+# Numbers are per process: with several gunicorn workers each one reports its own.
+#
+# METRICS=0 turns spans into no-ops. PROFILE_SAMPLE=0.01 runs ~1% of requests under
+# cProfile and writes one .prof per request to PROFILE_DIR (`python -m pstats <file>`).
+import bisect, cProfile, os, random, threading, time
+from typing import Callable, Dict, Tuple
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count", "_lock")
+
+    def __init__(self, bounds=BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, v: float):
+        i = bisect.bisect_left(self.bounds, v)  # first bucket with v <= le
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += v
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+class _Span:
+    __slots__ = ("hist", "t0")
+
+    def __init__(self, hist: Histogram):
+        self.hist = hist
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.t0)
+
+class _NoOp:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+_NOOP = _NoOp()
+
+class _Profiled:
+    def __init__(self, owner: "Metrics"):
+        self.owner = owner
+        self.prof = cProfile.Profile()
+
+    def __enter__(self):
+        self.prof.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self.prof.disable()
+        try:
+            os.makedirs(self.owner.profile_dir, exist_ok=True)
+            stamp = time.strftime("%Y%m%dT%H%M%S")
+            self.prof.dump_stats(os.path.join(self.owner.profile_dir, f"req-{stamp}-{os.getpid()}-{id(self):x}.prof"))
+        except OSError:
+            pass
+        finally:
+            self.owner._profiling.release()
+
+class Metrics:
+    def __init__(self, enabled: bool = True, profile_sample: float = 0.0, profile_dir: str = "profiles"):
+        self.enabled = enabled
+        self.profile_sample = profile_sample
+        self.profile_dir = profile_dir
+        self.stages: Dict[str, Histogram] = {}
+        self.outcomes: Dict[str, int] = {}
+        self.gauges: Dict[str, Tuple[str, Callable[[], float]]] = {}
+        self._lock = threading.Lock()
+        self._profiling = threading.Lock()  # one cProfile at a time per process
+
+    @classmethod
+    def from_env(cls) -> "Metrics":
+        return cls(enabled=os.getenv("METRICS", "1") == "1",
+                   profile_sample=float(os.getenv("PROFILE_SAMPLE", "0")),
+                   profile_dir=os.getenv("PROFILE_DIR", "profiles"))
+
+    def span(self, stage: str):
+        """`with METRICS.span("search"): ...` records the block's wall time under `stage`."""
+        if not self.enabled:
+            return _NOOP
+        h = self.stages.get(stage)
+        if h is None:
+            with self._lock:
+                h = self.stages.setdefault(stage, Histogram())
+        return _Span(h)
+
+    def count(self, outcome: str):
+        if self.enabled:
+            with self._lock:
+                self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+    def gauge(self, name: str, help_text: str, fn: Callable[[], float]):
+        # fn is read at scrape time
+        self.gauges[name] = (help_text, fn)
+
+    def profile(self):
+        # sampled; skipped while another request in this process is being profiled
+        if self.profile_sample <= 0 or random.random() >= self.profile_sample:
+            return _NOOP
+        if not self._profiling.acquire(blocking=False):
+            return _NOOP
+        return _Profiled(self)
+
+    def render(self) -> str:
+        lines = ["# HELP chat_stage_seconds Time spent in each reply stage.",
+                 "# TYPE chat_stage_seconds histogram"]
+        for stage in sorted(self.stages):
+            counts, total, n = self.stages[stage].snapshot()
+            cum = 0
+            for le, c in zip(self.stages[stage].bounds, counts):
+                cum += c
+                lines.append(f'chat_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cum}')
+            lines.append(f'chat_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {n}')
+            lines.append(f'chat_stage_seconds_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'chat_stage_seconds_count{{stage="{stage}"}} {n}')
+        lines += ["# HELP chat_replies_total Replies by outcome.", "# TYPE chat_replies_total counter"]
+        with self._lock:
+            outcomes = sorted(self.outcomes.items())
+        for outcome, n in outcomes:
+            lines.append(f'chat_replies_total{{outcome="{outcome}"}} {n}')
+        for name in sorted(self.gauges):
+            help_text, fn = self.gauges[name]
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {fn()}"]
+        return "\n".join(lines) + "\n"
+
+METRICS = Metrics.from_env()
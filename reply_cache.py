@@ -0,0 +1,122 @@
+# reply_cache.py
+# Bounded LRU + TTL cache of finished chat replies.
+#   exact tier:    key = normalized message text
+#   semantic tier: optional; reuses a reply whose cached query embedding has
+#                  cosine >= sim_threshold with the new one (0 disables it)
+# Every entry is tagged with a version string (KB + LLM settings); a lookup with
+# a different version clears the cache first.
+import os, re, threading, time
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+import numpy as np
+
+_PUNCT = re.compile(r"[^\w\s]")
+
+def normalize(text: str) -> str:
+    return " ".join(_PUNCT.sub(" ", text.lower()).split())
+
+class ReplyCache:
+    def __init__(self, max_items: int = 2048, ttl: float = 3600.0, sim_threshold: float = 0.0,
+                 semantic_max: int = 512):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.sim_threshold = sim_threshold
+        self.semantic_max = semantic_max
+        self.version = None
+        self.hits = self.semantic_hits = self.misses = self.evictions = self.invalidations = 0
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[str, Tuple[float, Any, Optional[np.ndarray]]]" = OrderedDict()
+        self._matrix = None  # (keys, stacked vectors) for the semantic tier, rebuilt lazily
+
+    @classmethod
+    def from_env(cls) -> "ReplyCache":
+        return cls(max_items=int(os.getenv("REPLY_CACHE_SIZE", "2048")),
+                   ttl=float(os.getenv("REPLY_CACHE_TTL", "3600")),
+                   sim_threshold=float(os.getenv("REPLY_CACHE_SIM", "0")))
+
+    @property
+    def semantic(self) -> bool:
+        return self.sim_threshold > 0
+
+    def _check_version(self, version: str):
+        if version != self.version:
+            if self._items:
+                self.invalidations += 1
+            self._items.clear()
+            self._matrix = None
+            self.version = version
+
+    def get(self, text: str, version: str, vec_fn: Callable[[], np.ndarray] = None):
+        """Return (value, "exact" | "semantic") or (None, None). vec_fn is only
+        called on an exact miss with the semantic tier enabled."""
+        key = normalize(text)
+        now = time.monotonic()
+        with self._lock:
+            self._check_version(version)
+            item = self._items.get(key)
+            if item and now - item[0] <= self.ttl:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return item[1], "exact"
+            if item:
+                self._drop(key)
+        if self.semantic and vec_fn is not None:
+            vec = np.ravel(vec_fn())
+            with self._lock:
+                if version == self.version:
+                    found = self._nearest(vec, now)
+                    if found is not None:
+                        self.semantic_hits += 1
+                        return self._items[found][1], "semantic"
+        with self._lock:
+            self.misses += 1
+        return None, None
+
+    def put(self, text: str, version: str, value: Any, vec: np.ndarray = None):
+        key = normalize(text)
+        with self._lock:
+            self._check_version(version)
+            self._items[key] = (time.monotonic(), value, None if vec is None else np.ravel(vec))
+            self._items.move_to_end(key)
+            self._matrix = None
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def _drop(self, key: str):
+        self._items.pop(key, None)
+        self._matrix = None
+
+    def _nearest(self, vec: np.ndarray, now: float) -> Optional[str]:
+        if self._matrix is None:
+            recent = [(k, v[2]) for k, v in reversed(self._items.items()) if v[2] is not None][:self.semantic_max]
+            self._matrix = ([k for k, _ in recent], np.stack([v for _, v in recent]) if recent else None)
+        keys, mat = self._matrix
+        if mat is None:
+            return None
+        sims = mat @ vec
+        j = int(np.argmax(sims))
+        if sims[j] < self.sim_threshold:
+            return None
+        key = keys[j]
+        item = self._items.get(key)
+        if item is None or now - item[0] > self.ttl:
+            return None
+        self._items.move_to_end(key)
+        return key
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._matrix = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.semantic_hits + self.misses
+            return {
+                "size": len(self._items), "max_items": self.max_items, "ttl_s": self.ttl,
+                "semantic_threshold": self.sim_threshold,
+                "hits": self.hits, "semantic_hits": self.semantic_hits, "misses": self.misses,
+                "hit_rate": round((self.hits + self.semantic_hits) / lookups, 4) if lookups else None,
+                "evictions": self.evictions, "invalidations": self.invalidations,
+            }
@@ -0,0 +1,191 @@
+# sessions.py
+# Per-conversation memory, so a follow-up like "what about after?" can be read
+# against the previous answer's topic. Keyed by a client-chosen session id.
+#   memory - in-process LRU with TTL (default; one worker or sticky routing)
+#   sqlite - one local SQLite file shared by every worker on the box (SESSION_DB)
+# A session keeps at most `max_turns` turns (text capped at TEXT_CHARS) and one
+# float16 topic vector, so each costs a bounded ~1-2 KB however long the chat runs.
+import json, os, sqlite3, threading, time
+from collections import OrderedDict
+from typing import List, Optional
+import numpy as np
+
+TEXT_CHARS = 200
+MAX_ID_CHARS = 128
+
+class Turn:
+    __slots__ = ("text", "kind", "ts")
+
+    def __init__(self, text: str, kind: str, ts: float):
+        self.text = text[:TEXT_CHARS]
+        self.kind = kind  # the chat event type: answer, llm_answer, out_of_scope, ...
+        self.ts = ts
+
+class Session:
+    # a plain list and raw bytes: a deque and an ndarray header would double the per-session cost
+    __slots__ = ("turns", "topic", "ts")
+
+    def __init__(self):
+        self.turns = []
+        self.topic = None  # float16 bytes of the last answered KB entry's embedding
+        self.ts = 0.0
+
+def _f16(vec) -> bytes:
+    return np.asarray(vec, dtype=np.float16).ravel().tobytes()
+
+def _vec(blob: Optional[bytes]) -> Optional[np.ndarray]:
+    return None if blob is None else np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+
+class MemorySessionStore:
+    name = "memory"
+
+    def __init__(self, max_sessions: int = 100_000, ttl: float = 1800.0, max_turns: int = 4):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_turns = max_turns
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[str, Session]" = OrderedDict()
+
+    def __len__(self):
+        return len(self._items)
+
+    def _get(self, sid: str, now: float) -> Optional[Session]:
+        s = self._items.get(sid)
+        if s is None:
+            return None
+        if now - s.ts > self.ttl:
+            del self._items[sid]
+            return None
+        self._items.move_to_end(sid)
+        return s
+
+    def last(self, sid: str):
+        """-> (last turn or None, topic vector or None) for a live session"""
+        with self._lock:
+            s = self._get(sid, time.time())
+            if s is None:
+                return None, None
+            return (s.turns[-1] if s.turns else None), _vec(s.topic)
+
+    def turns(self, sid: str) -> List[Turn]:
+        with self._lock:
+            s = self._get(sid, time.time())
+            return list(s.turns) if s is not None else []
+
+    def add(self, sid: str, text: str, kind: str, topic: np.ndarray = None):
+        # topic: the new conversation topic, or None to keep the current one
+        now = time.time()
+        with self._lock:
+            s = self._get(sid, now)
+            if s is None:
+                s = self._items[sid] = Session()
+                while len(self._items) > self.max_sessions:
+                    self._items.popitem(last=False)
+                    self.evictions += 1
+            s.turns.append(Turn(text, kind, now))
+            if len(s.turns) > self.max_turns:
+                del s.turns[0]
+            if topic is not None:
+                s.topic = _f16(topic)
+            s.ts = now
+
+    def stats(self) -> dict:
+        return {"store": self.name, "sessions": len(self), "evictions": self.evictions}
+
+class SQLiteSessionStore:
+    """Same interface as MemorySessionStore over a WAL-mode SQLite file.
+    Expired and over-cap sessions are purged every `purge_every` writes."""
+
+    name = "sqlite"
+
+    def __init__(self, path: str, max_sessions: int = 100_000, ttl: float = 1800.0, max_turns: int = 4,
+                 purge_every: int = 1000):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_turns = max_turns
+        self.purge_every = purge_every
+        self._writes = 0
+        self._local = threading.local()
+        with self._conn() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, ts REAL NOT NULL, "
+                       "turns TEXT NOT NULL, topic BLOB)")
+            db.execute("CREATE INDEX IF NOT EXISTS sessions_ts ON sessions (ts)")
+
+    def _conn(self) -> sqlite3.Connection:
+        # one connection per thread (and per process: connections don't survive fork)
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=5.0)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db, self._local.pid = db, os.getpid()
+        return db
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def _row(self, sid: str):
+        row = self._conn().execute("SELECT ts, turns, topic FROM sessions WHERE id = ?", (sid,)).fetchone()
+        if row is None or time.time() - row[0] > self.ttl:
+            return None
+        return row
+
+    def last(self, sid: str):
+        row = self._row(sid)
+        if row is None:
+            return None, None
+        turns = json.loads(row[1])
+        return (Turn(*turns[-1]) if turns else None), _vec(row[2])
+
+    def turns(self, sid: str) -> List[Turn]:
+        row = self._row(sid)
+        return [Turn(*t) for t in json.loads(row[1])] if row is not None else []
+
+    def add(self, sid: str, text: str, kind: str, topic: np.ndarray = None):
+        now = time.time()
+        db = self._conn()
+        with db:
+            # take the write lock before reading: two workers appending to one session serialize
+            # instead of both reading the old turns and the second write dropping the first's turn
+            db.execute("BEGIN IMMEDIATE")
+            row = self._row(sid)
+            turns = json.loads(row[1]) if row is not None else []
+            turns = (turns + [[text[:TEXT_CHARS], kind, now]])[-self.max_turns:]
+            blob = _f16(topic) if topic is not None else (row[2] if row is not None else None)
+            db.execute("INSERT OR REPLACE INTO sessions (id, ts, turns, topic) VALUES (?, ?, ?, ?)",
+                       (sid, now, json.dumps(turns, ensure_ascii=False), blob))
+        self._writes += 1
+        if self._writes % self.purge_every == 0:
+            self.purge(now)
+
+    def purge(self, now: float = None):
+        now = time.time() if now is None else now
+        db = self._conn()
+        with db:
+            db.execute("DELETE FROM sessions WHERE ts < ?", (now - self.ttl,))
+            over = len(self) - self.max_sessions
+            if over > 0:
+                db.execute("DELETE FROM sessions WHERE id IN (SELECT id FROM sessions ORDER BY ts LIMIT ?)", (over,))
+
+    def stats(self) -> dict:
+        return {"store": self.name, "sessions": len(self), "path": self.path}
+
+def make_session_store():
+    """SESSION_STORE: memory (default) | sqlite | off (-> None)"""
+    kind = os.getenv("SESSION_STORE", "memory").lower()
+    if kind == "off":
+        return None
+    opts = {"max_sessions": int(os.getenv("SESSION_MAX", "100000")),
+            "ttl": float(os.getenv("SESSION_TTL", "1800")),
+            "max_turns": int(os.getenv("SESSION_TURNS", "4"))}
+    if kind == "sqlite":
+        return SQLiteSessionStore(os.getenv("SESSION_DB", os.path.join("data", "sessions.sqlite")), **opts)
+    if kind != "memory":
+        raise ValueError(f"unknown SESSION_STORE {kind!r}; expected memory, sqlite or off")
+    return MemorySessionStore(**opts)
+
+def valid_session_id(sid) -> bool:
+    return isinstance(sid, str) and 0 < len(sid) <= MAX_ID_CHARS
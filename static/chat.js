@@ -0,0 +1,196 @@
+const root = document.documentElement;
+const toggleBtn = document.getElementById('themeToggle');
+
+// Check if user had a preference saved
+if(localStorage.getItem('theme')){
+  root.setAttribute('data-theme', localStorage.getItem('theme'));
+  toggleBtn.textContent = localStorage.getItem('theme') === 'light' ? "🌙 Dark Mode" : "☀️ Light Mode";
+}
+
+toggleBtn.addEventListener('click', ()=>{
+  const current = root.getAttribute('data-theme');
+  const next = current === 'light' ? 'dark' : 'light';
+  root.setAttribute('data-theme', next);
+  localStorage.setItem('theme', next);
+  toggleBtn.textContent = next === 'light' ? "🌙 Dark Mode" : "☀️ Light Mode";
+});
+
+const chat = document.getElementById('chat');
+const msg = document.getElementById('msg');
+const send = document.getElementById('send');
+// one id per browser tab, so the server can read follow-ups in context
+const SESSION_ID = sessionStorage.getItem('fiteva_session') || (crypto.randomUUID ? crypto.randomUUID() : String(Math.random()).slice(2));
+sessionStorage.setItem('fiteva_session', SESSION_ID);
+const toastEl = document.getElementById('toast');
+let toastTimer = null;
+
+
+function showToast(text){
+  if(!toastEl) return;
+  toastEl.textContent = text;
+  toastEl.classList.add('show');
+  clearTimeout(toastTimer);
+  toastTimer = setTimeout(()=> toastEl.classList.remove('show'), 1600);
+}
+
+function addBubble(text, who, options){
+  const row = document.createElement('div');
+  row.className = 'row ' + (who==='me' ? 'me' : 'bot');
+  const b = document.createElement('div');
+  b.className = 'bubble ' + (who==='me' ? 'me' : 'bot');
+  b.textContent = text;
+  row.appendChild(b);
+
+  // Feedback buttons (bot messages only)
+if (who !== 'me') {
+  const actions = document.createElement('div');
+  actions.className = 'actions';
+  actions.innerHTML = `
+    <button class="smallbtn" data-fb="up">👍 Helpful</button>
+    <button class="smallbtn" data-fb="down">👎 Not helpful</button>
+  `;
+  actions.addEventListener('click', async (e)=>{
+    const val = e.target.getAttribute('data-fb');
+    if(!val) return;
+    // disable both buttons after one click
+    actions.querySelectorAll('button').forEach(b=> b.disabled = true);
+
+    try{
+      const r = await fetch('/api/feedback', {
+        method:'POST',
+        headers:{'Content-Type':'application/json'},
+        body:JSON.stringify({q: window._lastUserQ || "", useful: (val==="up")})
+      });
+      const j = await r.json();
+      if (j && j.ok){
+        showToast(val === 'up' ? '✅ Feedback saved — thanks!' : '✅ Noted — we’ll improve this.');
+      } else {
+        showToast('⚠️ Could not save feedback.');
+      }
+    }catch(err){
+      showToast('⚠️ Network error saving feedback.');
+    }
+  });
+  row.appendChild(actions);
+}
+
+
+  addQuickReplies(row, options);
+
+  chat.appendChild(row);
+  chat.scrollTop = chat.scrollHeight;
+  return b;
+}
+
+// NEW: quick-reply buttons
+function addQuickReplies(row, options){
+  if (options && options.length > 0) {
+    const qr = document.createElement('div');
+    qr.className = 'actions quickreplies';
+    options.forEach(opt=>{
+      const btn = document.createElement('button');
+      btn.className = 'smallbtn';
+      btn.textContent = opt;
+      btn.addEventListener('click', ()=>{
+        msg.value = opt;  // autofill input
+        ask();            // auto-send
+      });
+      qr.appendChild(btn);
+    });
+    row.appendChild(qr);
+  }
+}
+
+
+async function ask(){
+  const text = msg.value.trim();
+  if(!text) return;
+  window._lastUserQ = text;
+  addBubble(text,'me');
+  msg.value='';
+  try{
+    await askStream(text);
+  }catch(err){
+    if(err instanceof Busy){
+      addBubble(busyText(err.retryAfter),'bot');
+      return;
+    }
+    // streaming unsupported, or it failed before the first byte: one plain JSON request
+    try{
+      const r = await fetch('/api/chat', {
+        method:'POST',
+        headers:{'Content-Type':'application/json'},
+        body:JSON.stringify({message:text, session_id:SESSION_ID})
+      });
+      if(r.status === 429){
+        addBubble(busyText(r.headers.get('Retry-After')),'bot');
+        return;
+      }
+      const j = await r.json();
+      addBubble(j.reply || '⚠️ Something went wrong — please try again.','bot', j.options || []);
+    }catch(e){
+      addBubble('⚠️ Network error — please try again.','bot');
+    }
+  }
+}
+
+// 429 from admission control: say so instead of retrying, which would only add load
+class Busy extends Error {
+  constructor(retryAfter){ super('busy'); this.retryAfter = retryAfter; }
+}
+
+function busyText(retryAfter){
+  const s = parseInt(retryAfter, 10) || 1;
+  return `⏳ Coach FitEva is busy right now. Please try again in ${s} second${s === 1 ? '' : 's'}.`;
+}
+
+// Render the reply as it arrives from /api/chat/stream (Server-Sent Events over POST).
+// Throws (so ask() falls back) only before anything was shown; a stream that breaks
+// after that keeps its text and says it was cut off.
+async function askStream(text){
+  const r = await fetch('/api/chat/stream', {
+    method:'POST',
+    headers:{'Content-Type':'application/json'},
+    body:JSON.stringify({message:text, session_id:SESSION_ID})
+  });
+  if(r.status === 429) throw new Busy(r.headers.get('Retry-After'));
+  if(!r.ok || !r.body) throw new Error('stream unavailable');
+  const reader = r.body.getReader();
+  const decoder = new TextDecoder();
+  let buf = '', bubble = null, done = false;
+  try{
+    while(!done){
+      const chunk = await reader.read();
+      if(chunk.done) break;
+      buf += decoder.decode(chunk.value, {stream:true});
+      let cut;
+      while((cut = buf.indexOf('\n\n')) >= 0){
+        const frame = buf.slice(0, cut);
+        buf = buf.slice(cut + 2);
+        const isDone = frame.startsWith('event: done');
+        const line = frame.split('\n').find(l => l.startsWith('data: '));
+        if(!line) continue;
+        const payload = JSON.parse(line.slice(6));
+        if(isDone){
+          if(!bubble) bubble = addBubble('', 'bot');
+          addQuickReplies(bubble.parentElement, payload.options || []);
+          done = true;
+          break;
+        }
+        if(!bubble) bubble = addBubble('', 'bot');
+        bubble.textContent += payload.t;
+        chat.scrollTop = chat.scrollHeight;
+      }
+    }
+  }catch(err){
+    if(!bubble) throw err;
+  }
+  if(!done && !bubble) throw new Error('empty stream');
+  if(!done) bubble.textContent += '\n\n⚠️ Connection lost — this reply may be incomplete.';
+}
+
+
+send.addEventListener('click', ask);
+msg.addEventListener('keydown', (e)=>{ if(e.key==='Enter') ask(); });
+
+addBubble("Hi! I’m Coach FitEva. Ask me about pre-workout, post-workout, protein, hydration, a 20-minute workout, fat-loss basics, or supplement timing.","bot");
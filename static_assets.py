@@ -0,0 +1,96 @@
+# static_assets.py
+# The chat page and its CSS/JS, built once at startup and served from memory:
+# gzip (and brotli, if the optional `brotli` package is installed) variants are
+# compressed ahead of time and picked by Accept-Encoding, and every response
+# carries an ETag / Last-Modified so repeat visits get a 304.
+#
+# Assets are requested as /static/<name>?v=<content hash>; those URLs never change
+# meaning, so they are cacheable for a year. The page itself is revalidated on
+# every visit (cheap: a 304 with no body) so a deploy shows up immediately.
+import gzip, hashlib, os, re, time
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, List, Mapping, Tuple
+
+try:  # optional, ~15-20% smaller than gzip on text
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+TYPES = {".css": "text/css; charset=utf-8", ".js": "text/javascript; charset=utf-8",
+         ".html": "text/html; charset=utf-8"}
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+_QVALUE = re.compile(r"^\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*$")
+
+def accepted_encodings(header: str) -> Dict[str, float]:
+    out = {}
+    for part in (header or "").lower().split(","):
+        m = _QVALUE.match(part)
+        if m:
+            try:
+                out[m.group(1)] = float(m.group(2)) if m.group(2) else 1.0
+            except ValueError:
+                continue
+    return out
+
+class Asset:
+    def __init__(self, body: bytes, content_type: str, mtime: float = None):
+        self.body = body
+        self.content_type = content_type
+        self.version = hashlib.sha1(body).hexdigest()[:12]
+        self.last_modified = formatdate(int(mtime if mtime is not None else time.time()), usegmt=True)
+        self.variants = {"identity": body, "gzip": gzip.compress(body, 9, mtime=0)}
+        if brotli is not None:
+            self.variants["br"] = brotli.compress(body, quality=11)
+
+    @classmethod
+    def from_file(cls, path: str) -> "Asset":
+        with open(path, "rb") as f:
+            body = f.read()
+        return cls(body, TYPES.get(os.path.splitext(path)[1], "application/octet-stream"), os.path.getmtime(path))
+
+    def pick(self, accept_encoding: str) -> str:
+        acc = accepted_encodings(accept_encoding)
+        for enc in ("br", "gzip"):
+            if enc in self.variants and acc.get(enc, acc.get("*", 0)) > 0 \
+                    and len(self.variants[enc]) < len(self.body):
+                return enc
+        return "identity"
+
+    def _not_modified(self, headers: Mapping[str, str]) -> bool:
+        inm = headers.get("if-none-match")
+        if inm is not None:  # takes precedence over If-Modified-Since
+            return inm.strip() == "*" or self.version in inm
+        ims = headers.get("if-modified-since")
+        if ims:
+            try:
+                return parsedate_to_datetime(ims) >= parsedate_to_datetime(self.last_modified)
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def serve(self, method: str, headers: Mapping[str, str], cache_control: str) -> Tuple[int, List[Tuple[str, str]], bytes]:
+        """-> (status, headers, body) for a GET/HEAD; `headers` are the request's, lower-cased keys."""
+        enc = self.pick(headers.get("accept-encoding", ""))
+        out = [("Content-Type", self.content_type), ("Cache-Control", cache_control),
+               ("ETag", f'"{self.version}-{enc}"'), ("Last-Modified", self.last_modified),
+               ("Vary", "Accept-Encoding")]
+        if self._not_modified(headers):
+            return 304, out, b""
+        body = self.variants[enc]
+        if enc != "identity":
+            out.append(("Content-Encoding", enc))
+        out.append(("Content-Length", str(len(body))))
+        return 200, out, (b"" if method == "HEAD" else body)
+
+def load_static(directory: str = STATIC_DIR) -> Dict[str, Asset]:
+    return {n: Asset.from_file(os.path.join(directory, n)) for n in sorted(os.listdir(directory))
+            if os.path.splitext(n)[1] in TYPES}
+
+def url_for_asset(assets: Dict[str, Asset], name: str) -> str:
+    return f"/static/{name}?v={assets[name].version}"
+
+def cache_control_for(asset: Asset, requested_version: str) -> str:
+    # only the exact versioned URL the page links to may be cached for good
+    return IMMUTABLE if requested_version == asset.version else REVALIDATE
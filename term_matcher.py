@@ -0,0 +1,66 @@
+# term_matcher.py
+# One Aho-Corasick automaton over every guardrail term table, so a single pass
+# over the lowercased message finds all medical / fitness / chit-chat / intent
+# hits at once, in O(len(text) + matches) no matter how long the tables get.
+import json, os
+from collections import deque
+from typing import Dict, Iterable, List, Tuple
+
+GUARDRAILS_FILE = os.getenv("GUARDRAILS_FILE", os.path.join("data", "guardrails.json"))
+
+def load_term_tables(path: str = GUARDRAILS_FILE) -> dict:
+    # {"medical": [...], "fitness": [...], "chitchat": {term: reply}, "intents": {term: reply}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+class TermMatcher:
+    def __init__(self, tables: Dict[str, Iterable[str]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[str, int, str]]] = [[]]
+        for category, terms in tables.items():
+            for rank, term in enumerate(terms):
+                self._add(term.lower(), (category, rank, term))
+        self._link()
+
+    def _add(self, term: str, out: Tuple[str, int, str]):
+        if not term:
+            return
+        s = 0
+        for ch in term:
+            nxt = self._goto[s].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[s][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            s = nxt
+        self._out[s].append(out)
+
+    def _link(self):
+        # BFS over the trie; each state inherits the outputs of its failure state
+        queue = deque(self._goto[0].values())
+        while queue:
+            s = queue.popleft()
+            for ch, nxt in self._goto[s].items():
+                queue.append(nxt)
+                f = self._fail[s]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def scan(self, text: str) -> Dict[str, List[str]]:
+        """Return {category: [matched terms]} for every substring hit in text.
+        Terms within a category are ordered by their position in the source table."""
+        hits: Dict[str, Dict[int, str]] = {}
+        goto, fail, out = self._goto, self._fail, self._out
+        s = 0
+        for ch in text.lower():
+            while s and ch not in goto[s]:
+                s = fail[s]
+            s = goto[s].get(ch, 0)
+            for category, rank, term in out[s]:
+                hits.setdefault(category, {})[rank] = term
+        return {c: [terms[r] for r in sorted(terms)] for c, terms in hits.items()}
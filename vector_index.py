@@ -0,0 +1,300 @@
+# vector_index.py
+# Top-k backends for EmbStore. All of them take L2-normalized float32 rows and
+# return (scores, idxs) with cosine similarity scores, best first.
+#
+#   numpy   - exact dot product + argpartition (default)
+#   int8    - scan of per-row int8 codes (4x smaller than float32)
+#   binary  - Hamming scan of sign bits (32x smaller)
+#   pca     - scan of a truncated-SVD projection to PCA_DIM dimensions
+#   ivf     - approximate: k-means inverted lists over int8-quantized vectors
+#   sklearn - NearestNeighbors(metric="cosine"), kept for parity checks
+#
+# The compressed backends only pick candidates: the best `rescore` of them are
+# re-ranked with the float32 rows (an mmap of data/cache, so only those rows are
+# read), and the returned scores are exact cosines. That keeps draft_answer's
+# 0.25 / 0.2 thresholds calibrated whatever the storage.
+import os
+from abc import ABC, abstractmethod
+from typing import Tuple
+import numpy as np
+
+CHUNK = 8_192  # rows per scan step; keeps the float32 temporaries cache-sized
+
+def _topk(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    # scores: (n_queries, n) -> best k per row, sorted descending
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        empty = np.zeros((scores.shape[0], 0))
+        return empty.astype(np.float32), empty.astype(np.int64)
+    if k < scores.shape[1]:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        part = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind="stable")
+    return np.take_along_axis(part_scores, order, axis=1), np.take_along_axis(part, order, axis=1)
+
+class NumpyIndex:
+    name = "numpy"
+
+    def __init__(self, embs: np.ndarray):
+        self.embs = embs
+
+    def __len__(self):
+        return self.embs.shape[0]
+
+    def search(self, q_embs: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        return _topk(np.atleast_2d(q_embs) @ self.embs.T, k)
+
+    def memory_bytes(self) -> int:
+        return self.embs.nbytes
+
+    def with_embs(self, embs: np.ndarray) -> "NumpyIndex":
+        return NumpyIndex(embs)
+
+def _rescore(embs: np.ndarray, q: np.ndarray, cand: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    # exact cosine for the candidate rows only; cand: (m,) row ids
+    cand = np.sort(cand)  # sequential reads from the mmap
+    s, j = _topk((np.asarray(embs[cand], dtype=np.float32) @ q)[None, :], k)
+    return s[0], cand[j[0]]
+
+class _CandidateIndex(ABC):
+    """Scan a compact representation for `rescore` candidates, then rank them in float32.
+    Subclasses supply the approximate scores and the size of what they store."""
+
+    name = None
+
+    def __init__(self, embs: np.ndarray, rescore: int = 100):
+        self.embs = embs
+        self.n = embs.shape[0]
+        self.rescore = rescore
+
+    def __len__(self):
+        return self.n
+
+    @abstractmethod
+    def _approx(self, q: np.ndarray) -> np.ndarray:
+        """Approximate score of every row for one query vector, shape (n,)."""
+
+    @abstractmethod
+    def memory_bytes(self) -> int:
+        """Bytes of the compact representation; the float32 rows are the caller's (mmap'd) matrix."""
+
+    @abstractmethod
+    def with_embs(self, embs: np.ndarray) -> "_CandidateIndex":
+        """The same kind of index over a reloaded KB's embeddings."""
+
+    def search(self, q_embs: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        q_embs = np.atleast_2d(q_embs).astype(np.float32)
+        k = min(k, self.n)
+        out_s = np.full((q_embs.shape[0], k), -np.inf, dtype=np.float32)
+        out_i = np.full((q_embs.shape[0], k), -1, dtype=np.int64)
+        for r, q in enumerate(q_embs):
+            approx = self._approx(q)
+            if self.rescore <= 0:  # raw approximate scores, for comparison in bench/quant_eval.py
+                s, j = _topk(approx[None, :], k)
+                out_s[r], out_i[r] = s[0], j[0]
+                continue
+            _, cand = _topk(approx[None, :], max(k, self.rescore))
+            s, i = _rescore(self.embs, q, cand[0], k)
+            out_s[r, :len(s)], out_i[r, :len(i)] = s, i
+        return out_s, out_i
+
+class Int8Index(_CandidateIndex):
+    name = "int8"
+
+    def __init__(self, embs: np.ndarray, rescore: int = 100):
+        super().__init__(embs, rescore)
+        self.codes = np.empty(embs.shape, dtype=np.int8)
+        self.scales = np.empty(self.n, dtype=np.float32)
+        for s in range(0, self.n, CHUNK):
+            self.codes[s:s + CHUNK], self.scales[s:s + CHUNK] = quantize_int8(np.asarray(embs[s:s + CHUNK]))
+
+    def _approx(self, q: np.ndarray) -> np.ndarray:
+        out = np.empty(self.n, dtype=np.float32)
+        for s in range(0, self.n, CHUNK):
+            out[s:s + CHUNK] = (self.codes[s:s + CHUNK].astype(np.float32) @ q) * self.scales[s:s + CHUNK]
+        return out
+
+    def memory_bytes(self) -> int:
+        return self.codes.nbytes + self.scales.nbytes
+
+    def with_embs(self, embs: np.ndarray) -> "Int8Index":
+        return Int8Index(embs, self.rescore)
+
+class BinaryIndex(_CandidateIndex):
+    name = "binary"
+
+    def __init__(self, embs: np.ndarray, rescore: int = 100):
+        super().__init__(embs, rescore)
+        self.bits = np.packbits(np.asarray(embs) > 0, axis=1) if self.n else np.zeros((0, 0), np.uint8)
+
+    def _approx(self, q: np.ndarray) -> np.ndarray:
+        # fewer differing sign bits ~ smaller angle; negate so larger is better
+        qb = np.packbits(q > 0)
+        out = np.empty(self.n, dtype=np.float32)
+        for s in range(0, self.n, CHUNK):
+            out[s:s + CHUNK] = -np.bitwise_count(self.bits[s:s + CHUNK] ^ qb).sum(axis=1, dtype=np.int32)
+        return out
+
+    def memory_bytes(self) -> int:
+        return self.bits.nbytes
+
+    def with_embs(self, embs: np.ndarray) -> "BinaryIndex":
+        return BinaryIndex(embs, self.rescore)
+
+class PCAIndex(_CandidateIndex):
+    name = "pca"
+
+    def __init__(self, embs: np.ndarray, dim: int = 128, rescore: int = 100, train_size: int = 50_000,
+                 components: np.ndarray = None):
+        super().__init__(embs, rescore)
+        if components is None:
+            # uncentered (truncated SVD) so q . x is approximated by (q P) . (x P)
+            rng = np.random.default_rng(0)
+            sample = embs if self.n <= train_size else embs[np.sort(rng.choice(self.n, train_size, replace=False))]
+            _, _, vt = np.linalg.svd(np.asarray(sample, dtype=np.float32), full_matrices=False)
+            components = vt[:min(dim, vt.shape[0])].T.astype(np.float32)  # (d, dim)
+        self.components = components
+        self.reduced = np.empty((self.n, components.shape[1]), dtype=np.float32)
+        for s in range(0, self.n, CHUNK):
+            self.reduced[s:s + CHUNK] = np.asarray(embs[s:s + CHUNK]) @ components
+
+    def _approx(self, q: np.ndarray) -> np.ndarray:
+        return self.reduced @ (q @ self.components)
+
+    def memory_bytes(self) -> int:
+        return self.reduced.nbytes + self.components.nbytes
+
+    def with_embs(self, embs: np.ndarray) -> "PCAIndex":
+        n = embs.shape[0]
+        keep = self.components if self.n // 2 <= n <= self.n * 2 else None
+        return PCAIndex(embs, dim=self.components.shape[1], rescore=self.rescore, components=keep)
+
+class SklearnIndex:
+    name = "sklearn"
+
+    def __init__(self, embs: np.ndarray):
+        from sklearn.neighbors import NearestNeighbors
+        self.n = embs.shape[0]
+        self.nn = NearestNeighbors(n_neighbors=5, metric="cosine")
+        self.nn.fit(embs)
+
+    def __len__(self):
+        return self.n
+
+    def search(self, q_embs: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        distances, idxs = self.nn.kneighbors(np.atleast_2d(q_embs), n_neighbors=min(k, self.n))
+        # cosine distance ∈ [0,2], similarity = 1 - distance
+        return 1.0 - distances, idxs
+
+    def with_embs(self, embs: np.ndarray) -> "SklearnIndex":
+        return SklearnIndex(embs)
+
+def quantize_int8(x: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # symmetric per-row int8: x ≈ codes * scale[:, None]
+    scale = np.abs(x).max(axis=1) / 127.0
+    scale[scale == 0] = 1.0
+    codes = np.round(x / scale[:, None]).astype(np.int8)
+    return codes, scale.astype(np.float32)
+
+def _kmeans(x: np.ndarray, n_clusters: int, iters: int = 10, seed: int = 0) -> np.ndarray:
+    # spherical k-means (centroids re-normalized) so assignment is a dot product
+    rng = np.random.default_rng(seed)
+    cent = x[rng.choice(x.shape[0], n_clusters, replace=False)].copy()
+    for _ in range(iters):
+        assign = np.argmax(x @ cent.T, axis=1)
+        sums = np.zeros_like(cent)
+        np.add.at(sums, assign, x)
+        counts = np.bincount(assign, minlength=n_clusters)
+        empty = counts == 0
+        if empty.any():  # re-seed dead clusters from random points
+            sums[empty] = x[rng.choice(x.shape[0], int(empty.sum()), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        cent = sums / np.maximum(norms, 1e-12)
+    return cent.astype(np.float32)
+
+class IVFIndex:
+    name = "ivf"
+
+    def __init__(self, embs: np.ndarray, nlist: int = 0, nprobe: int = 8, rescore: int = 100,
+                 train_size: int = 50_000, chunk: int = CHUNK, centroids: np.ndarray = None):
+        n = embs.shape[0]
+        self.n = n
+        self.embs = embs
+        self.rescore = rescore
+        self.requested = {"nlist": nlist, "nprobe": nprobe, "rescore": rescore}
+        if centroids is not None:  # reuse a trained quantizer (see with_embs)
+            self.nlist = centroids.shape[0]
+            self.centroids = centroids
+        else:
+            self.nlist = max(1, min(n, nlist or int(np.sqrt(n))))
+            rng = np.random.default_rng(0)
+            sample = embs if n <= train_size else embs[rng.choice(n, train_size, replace=False)]
+            self.centroids = _kmeans(np.asarray(sample, dtype=np.float32), self.nlist)
+        self.nprobe = max(1, min(nprobe, self.nlist))
+
+        # assign in chunks so a 1M-row mmap never needs a full n x nlist score matrix
+        assign = np.empty(n, dtype=np.int32)
+        for s in range(0, n, chunk):
+            assign[s:s + chunk] = np.argmax(embs[s:s + chunk] @ self.centroids.T, axis=1)
+        self.ids = np.argsort(assign, kind="stable")
+        self.offsets = np.searchsorted(assign[self.ids], np.arange(self.nlist + 1))
+        self.codes = np.empty((n, embs.shape[1]), dtype=np.int8)
+        self.scales = np.empty(n, dtype=np.float32)
+        for s in range(0, n, chunk):
+            rows = self.ids[s:s + chunk]
+            self.codes[s:s + chunk], self.scales[s:s + chunk] = quantize_int8(np.asarray(embs[rows]))
+
+    def __len__(self):
+        return self.n
+
+    def _candidates(self, q: np.ndarray) -> np.ndarray:
+        lists = np.argpartition(-(self.centroids @ q), self.nprobe - 1)[:self.nprobe]
+        spans = [np.arange(self.offsets[c], self.offsets[c + 1]) for c in lists]
+        return np.concatenate(spans) if spans else np.zeros(0, dtype=np.int64)
+
+    def search(self, q_embs: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        q_embs = np.atleast_2d(q_embs).astype(np.float32)
+        k = min(k, self.n)
+        out_s = np.full((q_embs.shape[0], k), -np.inf, dtype=np.float32)
+        out_i = np.full((q_embs.shape[0], k), -1, dtype=np.int64)
+        for r, q in enumerate(q_embs):
+            pos = self._candidates(q)
+            approx = (self.codes[pos].astype(np.float32) @ q) * self.scales[pos]
+            if self.rescore > 0:
+                _, j = _topk(approx[None, :], max(k, self.rescore))
+                s, i = _rescore(self.embs, q, self.ids[pos[j[0]]], k)
+                out_s[r, :len(s)], out_i[r, :len(i)] = s, i
+                continue
+            s, j = _topk(approx[None, :], k)
+            out_s[r, :s.shape[1]] = s[0]
+            out_i[r, :j.shape[1]] = self.ids[pos[j[0]]]
+        return out_s, out_i
+
+    def memory_bytes(self) -> int:
+        return self.codes.nbytes + self.scales.nbytes + self.centroids.nbytes
+
+    def with_embs(self, embs: np.ndarray) -> "IVFIndex":
+        # KB edits: keep the trained centroids and only re-assign / re-quantize rows,
+        # unless the KB grew or shrank enough that the list count no longer fits
+        n = embs.shape[0]
+        if self.n // 2 <= n <= self.n * 2 and n >= self.nlist:
+            return IVFIndex(embs, centroids=self.centroids, **self.requested)
+        return IVFIndex(embs, **self.requested)
+
+INDEXES = {"numpy": NumpyIndex, "int8": Int8Index, "binary": BinaryIndex, "pca": PCAIndex,
+           "ivf": IVFIndex, "sklearn": SklearnIndex}
+
+def make_index(embs: np.ndarray, kind: str = None, **opts):
+    kind = (kind or os.getenv("VECTOR_INDEX", "numpy")).lower()
+    if kind not in INDEXES:
+        raise ValueError(f"unknown VECTOR_INDEX {kind!r}; expected one of {sorted(INDEXES)}")
+    if kind == "ivf":
+        opts.setdefault("nlist", int(os.getenv("IVF_NLIST", "0")))
+        opts.setdefault("nprobe", int(os.getenv("IVF_NPROBE", "8")))
+    if kind == "pca":
+        opts.setdefault("dim", int(os.getenv("PCA_DIM", "128")))
+    if kind in ("int8", "binary", "pca", "ivf"):
+        opts.setdefault("rescore", int(os.getenv("RESCORE_CANDIDATES", "100")))
+    return INDEXES[kind](embs, **opts)